@@ -1,22 +1,57 @@
-from concurrent.futures import as_completed, ThreadPoolExecutor
-from contextlib import contextmanager
+from binascii import hexlify
+from concurrent.futures import (as_completed, FIRST_COMPLETED,
+                                ThreadPoolExecutor, wait)
+from contextlib import closing, contextmanager
 from functools import partial
+from hashlib import new
+from io import BytesIO
+from itertools import chain
 from logging import (DEBUG, ERROR, FileHandler, Formatter, getLogger, INFO,
                      StreamHandler)
-from os import environ, SEEK_END, utime
-from paramiko import (hostkeys, SFTPClient, SSHConfig, Transport,
-                      ConfigParseError, PasswordRequiredException,
+from operator import itemgetter
+from os import close, environ, pipe, read, SEEK_END, utime, write
+from paramiko import (hostkeys, SFTPAttributes, SFTPClient, SSHConfig,
+                      Transport, ConfigParseError, PasswordRequiredException,
                       SSHException, DSSKey, ECDSAKey, Ed25519Key, RSAKey)
+from paramiko.sftp import (CMD_ATTRS, CMD_EXTENDED, CMD_FSETSTAT, CMD_FSTAT,
+                           CMD_REMOVE, CMD_STAT, CMD_STATUS, SFTP_OK,
+                           SFTP_OP_UNSUPPORTED)
 from pathlib import Path
+from queue import Full, Queue
+from selectors import DefaultSelector, EVENT_READ
 from sftpretty.exceptions import (CredentialException, ConnectionException,
                                   HostKeysException, LoggingException)
-from sftpretty.helpers import _callback, drivedrop, hash, localtree, retry
+from sftpretty.helpers import (_callback, _chunks, _measured, _partial,
+                               _pipelined, _pool_size, _read_spans,
+                               _Responses, _Tee, BlockReader, BlockWriter,
+                               diff, drivedrop, FileCache, hash, hashes,
+                               Inotify, localscan, localtree, Manifest,
+                               Metrics, OpenTelemetryMetrics,
+                               PrometheusMetrics, RemoteIndex, retry)
+from shlex import quote
+from shutil import copyfile, copyfileobj
 from socket import gaierror
-from stat import S_ISDIR, S_ISREG
+from stat import (S_IFBLK, S_IFCHR, S_IFDIR, S_IFIFO, S_IFLNK, S_IFREG,
+                  S_IFSOCK, S_ISDIR, S_ISREG)
 from tempfile import mkstemp
+from threading import Event, Thread
+from time import monotonic, time
 from uuid import uuid4
 
 
+# Remote commands computing a digest in the format of sha256sum, by algorithm.
+CHECKSUM_COMMANDS = {'blake2b': 'b2sum', 'md5': 'md5sum', 'sha1': 'sha1sum',
+                     'sha224': 'sha224sum', 'sha256': 'sha256sum',
+                     'sha384': 'sha384sum', 'sha512': 'sha512sum'}
+# Sidecar kept in the remote root by dedup='manifest' uploads, NUL delimited
+# records in the format of sha256sum -z, paths relative to the root.
+DEDUP_MANIFEST = '.sftpretty.sha256'
+# NUL delimited fields parsed by Connection._find, a path may hold anything.
+FIND_FORMAT = '%y\\0%s\\0%A@\\0%T@\\0%m\\0%U\\0%G\\0%p\\0'
+FIND_TYPES = {b'b': S_IFBLK, b'c': S_IFCHR, b'd': S_IFDIR, b'f': S_IFREG,
+              b'l': S_IFLNK, b'p': S_IFIFO, b's': S_IFSOCK}
+
+
 class CnOpts(object):
     '''Additional connection options beyond authentication.
 
@@ -126,11 +161,13 @@ class CnOpts(object):
         cval = self.ssh_config.lookup(host)
         return cval or {}
 
-    def get_hostkey(self, host):
+    def get_hostkey(self, host, key_type=None):
         '''Return the matching known hostkey to be used for verification or
         raise an SSHException.
 
         :param str host: The Hostname or IP of the remote machine.
+        :param str|None key_type: *Default: None* - Prefer the known key of
+            this type, such as the one the server presented, over the first.
 
         :returns: (obj) PKey - Public key(s) associated with host or None.
 
@@ -142,6 +179,8 @@ class CnOpts(object):
             raise SSHException(f'No hostkey for host [{host}] found.')
 
         # Return the public key from the dictionary
+        if key_type in kval:
+            return kval[key_type]
         return list(kval.values())[0]
 
 
@@ -162,6 +201,10 @@ class Connection(object):
         encrypted private_key.
     :param float|None timeout: *Default: None* - Set channel timeout.
     :param str|None username: *Default: None* - User for remote machine.
+    :param Metrics|None metrics: *Default: None* - Sink for timings and
+        counts of handshakes, channel opens, operations, bytes transferred,
+        retries and active workers. See :class:`Metrics`, measurements are
+        dropped if not given.
 
     :returns: (obj) Connection to the requested host.
 
@@ -174,18 +217,528 @@ class Connection(object):
     '''
     def __init__(self, host, cnopts=None, default_path=None, password=None,
                  port=22, private_key=None, private_key_pass=None,
-                 timeout=None, username=None):
+                 timeout=None, username=None, metrics=None):
         self._cnopts = cnopts or CnOpts()
         self._config = self._cnopts.get_config(host)
         self._default_path = default_path
+        self._host = self._config.get('hostname') or host
+        self._metrics = Metrics() if metrics is None else metrics
+        self._port = int(self._config.get('port') or port)
         self._set_logging()
         self._timeout = self._config.get('connecttimeout') or timeout
         self._transport = None
-        self._start_transport(self._config.get('hostname') or host,
-                              self._config.get('port') or port)
+        self._start_transport(self._host, self._port)
         self._set_username(self._config.get('user') or username)
         self._set_authentication(password, private_key, private_key_pass)
 
+    def _find(self, remotedir, recurse=True):
+        '''Yield (path, SFTPAttributes) for entries under remotedir from a
+        single find command, raising IOError if find fails.'''
+        command = (f'find {quote(remotedir)} -mindepth 1 '
+                   f'{"" if recurse else "-maxdepth 1 "}'
+                   f'-printf {quote(FIND_FORMAT)}')
+        errors, fields, remainder = [], [], b''
+
+        for stream, data in self.execute_stream(command):
+            if stream == 'stdout':
+                *records, remainder = (remainder + data).split(b'\0')
+                fields.extend(records)
+                while len(fields) >= 8:
+                    (kind, size, atime, mtime, mode, uid, gid,
+                     path) = fields[:8]
+                    del fields[:8]
+                    path = path.decode('utf-8', 'surrogateescape')
+                    attribute = SFTPAttributes()
+                    attribute.filename = Path(path).name
+                    attribute.st_atime = int(float(atime))
+                    attribute.st_gid = int(gid)
+                    attribute.st_mode = FIND_TYPES.get(kind, 0) | int(mode, 8)
+                    attribute.st_mtime = int(float(mtime))
+                    attribute.st_size = int(size)
+                    attribute.st_uid = int(uid)
+                    yield path, attribute
+            elif stream == 'stderr':
+                errors.append(data)
+            elif data != 0:
+                raise IOError(f'find exited [{data}]: '
+                              f'{b"".join(errors).decode().strip()}')
+
+    @contextmanager
+    def _atomic(self, channel, remotepath, atomic=True, resume=False):
+        '''Yield the name to upload remotepath under. Atomic uploads get a
+        hidden temporary name that is renamed over remotepath once the block
+        completes, or removed when it fails unless resume is to continue
+        it.'''
+        if not atomic:
+            yield remotepath
+            return
+
+        partial = _partial(remotepath, unique=not resume)
+        try:
+            yield partial
+        except Exception as err:
+            if not resume:
+                try:
+                    channel.remove(partial)
+                except Exception as cleanup:
+                    log.debug(f'Remove Partial: [FAILED] {cleanup}')
+            raise err
+        self._rename_batch(channel, [(partial, remotepath)])
+
+    def _close_handle(self, channel, remote, confirm=True, size=None,
+                      times=None):
+        '''Close an open remote file, setting its times with FSETSTAT and
+        fetching its attributes with FSTAT pipelined ahead of the CLOSE, so
+        neither costs a round trip of its own. Returns the attributes, empty
+        unless confirm or times are given, raising IOError when confirm finds
+        a size other than size.'''
+        attributes, requests = SFTPAttributes(), []
+        responses = _Responses()
+
+        remote.flush()
+        if times is not None:
+            attributes.st_atime, attributes.st_mtime = times
+            requests.append(channel._async_request(
+                responses, CMD_FSETSTAT, remote.handle, attributes))
+        if confirm or times is not None:
+            requests.append(channel._async_request(
+                responses, CMD_FSTAT, remote.handle))
+        remote.close()
+
+        for number in requests:
+            while number not in responses:
+                channel._read_response()
+            kind, message = responses.pop(number)
+            if kind == CMD_STATUS:
+                channel._convert_status(message)
+            elif kind == CMD_ATTRS:
+                attributes = SFTPAttributes._from_msg(message)
+            else:
+                raise SSHException(f'Expected attributes [{kind}]')
+
+        if confirm and size is not None and attributes.st_size != size:
+            raise IOError(('size mismatch in put! '
+                           f'{attributes.st_size} != {size}'))
+
+        return attributes
+
+    @contextmanager
+    def _cache_fetch(self, remotefile, cache, **kwargs):
+        '''Yield (cached file, SFTPAttributes) for remotefile out of a
+        FileCache, pinned so it isn't evicted while in the context. An entry
+        checked within the cache's ttl costs no round trip and carries the
+        attributes of the cached file, any other costs one STAT, and a miss
+        is fetched into the cache with get. A file larger than the cache's
+        budget is never cached, None is yielded in its place.'''
+        host = f'{self._username}@{self._host}:{self._port}'
+        remotefile = drivedrop(remotefile)
+        path = Path(self._default_path or '').joinpath(remotefile).as_posix()
+
+        with cache.pin(host, path):
+            cached = cache.fresh(host, path)
+            if cached is not None:
+                yield cached, SFTPAttributes.from_stat(cached.stat())
+                return
+
+            attributes = self.stat(remotefile)
+            if attributes.st_size > cache.budget:
+                yield None, attributes
+                return
+
+            cached = cache.lookup(host, path, attributes.st_size,
+                                  attributes.st_mtime)
+            if cached is None:
+                partial = cache.partial()
+                try:
+                    attributes = self.get(remotefile, partial, **kwargs)
+                    utime(partial, (attributes.st_atime,
+                                    attributes.st_mtime))
+                except Exception as err:
+                    Path(partial).unlink()
+                    raise err
+                # Changed within the second, it could change again
+                # unnoticed. The local clock stands in for the server's,
+                # see FileCache.
+                mtime = attributes.st_mtime
+                if mtime >= int(time()) - 1:
+                    mtime = None
+                cached = cache.store(host, path, attributes.st_size, mtime,
+                                     partial)
+
+            yield cached, attributes
+
+    def _check_files(self, paths, algorithm, workers=None):
+        '''Checksum remote files with the check-file extension, splitting
+        paths across a pool of channels. Files that can't be checked are
+        left out.'''
+        def _check(paths):
+            digests = {}
+            with self._sftp_channel() as channel:
+                for path in paths:
+                    try:
+                        with channel.open(path, 'rb') as remote:
+                            digests[path] = hexlify(
+                                remote.check(algorithm)).decode('ascii')
+                    except IOError as err:
+                        log.debug(f'Check File: [FAILED] {path} {err}')
+            return digests
+
+        # A channel for each slice, never more than there are paths.
+        digests, count = {}, min(_pool_size(workers), len(paths))
+        if not count:
+            return digests
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            for result in pool.map(_check, (paths[start::count]
+                                            for start in range(count))):
+                digests.update(result)
+
+        return digests
+
+    def _checksum_stream(self, command):
+        '''Yield (path, hexdigest) from a sha256sum -z style command as its
+        output streams in, raising IOError if it failed without producing
+        a single checksum.'''
+        records, remainder = 0, b''
+        for stream, data in self.execute_stream(command):
+            if stream == 'stdout':
+                *complete, remainder = (remainder + data).split(b'\0')
+                for record in complete:
+                    digest, _, path = record.partition(b'  ')
+                    if path:
+                        records += 1
+                        yield (path.decode('utf-8', 'surrogateescape'),
+                               digest.decode('ascii'))
+            elif stream == 'exit' and data != 0 and not records:
+                raise IOError(f'Checksum command failed [{data}]')
+
+    def _content_index(self, remotedir, dedup):
+        '''Map each remote path under remotedir to the sha256 digest of its
+        content. The manifest source reads the DEDUP_MANIFEST sidecar, the
+        execute source is :meth:`checksums` over the whole tree. A source
+        that can't be read leaves the index empty.'''
+        if dedup == 'execute':
+            try:
+                return self.checksums(remotedir)
+            except (IOError, SSHException) as err:
+                log.debug(f'Content Index: [UNAVAILABLE] {err}')
+                return {}
+        elif dedup == 'manifest':
+            root = f'{remotedir}/'
+            try:
+                with self._sftp_channel() as channel:
+                    with channel.open(root + DEDUP_MANIFEST, 'rb') as sidecar:
+                        records = sidecar.read()
+            except IOError:
+                records = b''
+        else:
+            raise ValueError(f'Unknown dedup [{dedup}].')
+
+        index = {}
+        for record in records.split(b'\0'):
+            digest, _, path = record.partition(b'  ')
+            if path:
+                index[root + path.decode('utf-8', 'surrogateescape')] = (
+                    digest.decode('ascii'))
+
+        return index
+
+    def _put_dedup(self, paths, remotedir, dedup, workers=None, **kwargs):
+        '''Upload (local, remote) pairs under remotedir, sending each distinct
+        content once. Local files are hashed across a thread pool and looked
+        up in _content_index, checked with a stat when it comes from the
+        sidecar. A file already in place is skipped and one
+        whose content is elsewhere, remotely or earlier in the batch, is
+        hardlinked to it. Servers without hardlink@openssh.com get a remote
+        cp when dedup is execute, an upload otherwise. Files are always
+        written under a temporary name and renamed into place, as writing
+        one in place would change every name linked to its old content.'''
+        kwargs.update(atomic=True, workers=workers)
+        paths = list(paths)
+        index = self._content_index(remotedir, dedup)
+
+        with ThreadPoolExecutor(max_workers=_pool_size(workers)) as pool:
+            digests = dict(zip((remote for local, remote in paths),
+                               pool.map(partial(hash, algorithm='sha256'),
+                                        (Path(local)
+                                         for local, remote in paths))))
+
+        # The sidecar may list files removed or rewritten since, only those
+        # still there at the size of the content they're listed with count.
+        if dedup == 'manifest' and index:
+            sizes = {digests[remote]: Path(local).stat().st_size
+                     for local, remote in paths}
+            with self._sftp_channel() as channel:
+                attributes = self._stat_batch(channel, [
+                    path for path, digest in index.items()
+                    if digest in sizes])
+            index = {path: digest for path, digest in index.items()
+                     if digest not in sizes or (
+                         path in attributes and
+                         attributes[path].st_size == sizes[digest])}
+
+        # Content about to be replaced can't be linked to.
+        sources = {}
+        for path, digest in index.items():
+            if digests.get(path, digest) == digest:
+                sources.setdefault(digest, path)
+
+        copies, present, uploads = [], 0, []
+        for local, remote in paths:
+            digest = digests[remote]
+            if index.get(remote) == digest:
+                present += 1
+            elif sources.setdefault(digest, remote) == remote:
+                uploads.append((local, remote))
+            else:
+                copies.append((local, remote, sources[digest]))
+        log.info(f'Dedup: [{len(uploads)}] sent, [{len(copies)}] linked, '
+                 f'[{present}] present')
+
+        if uploads:
+            self._put_files(uploads, **kwargs)
+
+        if copies:
+            targets = {remote: local for local, remote, source in copies}
+            with self._sftp_channel() as channel:
+                failed = self._link_batch(channel, [
+                    (source, remote) for local, remote, source in copies])
+                if failed and dedup == 'execute':
+                    partials = {newpath: _partial(newpath)
+                                for source, newpath in failed}
+                    try:
+                        results = self.execute_batch(
+                            [f'cp -- {quote(source)} '
+                             f'{quote(partials[newpath])}'
+                             for source, newpath in failed], shell=True)
+                    except (IOError, SSHException) as err:
+                        log.debug(f'Remote Copy: [UNAVAILABLE] {err}')
+                    else:
+                        copied = [pair for pair, result in zip(failed,
+                                                               results)
+                                  if result['exit'] == 0]
+                        failed = [pair for pair, result in zip(failed,
+                                                               results)
+                                  if result['exit'] != 0]
+                        self._remove_batch(channel, [
+                            partials[newpath] for source, newpath in failed])
+                        self._rename_batch(channel, [
+                            (partials[newpath], newpath)
+                            for source, newpath in copied])
+            if failed:
+                self._put_files([(targets[newpath], newpath)
+                                 for source, newpath in failed], **kwargs)
+
+        if dedup == 'manifest' and any(index.get(path) != digest
+                                       for path, digest in digests.items()):
+            index.update(digests)
+            records = b''.join(
+                (f'{digest}  {path[len(remotedir) + 1:]}\0').encode(
+                    'utf-8', 'surrogateescape')
+                for path, digest in sorted(index.items()))
+            self.putfo(BytesIO(records), f'{remotedir}/{DEDUP_MANIFEST}',
+                       atomic=True)
+
+    def _put_files(self, paths, atomic=False, finished=None, **kwargs):
+        '''Upload (local, remote) pairs through _transfer_files. Atomic
+        uploads go to temporary names, those that finished are renamed into
+        place together afterwards, even when others failed, and those that
+        didn't are removed unless they are to be resumed. finished is
+        handed (local, remote, attributes) for each upload that succeeds.'''
+        if not atomic:
+            return self._transfer_files(self.put, paths, finished=finished,
+                                        **kwargs)
+
+        renames, targets = [], {}
+        unique = not kwargs.get('resume')
+
+        def _finished(local, partial, attributes):
+            remote = targets.pop(partial)
+            renames.append((partial, remote))
+            if finished is not None:
+                finished(local, remote, attributes)
+
+        def _partials():
+            for local, remote in paths:
+                partial = _partial(remote, unique=unique)
+                targets[partial] = remote
+                yield local, partial
+
+        try:
+            self._transfer_files(self.put, _partials(), finished=_finished,
+                                 **kwargs)
+        finally:
+            if renames or (targets and unique):
+                with self._sftp_channel() as channel:
+                    if renames:
+                        self._rename_batch(channel, renames)
+                    if targets and unique:
+                        self._remove_batch(channel, targets)
+
+    def _link_batch(self, channel, pairs, window=64):
+        '''Hardlink each (remotepath, newpath) pair with
+        hardlink@openssh.com, pipelined like _rename_batch. Each link is made
+        under a temporary name, then renamed over newpath, so whatever is at
+        newpath stays until its replacement is in place. Returns the pairs
+        the server couldn't link, for lack of the extension or any other
+        reason such as remotepath having gone, to be sent another way. A
+        failure renaming the links into place is raised.'''
+        errors, failed, linked, unsupported = [], [], [], False
+        requests = (((pair, partial), CMD_EXTENDED, 'hardlink@openssh.com',
+                     channel._adjust_cwd(pair[0]),
+                     channel._adjust_cwd(partial))
+                    for pair, partial in ((pair, _partial(pair[1]))
+                                          for pair in pairs))
+
+        for (pair, partial), code, text in self._pipeline(channel, requests,
+                                                          window=window):
+            if code == SFTP_OK:
+                linked.append((partial, pair[1]))
+            elif code == SFTP_OP_UNSUPPORTED:
+                failed.append(pair)
+                unsupported = True
+            else:
+                log.debug(f'Hardlink: [FAILED] {text} linking {pair[1]} to '
+                          f'{pair[0]}')
+                failed.append(pair)
+
+        if unsupported:
+            log.debug('Hardlink: [UNSUPPORTED]')
+        try:
+            if linked:
+                self._rename_batch(channel, linked, window=window)
+        except IOError as err:
+            errors.append(err)
+            # Links that were renamed are gone, the rest are removed.
+            self._remove_batch(channel, [partial for partial, newpath
+                                         in linked], window=window)
+        if errors:
+            raise errors[0]
+
+        return failed
+
+    def _pipeline(self, channel, requests, window=64):
+        '''Send (key, command, *arguments) requests over the channel through
+        _pipelined, and yield (key, code, text) as their statuses come
+        back.'''
+        for key, kind, message in _pipelined(channel, requests,
+                                             window=window):
+            if kind != CMD_STATUS:
+                raise SSHException(f'Expected status [{kind}]')
+            yield key, message.get_int(), message.get_text()
+
+    def _read_into(self, channel, remote, view, size, callback):
+        '''Fill view with the first size bytes of the open remote file,
+        copying each pipelined READ response straight into place. Returns
+        size, raising IOError when the file ends short of it.'''
+        received = 0
+        for _, offset, data in self._read_ranges(channel, remote,
+                                                 [(0, size)], gap=0):
+            view[offset:offset + len(data)] = data
+            received += len(data)
+            callback(received, size)
+        if received != size:
+            raise IOError(f'size mismatch in get! {received} != {size}')
+        self._metrics.count('bytes_transferred_total', size, direction='get')
+
+        return received
+
+    def _read_ranges(self, channel, remote, ranges, gap=65536, window=64,
+                     blocksize=32768):
+        '''Read (offset, length) ranges of the open remote file, merging
+        ranges less than gap apart into spans read in blocksize READs and
+        keeping up to window of them in flight. Returns a generator of
+        (index, offset, data) for each piece of a range as it arrives, index
+        being the range's place in ranges and data a memoryview of the
+        response.'''
+        spans = []
+        for index, (offset, length) in sorted(enumerate(ranges),
+                                              key=itemgetter(1)):
+            if offset < 0 or length < 0:
+                raise ValueError(f'Unknown range [{offset}, {length}].')
+            if not length:
+                continue
+            if spans and offset <= spans[-1][1] + gap:
+                spans[-1][1] = max(spans[-1][1], offset + length)
+                spans[-1][2].append(index)
+            else:
+                spans.append([offset, offset + length, [index]])
+
+        reads = ((members, offset, min(blocksize, end - offset))
+                 for start, end, members in spans
+                 for offset in range(start, end, blocksize))
+
+        # Ranges are checked up front, the reads wait on the caller.
+        def _read():
+            for members, offset, data in _read_spans(
+                    channel, remote.handle, reads, window=window):
+                for index in members:
+                    start, size = ranges[index]
+                    low = max(start, offset)
+                    high = min(start + size, offset + len(data))
+                    if low < high:
+                        yield index, low, data[low - offset:high - offset]
+
+        return _read()
+
+    def _remove_batch(self, channel, paths, window=64):
+        '''Remove each of paths, pipelined like _rename_batch, to clear
+        away temporary files. Paths may already be gone, so failures are
+        only logged.'''
+        requests = ((path, CMD_REMOVE, channel._adjust_cwd(path))
+                    for path in paths)
+
+        for path, code, text in self._pipeline(channel, requests,
+                                               window=window):
+            if code != SFTP_OK:
+                log.debug(f'Remove: [{text}] {path}')
+
+    def _rename_batch(self, channel, pairs, window=64):
+        '''Rename each (remotepath, newpath) pair over newpath with
+        posix-rename@openssh.com, keeping up to window requests in flight
+        on the channel rather than waiting on each in turn. Servers without
+        the extension get newpath removed then a plain rename, which isn't
+        atomic, newpath is missing in between. Every pair is tried, the
+        first failure is raised after.'''
+        errors, unsupported = [], []
+        requests = ((pair, CMD_EXTENDED, 'posix-rename@openssh.com',
+                     *map(channel._adjust_cwd, pair))
+                    for pair in pairs)
+
+        for pair, code, text in self._pipeline(channel, requests,
+                                               window=window):
+            if code == SFTP_OP_UNSUPPORTED:
+                unsupported.append(pair)
+            elif code != SFTP_OK:
+                errors.append(IOError(f'{text} renaming {pair[0]} to '
+                                      f'{pair[1]}'))
+
+        if unsupported:
+            log.debug('Posix Rename: [UNSUPPORTED]')
+        for remotepath, newpath in unsupported:
+            try:
+                try:
+                    channel.remove(newpath)
+                except IOError:
+                    pass
+                channel.rename(remotepath, newpath)
+            except IOError as err:
+                errors.append(err)
+
+        if errors:
+            raise errors[0]
+
+    def _stat_batch(self, channel, paths, window=64):
+        '''Stat each of paths, pipelined like _rename_batch. Returns the
+        SFTPAttributes of those that exist, by path.'''
+        requests = ((path, CMD_STAT, channel._adjust_cwd(path))
+                    for path in paths)
+
+        return {path: SFTPAttributes._from_msg(message)
+                for path, kind, message in _pipelined(channel, requests,
+                                                      window=window)
+                if kind == CMD_ATTRS}
+
     def _set_authentication(self, password, private_key, private_key_pass):
         '''Authenticate transport. Prefer private key over password.'''
         if self._config.get('identityfile'):
@@ -275,6 +828,7 @@ class Connection(object):
         _channel = None
 
         try:
+            start = monotonic()
             _channel = SFTPClient.from_transport(self._transport)
 
             channel = _channel.get_channel()
@@ -286,6 +840,7 @@ class Connection(object):
             if self._default_path is not None:
                 _channel.chdir(drivedrop(self._default_path))
                 log.info(f'Current Working Directory: [{self._default_path}]')
+            self._metrics.observe('channel_open_seconds', monotonic() - start)
 
             yield _channel
         except Exception as err:
@@ -297,6 +852,7 @@ class Connection(object):
     def _start_transport(self, host, port):
         '''Start the transport and set connection options if specified.'''
         try:
+            start = monotonic()
             self._transport = Transport((host, int(port)))
 
             keepalive = self._config.get('serveraliveinterval') or 60
@@ -354,19 +910,21 @@ class Connection(object):
 
             if self._transport.is_active():
                 remote_hostkey = self._transport.get_remote_server_key()
-                remote_fingerprint = hash(remote_hostkey)
+                remote_fingerprint = hash(remote_hostkey.asbytes())
                 log.info((f'[{host}] Host Key:\n\t'
                           f'Name: {remote_hostkey.get_name()}\n\t'
                           f'Fingerprint: {remote_fingerprint}\n\t'
                           f'Size: {remote_hostkey.get_bits():d}'))
 
                 if self._cnopts.hostkeys is not None:
-                    user_hostkey = self._cnopts.get_hostkey(host)
-                    user_fingerprint = hash(user_hostkey)
+                    user_hostkey = self._cnopts.get_hostkey(
+                        host, key_type=remote_hostkey.get_name())
+                    user_fingerprint = hash(user_hostkey.asbytes())
                     log.info(f'Known Fingerprint: {user_fingerprint}')
                     if user_fingerprint != remote_fingerprint:
                         raise HostKeysException((f'{host} key verification: '
                                                  '[FAILED]'))
+                self._metrics.observe('handshake_seconds', monotonic() - start)
             else:
                 err = self._transport.get_exception()
                 if err:
@@ -377,10 +935,184 @@ class Connection(object):
         except Exception as err:
             raise err
 
+    def _transfer_files(self, transfer, paths, finished=None, workers=None,
+                        logger=getLogger(__name__), **kwargs):
+        '''Run transfer(source, destination) for each pair in paths
+        through a thread pool. Paths are consumed lazily, keeping only a
+        couple of tasks per worker queued at any time. Each pair that
+        succeeds is handed to finished, if given, along with what transfer
+        returned for it.'''
+        def _transfer(source, destination, **kwargs):
+            self._metrics.gauge('active_workers', 1)
+            try:
+                return transfer(source, destination, **kwargs)
+            finally:
+                self._metrics.gauge('active_workers', -1)
+
+        paths, workers = iter(paths), _pool_size(workers)
+        thread_prefix = uuid4().hex
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix=thread_prefix) as pool:
+            logger.debug(f'Thread Prefix: [{thread_prefix}]')
+            threads = {}
+            for source, destination in paths:
+                threads[pool.submit(_transfer, source, destination,
+                                    logger=logger, **kwargs)] = (
+                    source, destination)
+                if len(threads) < 2 * workers:
+                    continue
+                done, pending = wait(threads, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._transfer_result(future, threads.pop(future),
+                                          finished, logger)
+            for future in as_completed(threads):
+                self._transfer_result(future, threads[future], finished,
+                                      logger)
+
+    def _transfer_result(self, future, pair, finished, logger):
+        '''Log the outcome of a _transfer_files task, raising failures.'''
+        try:
+            result = future.result()
+        except Exception as err:
+            logger.error(f'Thread [{pair[0]}]: [FAILED]')
+            raise err
+        else:
+            logger.info(f'Thread [{pair[0]}]: [COMPLETE]')
+            if finished is not None:
+                finished(*pair, result)
+
+    def _verify(self, channel, remotepath, algorithm, digest, direction):
+        '''Compare digest, taken from the bytes as they were transferred,
+        with one the server computes for remotepath. The check-file
+        extension is asked first, then the matching sha256sum style command
+        with execute. Raises IOError on a mismatch or when the server can't
+        produce a checksum at all.'''
+        checksum = None
+        try:
+            with channel.open(remotepath, 'rb') as remote:
+                checksum = hexlify(remote.check(algorithm)).decode('ascii')
+        except IOError as err:
+            log.debug(f'Check File: [UNAVAILABLE] {err}')
+
+        if checksum is None and algorithm in CHECKSUM_COMMANDS:
+            command = (f'{CHECKSUM_COMMANDS[algorithm]} -- '
+                       f'{quote(channel.normalize(remotepath))}')
+            try:
+                output = b''.join(self.execute(command)).split()
+            except (IOError, SSHException) as err:
+                log.debug(f'Checksum Command: [UNAVAILABLE] {err}')
+            else:
+                if output and len(output[0]) == 2 * new(
+                        algorithm).digest_size:
+                    checksum = output[0].decode('ascii').lower()
+
+        if checksum is None:
+            raise IOError(f'no remote {algorithm} checksum for {remotepath}')
+        elif checksum != digest:
+            raise IOError((f'checksum mismatch in {direction}! '
+                           f'{digest} != {checksum}'))
+
+        return digest
+
+    def _walk(self, remotedir, recurse=True, backend='sftp', index=None):
+        '''Yield (path, SFTPAttributes) for entries under remotedir, parents
+        before their children. The sftp backend lists each directory once
+        over a single channel, the find backend runs one remote find command
+        and falls back to sftp if it fails before producing any entries. An
+        index replaces both, only listing directories whose mtime moved.'''
+        if index is not None:
+            yield from self._walk_index(remotedir, recurse, index)
+            return
+        elif backend == 'find':
+            entries = self._find(self.normalize(remotedir), recurse=recurse)
+            try:
+                entry = next(entries)
+            except StopIteration:
+                return
+            except (IOError, SSHException) as err:
+                log.debug(f'Find Backend: [UNAVAILABLE] {err}')
+            else:
+                yield entry
+                yield from entries
+                return
+        elif backend != 'sftp':
+            raise ValueError(f'Unknown backend [{backend}].')
+
+        with self._sftp_channel() as channel:
+            directories = [channel.normalize(drivedrop(remotedir))]
+            while directories:
+                directory = directories.pop()
+                for attribute in channel.listdir_attr(directory):
+                    path = Path(directory).joinpath(
+                        attribute.filename).as_posix()
+                    if recurse and S_ISDIR(attribute.st_mode):
+                        directories.append(path)
+                    yield path, attribute
+
+    def _walk_index(self, remotedir, recurse, index):
+        '''Walk remotedir like the sftp backend, serving directories whose
+        mtime matches the index from it instead of listing them.'''
+        host = f'{self._host}:{self._port}'
+
+        with self._sftp_channel() as channel:
+            root = channel.normalize(drivedrop(remotedir))
+            known = index.directories(host, root)
+            directories = [(root, channel.stat(root).st_mtime)]
+            try:
+                while directories:
+                    directory, mtime = directories.pop()
+                    if mtime is not None and known.get(directory) == mtime:
+                        listing = []
+                        for path, *fields in index.listing(host, root,
+                                                           directory):
+                            attribute = SFTPAttributes()
+                            attribute.filename = Path(path).name
+                            (attribute.st_size, attribute.st_mtime,
+                             attribute.st_mode, attribute.st_atime,
+                             attribute.st_uid, attribute.st_gid) = fields
+                            if recurse and S_ISDIR(attribute.st_mode):
+                                # Changes below a directory don't move the
+                                # mtime of its parent, so ask each one.
+                                try:
+                                    attribute.st_mtime = channel.stat(
+                                        path).st_mtime
+                                except IOError:
+                                    index.prune(host, root, path)
+                                    continue
+                            listing.append((path, attribute))
+                        log.debug(f'Index: [CURRENT] {directory}')
+                    else:
+                        listing = [(Path(directory).joinpath(
+                                        attribute.filename).as_posix(),
+                                    attribute)
+                                   for attribute in channel.listdir_attr(
+                                       directory)]
+                        # Whole second mtimes can't tell a change made in
+                        # the same second as this listing, so list it again
+                        # next time. The local clock stands in for the
+                        # server's, see RemoteIndex.
+                        index.store(host, root, directory,
+                                    None if mtime is None or
+                                    mtime >= int(time()) - 1 else mtime,
+                                    ((path, attribute.st_size,
+                                      attribute.st_mtime, attribute.st_mode,
+                                      attribute.st_atime, attribute.st_uid,
+                                      attribute.st_gid)
+                                     for path, attribute in listing))
+                        log.debug(f'Index: [LISTED] {directory}')
+                    for path, attribute in listing:
+                        if recurse and S_ISDIR(attribute.st_mode):
+                            directories.append((path, attribute.st_mtime))
+                        yield path, attribute
+            finally:
+                index.commit()
+
+    @_measured
     def get(self, remotefile, localpath=None, callback=None,
             max_concurrent_prefetch_requests=None, prefetch=True,
             preserve_mtime=False, resume=False, exceptions=None, tries=None,
-            backoff=2, delay=1, logger=getLogger(__name__), silent=False):
+            backoff=2, delay=1, logger=getLogger(__name__), silent=False,
+            verify=None, cache=None):
         '''Copies a file between the remote host and the local host.
 
         :param str remotefile: The remote path and filename to retrieve.
@@ -412,20 +1144,44 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
-
-        :returns: None
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the file with as it is written locally,
+            comparing that with a checksum computed by the server. With
+            resume, a local file that fails verification is emptied, so the
+            next attempt transfers it whole.
+        :param FileCache cache: *Default: None* - Serve the file from this
+            local cache when it holds the remote file's current size and
+            mtime, downloading it into the cache otherwise. Resume doesn't
+            apply.
+
+        :returns: (obj) SFTPAttributes of the remote file, carrying the
+            verified digest as checksum when verify is given.
 
         :raises: IOError
         '''
         @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
-               logger=logger, silent=silent)
+               logger=logger, metrics=self._metrics, silent=silent)
         def _get(self, remotefile, localpath=None, callback=None,
                  max_concurrent_prefetch_requests=None, prefetch=True,
-                 preserve_mtime=False, resume=False):
+                 preserve_mtime=False, resume=False, verify=None, cache=None):
 
             if localpath is None:
                 localpath = Path(remotefile).name
 
+            if cache is not None:
+                with self._cache_fetch(
+                        remotefile, cache, callback=callback,
+                        max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                        prefetch=prefetch, verify=verify,
+                        logger=logger) as (cached, remote_attributes):
+                    if cached is not None:
+                        copyfile(cached, localpath)
+                        if preserve_mtime:
+                            utime(localpath, (remote_attributes.st_atime,
+                                              remote_attributes.st_mtime))
+
+                        return remote_attributes
+
             if callback is None:
                 callback = partial(_callback, remotefile, logger=logger)
 
@@ -439,40 +1195,129 @@ class Connection(object):
                         localsize = 0
                     remote_attributes = remotesize = channel.stat(remotefile)
                     log.debug(f'[{remotesize.st_size}]: {remotefile}')
-                    if localsize < remotesize.st_size:
-                        with open(localpath, 'ab') as localfile:
+                    with open(localpath, 'a+b') as localfile:
+                        writer = localfile
+                        if verify:
+                            # What is already local joins the digest first.
+                            localfile.seek(0)
+                            writer = _Tee(localfile, verify)
+                            writer.skip(localsize)
+                        size = 0
+                        if localsize < remotesize.st_size:
                             with channel.open(remotefile, 'rb') as remotepath:
                                 if localsize > 0:
                                     remotepath.seek(localsize)
                                 if prefetch:
                                     remotepath.prefetch(remotesize.st_size,
                                                         max_concurrent_prefetch_requests)  # noqa: E501
-                                channel._transfer_with_callback(
+                                size = channel._transfer_with_callback(
                                                 callback=callback,
                                                 file_size=remotesize.st_size,
                                                 reader=remotepath,
-                                                writer=localfile)
+                                                writer=writer)
                 else:
-                    if preserve_mtime:
-                        remote_attributes = channel.stat(remotefile)
-
-                    channel.get(remotefile, localpath=localpath,
-                                callback=callback, prefetch=prefetch,
-                                max_concurrent_prefetch_requests=max_concurrent_prefetch_requests)  # noqa: E501
+                    with channel.open(remotefile, 'rb') as remote:
+                        # One fstat on the handle sizes the prefetch, checks
+                        # the transfer and carries the times to preserve.
+                        remote_attributes = remote.stat()
+                        if prefetch:
+                            remote.prefetch(remote_attributes.st_size,
+                                            max_concurrent_prefetch_requests)
+                        with open(localpath, 'wb') as local:
+                            writer = _Tee(local, verify) if verify else local
+                            size = channel._transfer_with_callback(
+                                callback=callback,
+                                file_size=remote_attributes.st_size,
+                                reader=remote, writer=writer)
+                    if size != remote_attributes.st_size:
+                        raise IOError(('size mismatch in get! '
+                                       f'{size} != '
+                                       f'{remote_attributes.st_size}'))
+                self._metrics.count('bytes_transferred_total', size,
+                                    direction='get')
+
+                if verify:
+                    try:
+                        remote_attributes.checksum = self._verify(
+                            channel, remotefile, verify, writer.hexdigest(),
+                            'get')
+                    except IOError:
+                        if resume:
+                            # Resuming would trust the bad bytes again.
+                            Path(localpath).write_bytes(b'')
+                        raise
 
             if preserve_mtime:
                 utime(localpath, (remote_attributes.st_atime,
                                   remote_attributes.st_mtime))
 
-        _get(self, remotefile, localpath=localpath, callback=callback,
-             max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,
-             prefetch=prefetch, preserve_mtime=preserve_mtime, resume=resume)
+            return remote_attributes
+
+        return _get(self, remotefile, localpath=localpath, cache=cache,
+                    callback=callback,
+                    max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                    prefetch=prefetch, preserve_mtime=preserve_mtime,
+                    resume=resume, verify=verify)
+
+    @_measured
+    def get_bytes(self, remotefile, callback=None, verify=None,
+                  exceptions=None, tries=None, backoff=2, delay=1,
+                  logger=getLogger(__name__), silent=False):
+        '''Read a remote file into memory, allocating a buffer of its size
+        once and filling it with pipelined READs in place.
 
+        :param str remotefile: The remote path and filename to retrieve.
+        :param callable callback: Optional callback function (form: ``func(
+            int, int)``) that accepts the bytes transferred so far and the
+            total bytes to be transferred.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the contents with once read, comparing that
+            with a checksum computed by the server.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
+
+        :returns: (bytearray) Contents of the remote file.
+
+        :raises: IOError
+        '''
+        @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _get_bytes(self, remotefile, callback=None, verify=None):
+
+            if callback is None:
+                callback = partial(_callback, remotefile, logger=logger)
+
+            with self._sftp_channel() as channel:
+                with channel.open(remotefile, 'rb') as remote:
+                    buffer = bytearray(remote.stat().st_size)
+                    self._read_into(channel, remote, memoryview(buffer),
+                                    len(buffer), callback)
+                if verify:
+                    self._verify(channel, remotefile, verify,
+                                 new(verify, buffer).hexdigest(),
+                                 'get_bytes')
+
+            return buffer
+
+        return _get_bytes(self, remotefile, callback=callback, verify=verify)
+
+    @_measured
     def get_d(self, remotedir, localdir, callback=None,
               max_concurrent_prefetch_requests=None, pattern=None,
               prefetch=True, preserve_mtime=False, resume=False, workers=None,
               exceptions=None, tries=None, backoff=2, delay=1,
-              logger=getLogger(__name__), silent=False):
+              logger=getLogger(__name__), silent=False, verify=None):
         '''Get the contents of remotedir and write to locadir. Non-recursive.
 
         :param str remotedir: The remote directory to copy locally.
@@ -508,8 +1353,12 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest each file with as it is written locally,
+            comparing that with a checksum computed by the server.
 
-        :returns: None
+        :returns: (dict) Verified digest of each remote file transferred,
+            by remote path, when verify is given. Otherwise None.
 
         :raises: Any exception raised by operations will be passed through.
         '''
@@ -519,63 +1368,101 @@ class Connection(object):
             Path(localdir).mkdir(exist_ok=True, parents=True)
             logger.info(f'Creating Folder [{localdir}]!')
 
-        if pattern is None:
-            paths = [
-                     (Path(remotedir).joinpath(attribute.filename).as_posix(),
-                      Path(localdir).joinpath(attribute.filename).as_posix(),
-                      callback, max_concurrent_prefetch_requests, prefetch,
-                      preserve_mtime, resume, exceptions, tries, backoff,
-                      delay, logger, silent)
-                     for attribute in filelist if S_ISREG(attribute.st_mode)
-                    ]
-        else:
-            paths = [
-                     (Path(remotedir).joinpath(attribute.filename).as_posix(),
-                      Path(localdir).joinpath(attribute.filename).as_posix(),
-                      callback, max_concurrent_prefetch_requests, prefetch,
-                      preserve_mtime, resume, exceptions, tries, backoff,
-                      delay, logger, silent)
-                     for attribute in filelist if S_ISREG(attribute.st_mode)
-                     if f'{pattern}' in attribute.filename
-                    ]
+        paths = [
+                 (Path(remotedir).joinpath(attribute.filename).as_posix(),
+                  Path(localdir).joinpath(attribute.filename).as_posix())
+                 for attribute in filelist if S_ISREG(attribute.st_mode)
+                 if pattern is None or f'{pattern}' in attribute.filename
+                ]
+
+        digests = {}
+
+        def _verified(remote, local, attributes):
+            digests[remote] = attributes.checksum
 
         if paths != []:
-            thread_prefix = uuid4().hex
-            with ThreadPoolExecutor(max_workers=workers,
-                                    thread_name_prefix=thread_prefix) as pool:
-                logger.debug(f'Thread Prefix: [{thread_prefix}]')
-                threads = {
-                           pool.submit(self.get, remote, local,
-                                       callback=callback,
-                                       max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
-                                       prefetch=prefetch, resume=resume,
-                                       preserve_mtime=preserve_mtime,
-                                       exceptions=exceptions, tries=tries,
-                                       backoff=backoff, delay=delay,
-                                       logger=logger, silent=silent): remote
-                           for remote, local, callback,
-                           max_concurrent_prefetch_requests, prefetch,
-                           preserve_mtime, resume, exceptions, tries, backoff,
-                           delay, logger, silent in paths
-                          }
-                for future in as_completed(threads):
-                    name = threads[future]
-                    try:
-                        data = future.result()
-                    except Exception as err:
-                        logger.error(f'Thread [{name}]: [FAILED]')
-                        raise err
-                    else:
-                        logger.info(f'Thread [{name}]: [COMPLETE]')
-                        return data
+            self._transfer_files(self.get, paths,
+                                 finished=_verified if verify else None,
+                                 callback=callback,
+                                 max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                                 prefetch=prefetch,
+                                 preserve_mtime=preserve_mtime,
+                                 resume=resume, verify=verify,
+                                 workers=workers, exceptions=exceptions,
+                                 tries=tries,
+                                 backoff=backoff, delay=delay, logger=logger,
+                                 silent=silent)
         else:
             logger.info(f'No files found in directory [{remotedir}]')
 
+        return digests if verify else None
+
+    @_measured
+    def get_into(self, remotefile, buffer, callback=None, verify=None,
+                 exceptions=None, tries=None, backoff=2, delay=1,
+                 logger=getLogger(__name__), silent=False):
+        '''Read a remote file into the start of a writable buffer, such as a
+        bytearray, mmap or array, filling it with pipelined READs in place.
+
+        :param str remotefile: The remote path and filename to retrieve.
+        :param buffer: Writable buffer at least the size of the remote file.
+        :param callable callback: Optional callback function (form: ``func(
+            int, int)``) that accepts the bytes transferred so far and the
+            total bytes to be transferred.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the contents with once read, comparing that
+            with a checksum computed by the server.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
+
+        :returns: (int) The number of bytes written to buffer.
+
+        :raises: IOError
+        :raises ValueError: if buffer is smaller than the remote file
+        '''
+        @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _get_into(self, remotefile, buffer, callback=None, verify=None):
+
+            if callback is None:
+                callback = partial(_callback, remotefile, logger=logger)
+
+            view = memoryview(buffer).cast('B')
+            with self._sftp_channel() as channel:
+                with channel.open(remotefile, 'rb') as remote:
+                    size = remote.stat().st_size
+                    if size > len(view):
+                        raise ValueError(('Buffer smaller than file '
+                                          f'[{len(view)} < {size}].'))
+                    self._read_into(channel, remote, view, size, callback)
+                if verify:
+                    self._verify(channel, remotefile, verify,
+                                 new(verify, view[:size]).hexdigest(),
+                                 'get_into')
+
+            return size
+
+        return _get_into(self, remotefile, buffer, callback=callback,
+                         verify=verify)
+
+    @_measured
     def get_r(self, remotedir, localdir, callback=None,
               max_concurrent_prefetch_requests=None, pattern=None,
               prefetch=True, preserve_mtime=False, resume=False, workers=None,
               exceptions=None, tries=None, backoff=2, delay=1,
-              logger=getLogger(__name__), silent=False):
+              logger=getLogger(__name__), silent=False, backend='sftp',
+              index=None, verify=None):
         '''Recursively copy remotedir structure to localdir
 
         :param str remotedir: The remote directory to recursively copy.
@@ -611,8 +1498,16 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
+        :param str backend: *Default: sftp* - How the remote tree is listed,
+            see :meth:`.remotetree`.
+        :param RemoteIndex index: *Default: None* - Index to list the remote
+            tree through, see :meth:`.remotetree`.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest each file with as it is written locally,
+            comparing that with a checksum computed by the server.
 
-        :returns: None
+        :returns: (dict) Verified digest of each remote file transferred,
+            by remote path, when verify is given. Otherwise None.
 
         :raises: Any exception raised by operations will be passed through.
         '''
@@ -621,26 +1516,116 @@ class Connection(object):
         lwd = Path(localdir).absolute().as_posix()
         rwd = self._default_path
 
-        tree = {}
+        tree = Manifest()
         tree[rwd] = [(rwd, lwd)]
+        self.remotetree(tree, rwd, lwd, backend=backend, index=index)
+        log.debug(f'Remote Tree: [{tree.count}] entries')
+
+        directories = {}
+        for remote, local in (branch for branches in tree.values()
+                              for branch in branches):
+            directories[f'{remote.rstrip("/")}/'] = local
+            Path(local).mkdir(exist_ok=True, parents=True)
+
+        paths = (
+                 (remote, f'{directories[remote[:remote.rfind("/") + 1]]}/'
+                          f'{remote[remote.rfind("/") + 1:]}')
+                 for remote, size, mtime, mode, *_ in tree.entries()
+                 if S_ISREG(mode)
+                 if pattern is None or f'{pattern}' in Path(remote).name
+                )
 
-        self.remotetree(tree, rwd, lwd, recurse=True)
-        log.debug(f'Remote Tree: [{tree}]')
+        digests = {}
+
+        def _verified(remote, local, attributes):
+            digests[remote] = attributes.checksum
+
+        # The tree counts directories too, look for a file to transfer.
+        first = next(paths, None)
+        if first is not None:
+            self._transfer_files(self.get, chain([first], paths),
+                                 finished=_verified if verify else None,
+                                 callback=callback,
+                                 max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                                 prefetch=prefetch,
+                                 preserve_mtime=preserve_mtime,
+                                 resume=resume, verify=verify,
+                                 workers=workers, exceptions=exceptions,
+                                 tries=tries,
+                                 backoff=backoff, delay=delay, logger=logger,
+                                 silent=silent)
+        else:
+            logger.info(f'No files found in directory [{remotedir}]')
 
-        for roots in tree.keys():
-            for remote, local in tree[roots]:
-                self.get_d(remote, local, callback=callback,
-                           max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
-                           pattern=pattern, prefetch=prefetch,
-                           preserve_mtime=preserve_mtime, resume=resume,
-                           workers=workers, exceptions=exceptions, tries=tries,
-                           backoff=backoff, delay=delay, logger=logger,
-                           silent=silent)
+        return digests if verify else None
+
+    @_measured
+    def get_range(self, remotefile, ranges, localpath=None, gap=65536,
+                  exceptions=None, tries=None, backoff=2, delay=1,
+                  logger=getLogger(__name__), silent=False):
+        '''Copy byte ranges of a remote file into a local file, each at the
+        offset it was read from. Ranges less than gap apart are read as one
+        and every READ is pipelined. Anything already in the local file
+        outside the ranges is left as it was.
+
+        :param str remotefile: The remote path and filename to read.
+        :param list ranges: (offset, length) pairs to read.
+        :param str localpath: The local path to write ranges to.
+            If None, written to the local current working directory.
+        :param int gap: *Default: 65536* - Largest span of unwanted bytes
+            read through to join two ranges into one.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
+
+        :returns: (list) Bytes received for each range, in the order given,
+            short of its length where it runs past the end of the file.
+
+        :raises: IOError
+        :raises ValueError: if a range has a negative offset or length
+        '''
+        @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _get_range(self, remotefile, ranges, localpath=None, gap=65536):
+
+            if localpath is None:
+                localpath = Path(remotefile).name
 
+            received = [0] * len(ranges)
+            mode = 'r+b' if Path(localpath).is_file() else 'wb'
+            with self._sftp_channel() as channel:
+                with channel.open(remotefile, 'rb') as remote:
+                    pieces = self._read_ranges(channel, remote, ranges,
+                                               gap=gap)
+                    with open(localpath, mode) as local:
+                        for index, offset, data in pieces:
+                            local.seek(offset)
+                            local.write(data)
+                            received[index] += len(data)
+            self._metrics.count('bytes_transferred_total', sum(received),
+                                direction='get')
+
+            return received
+
+        return _get_range(self, remotefile, list(ranges), localpath=localpath,
+                          gap=gap)
+
+    @_measured
     def getfo(self, remotefile, flo, callback=None,
               max_concurrent_prefetch_requests=None, prefetch=True,
               exceptions=None, tries=None, backoff=2, delay=1,
-              logger=getLogger(__name__), silent=False):
+              logger=getLogger(__name__), silent=False, verify=None,
+              cache=None):
         '''Copy a remote file (remotepath) to a file-like object, flo.
 
         :param str remotefile: The remote path and filename to retrieve.
@@ -665,33 +1650,123 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the contents with as they are written to
+            flo, comparing that with a checksum computed by the server.
+        :param FileCache cache: *Default: None* - Serve the contents from
+            this local cache when it holds the remote file's current size
+            and mtime, downloading it into the cache otherwise.
 
         :returns: (int) The number of bytes written to the opened file object
 
         :raises: Any exception raised by operations will be passed through.
         '''
         @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
-               logger=logger, silent=silent)
+               logger=logger, metrics=self._metrics, silent=silent)
         def _getfo(self, remotefile, flo, callback=None,
-                   max_concurrent_prefetch_requests=None, prefetch=True):
+                   max_concurrent_prefetch_requests=None, prefetch=True,
+                   verify=None, cache=None):
+
+            if cache is not None:
+                with self._cache_fetch(
+                        remotefile, cache, callback=callback,
+                        max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                        prefetch=prefetch, verify=verify,
+                        logger=logger) as (cached, attributes):
+                    if cached is not None:
+                        with open(cached, 'rb') as local:
+                            copyfileobj(local, flo)
+
+                        return attributes.st_size
 
             if callback is None:
                 callback = partial(_callback, remotefile, logger=logger)
 
             with self._sftp_channel() as channel:
-                flo_size = channel.getfo(remotefile, flo, callback=callback,
+                writer = _Tee(flo, verify) if verify else flo
+                flo_size = channel.getfo(remotefile, writer,
+                                         callback=callback,
                                          max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
                                          prefetch=prefetch)
+                self._metrics.count('bytes_transferred_total', flo_size,
+                                    direction='get')
+                if verify:
+                    self._verify(channel, remotefile, verify,
+                                 writer.hexdigest(), 'getfo')
 
             return flo_size
 
-        return _getfo(self, remotefile, flo, callback=callback,
+        return _getfo(self, remotefile, flo, cache=cache, callback=callback,
                       max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
-                      prefetch=prefetch)
+                      prefetch=prefetch, verify=verify)
+
+    @_measured
+    def getfo_range(self, remotefile, ranges, flo, gap=65536,
+                    exceptions=None, tries=None, backoff=2, delay=1,
+                    logger=getLogger(__name__), silent=False):
+        '''Copy byte ranges of a remote file into a writable buffer, such as
+        a bytearray or mmap, or a seekable file like object, each at the
+        offset it was read from. Ranges less than gap apart are read as one
+        and every READ is pipelined. Buffers are filled in place, with no
+        copy beyond the one out of each response.
+
+        :param str remotefile: The remote path and filename to read.
+        :param list ranges: (offset, length) pairs to read.
+        :param flo: Writable buffer, or seekable file like object open for
+            writing, at least as large as the furthest range.
+        :param int gap: *Default: 65536* - Largest span of unwanted bytes
+            read through to join two ranges into one.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
+
+        :returns: (list) Bytes received for each range, in the order given,
+            short of its length where it runs past the end of the file.
 
+        :raises: Any exception raised by operations will be passed through.
+        :raises ValueError: if a range has a negative offset or length
+        '''
+        @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _getfo_range(self, remotefile, ranges, flo, gap=65536):
+            try:
+                view = memoryview(flo).cast('B')
+            except TypeError:
+                view = None
+
+            received = [0] * len(ranges)
+            with self._sftp_channel() as channel:
+                with channel.open(remotefile, 'rb') as remote:
+                    for index, offset, data in self._read_ranges(
+                            channel, remote, ranges, gap=gap):
+                        if view is None:
+                            flo.seek(offset)
+                            flo.write(data)
+                        else:
+                            view[offset:offset + len(data)] = data
+                        received[index] += len(data)
+            self._metrics.count('bytes_transferred_total', sum(received),
+                                direction='get')
+
+            return received
+
+        return _getfo_range(self, remotefile, list(ranges), flo, gap=gap)
+
+    @_measured
     def put(self, localfile, remotepath=None, callback=None, confirm=True,
             preserve_mtime=False, resume=False, exceptions=None, tries=None,
-            backoff=2, delay=1, logger=getLogger(__name__), silent=False):
+            backoff=2, delay=1, logger=getLogger(__name__), silent=False,
+            atomic=False, verify=None):
         '''Copies a file between the local host and the remote host.
 
         :param str localfile: The local path and filename to copy remotely.
@@ -707,7 +1782,8 @@ class Connection(object):
             (st_atime can differ because stat'ing the localfile can/does update
             it's st_atime)
         :param bool resume: *Default: False* - Continue a previous transfer
-            based on destination path matching.
+            based on destination path matching, sending the whole file when
+            there is none.
         :param Exception exceptions: Exception(s) to check. May be a tuple of
             exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
             or (ValueError, IOError(errno.ECOMM))
@@ -721,16 +1797,30 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
-
-        :returns: (obj) SFTPAttributes containing details about the given file.
+        :param bool atomic: *Default: False* - Upload under a hidden
+            temporary name in the same directory, renaming it over remotepath
+            once complete so nothing sees a partial file. The temporary file
+            is removed if the upload fails, unless resume keeps it under a
+            fixed name for a resumed upload to continue. Servers without
+            posix-rename have remotepath removed first, so it is briefly
+            missing.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the file with as it is read for sending,
+            comparing that with a checksum computed by the server. An atomic
+            upload is verified before it is renamed into place.
+
+        :returns: (obj) SFTPAttributes containing details about the given
+            file, carrying the verified digest as checksum when verify is
+            given.
 
         :raises IOError: if remotepath doesn't exist
         :raises OSError: if localfile doesn't exist
         '''
         @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
-               logger=logger, silent=silent)
-        def _put(self, localfile, remotepath=None, callback=None,
-                 confirm=True, preserve_mtime=False, resume=False):
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _put(self, localfile, remotepath=None, callback=None, confirm=True,
+                 preserve_mtime=False, resume=False, atomic=False,
+                 verify=None):
 
             if remotepath is None:
                 remotepath = Path(localfile).name
@@ -738,58 +1828,161 @@ class Connection(object):
             if callback is None:
                 callback = partial(_callback, localfile, logger=logger)
 
+            local_attributes = Path(localfile).stat()
+            local_times = None
             if preserve_mtime:
-                local_attributes = Path(localfile).stat()
                 local_times = (local_attributes.st_atime,
                                local_attributes.st_mtime)
 
-            with self._sftp_channel() as channel:
-                remotepath = drivedrop(remotepath)
+            with self._sftp_channel() as channel, self._atomic(
+                    channel, drivedrop(remotepath), atomic,
+                    resume=resume) as remotepath:
+                localsize, remotesize = local_attributes.st_size, 0
+                attributes = None
                 if resume:
-                    remote = channel.stat(remotepath)
-                    if S_ISREG(remote.st_mode):
-                        remotesize = remote.st_size
-                        log.info((f'Resuming existing upload of {remotepath} '
-                                  f'@ {remotesize} bytes'))
+                    try:
+                        attributes = channel.stat(remotepath)
+                    except FileNotFoundError:
+                        # A first attempt has nothing to resume yet.
+                        log.debug(f'Nothing to resume at {remotepath}')
                     else:
-                        remotesize = 0
-                    localsize = Path(localfile).stat().st_size
+                        if S_ISREG(attributes.st_mode):
+                            remotesize = attributes.st_size
+                            log.info(('Resuming existing upload of '
+                                      f'{remotepath} @ {remotesize} bytes'))
                     log.debug(f'[{localsize}]: {localfile}')
-                    if localsize > remotesize:
-                        with channel.open(remotepath, 'ab') as remotefile:
-                            remotefile.set_pipelined(True)
-                            with open(localfile, 'rb') as localpath:
-                                if remotesize > 0:
-                                    localpath.seek(remotesize)
-                                resumesize = channel._transfer_with_callback(
-                                    callback=callback, file_size=localsize,
-                                    reader=localpath, writer=remotefile)
-                    if confirm:
-                        attributes = channel.stat(remotepath)
-                        if attributes.st_size != (remotesize + resumesize):
-                            raise IOError(('size mismatch in put! '
-                                           f'{attributes.st_size} != '
-                                           f'{remotesize}'))
 
+                if attributes is None or localsize > remotesize:
+                    with open(localfile, 'rb') as local:
+                        reader = _Tee(local, verify) if verify else local
+                        with channel.open(remotepath,
+                                          'ab' if resume else 'wb') as remote:
+                            remote.set_pipelined(True)
+                            if verify:
+                                # What is already remote joins the digest.
+                                reader.skip(remotesize)
+                            elif remotesize > 0:
+                                local.seek(remotesize)
+                            size = channel._transfer_with_callback(
+                                callback=callback, file_size=localsize,
+                                reader=reader, writer=remote)
+                            attributes = self._close_handle(
+                                channel, remote, confirm=confirm,
+                                size=localsize, times=local_times)
+                    self._metrics.count('bytes_transferred_total', size,
+                                        direction='put')
+                    if verify:
+                        digest = reader.hexdigest()
                 else:
-                    attributes = channel.put(localfile, remotepath=remotepath,
-                                             callback=callback,
-                                             confirm=confirm)
+                    # Nothing left to send, reuse what resume fetched.
+                    if confirm and attributes.st_size != localsize:
+                        raise IOError(('size mismatch in put! '
+                                       f'{attributes.st_size} != '
+                                       f'{localsize}'))
+                    if preserve_mtime:
+                        channel.utime(remotepath, local_times)
+                        attributes.st_atime, attributes.st_mtime = map(
+                            int, local_times)
+                    if verify:
+                        digest = hash(localfile, algorithm=verify)
+
+                if verify:
+                    attributes.checksum = self._verify(
+                        channel, remotepath, verify, digest, 'put')
+
+            return attributes
+
+        return _put(self, localfile, remotepath=remotepath, atomic=atomic,
+                    callback=callback, confirm=confirm,
+                    preserve_mtime=preserve_mtime, resume=resume,
+                    verify=verify)
+
+    @_measured
+    def put_bytes(self, data, remotepath=None, atomic=False, callback=None,
+                  confirm=True, verify=None, exceptions=None, tries=None,
+                  backoff=2, delay=1, logger=getLogger(__name__),
+                  silent=False):
+        '''Copies bytes, a bytearray, memoryview or any other buffer to
+        remotepath, sending slices of it with pipelined WRITEs rather than
+        copying it into a file like object first.
+
+        :param data: Buffer holding the contents to send.
+        :param str remotepath: The remote location to save contents to.
+        :param bool atomic: *Default: False* - Upload under a hidden
+            temporary name in the same directory, renaming it over remotepath
+            once complete so nothing sees a partial file.
+        :param callable callback: Optional callback function (form: ``func(
+            int, int)``) that accepts the bytes transferred so far and the
+            total bytes to be transferred.
+        :param bool confirm: *Default: True* - Whether to do a stat() on the
+            file afterwards to confirm the file size.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the contents with as they are sent,
+            comparing that with a checksum computed by the server.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
 
-                if preserve_mtime:
-                    channel.utime(remotepath, local_times)
-                    attributes = channel.stat(remotepath)
+        :returns: (obj) SFTPAttributes containing details about the given
+            file, carrying the verified digest as checksum when verify is
+            given.
+
+        :raises: IOError
+        '''
+        @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
+               logger=logger, metrics=self._metrics, silent=silent)
+        def _put_bytes(self, data, remotepath=None, atomic=False,
+                       callback=None, confirm=True, verify=None):
+
+            if remotepath is None:
+                remotepath = uuid4().hex
+
+            if callback is None:
+                callback = partial(_callback, remotepath, logger=logger)
+
+            view = memoryview(data).cast('B')
+            digest = new(verify) if verify else None
+            with self._sftp_channel() as channel, self._atomic(
+                    channel, remotepath, atomic) as remotepath:
+                with channel.open(remotepath, 'wb') as remote:
+                    remote.set_pipelined(True)
+                    for offset in range(0, len(view), 1048576):
+                        chunk = view[offset:offset + 1048576]
+                        remote.write(chunk)
+                        if digest:
+                            digest.update(chunk)
+                        callback(offset + len(chunk), len(view))
+                    attributes = self._close_handle(channel, remote,
+                                                    confirm=confirm,
+                                                    size=len(view))
+                self._metrics.count('bytes_transferred_total', len(view),
+                                    direction='put')
+                if verify:
+                    attributes.checksum = self._verify(
+                        channel, remotepath, verify, digest.hexdigest(),
+                        'put_bytes')
 
             return attributes
 
-        return _put(self, localfile, remotepath=remotepath, callback=callback,
-                    confirm=confirm, preserve_mtime=preserve_mtime,
-                    resume=resume)
+        return _put_bytes(self, data, remotepath=remotepath, atomic=atomic,
+                          callback=callback, confirm=confirm, verify=verify)
 
+    @_measured
     def put_d(self, localdir, remotedir, callback=None, confirm=True,
               preserve_mtime=False, resume=False, workers=None,
               exceptions=None, tries=None, backoff=2, delay=1,
-              logger=getLogger(__name__), silent=False):
+              logger=getLogger(__name__), silent=False, atomic=False,
+              dedup=None, verify=None):
         '''Copies a local directory's contents to a remotepath
 
         :param str localdir: The local directory to copy remotely.
@@ -821,8 +2014,26 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
-
-        :returns: None
+        :param bool atomic: *Default: False* - Upload each file under a
+            hidden temporary name, renaming them all into place in one
+            pipelined batch once the transfers are done. Those of failed
+            uploads are removed, unless resume is set.
+        :param str dedup: *Default: None* - Send each distinct content once,
+            hashing local files with sha256 and hardlinking any whose content
+            is already under remotedir, or earlier in the same upload, to
+            that copy. The remote content comes from the
+            ``.sftpretty.sha256`` sidecar kept there by ``manifest``, or from
+            sha256sum run over remotedir by ``execute``, which also falls
+            back to a remote cp where hardlinks aren't supported. Links share
+            their content, so only suits files that are replaced, never
+            modified in place, and implies atomic for that reason.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest each file with as it is read for sending,
+            comparing that with a checksum computed by the server.
+
+        :returns: (dict) Verified digest of each file uploaded, by remote
+            path, when verify is given. Otherwise None. Files linked
+            instead of sent aren't included.
 
         :raises IOError: if remotedir doesn't exist
         :raises OSError: if localdir doesn't exist
@@ -830,52 +2041,122 @@ class Connection(object):
         localdir = Path(localdir)
 
         self.mkdir_p(Path(remotedir).joinpath(localdir.stem).as_posix())
+        if dedup:
+            remotedir = self.normalize(remotedir)
 
         paths = [
-                 (localpath.as_posix(),
-                  Path(remotedir).joinpath(
-                      localpath.relative_to(
-                          localdir.parent).as_posix()).as_posix(),
-                  callback, confirm, preserve_mtime, resume, exceptions, tries,
-                  backoff, delay, logger, silent)
-                 for localpath in localdir.iterdir()
-                 if localpath.is_file()
+                 (local, Path(remotedir).joinpath(
+                     Path(local).relative_to(
+                         localdir.parent).as_posix()).as_posix())
+                 for local, size, mtime, mode, *_ in localscan(
+                     localdir, recurse=False)
+                 if S_ISREG(mode)
                 ]
 
-        if paths != []:
-            thread_prefix = uuid4().hex
-            with ThreadPoolExecutor(max_workers=workers,
-                                    thread_name_prefix=thread_prefix) as pool:
-                logger.debug(f'Thread Prefix: [{thread_prefix}]')
-                threads = {
-                           pool.submit(self.put, local, remote,
-                                       callback=callback, confirm=confirm,
-                                       preserve_mtime=preserve_mtime,
-                                       resume=resume, exceptions=exceptions,
-                                       tries=tries, backoff=backoff,
-                                       delay=delay, logger=logger,
-                                       silent=silent): local
-                           for local, remote, callback, confirm,
-                           preserve_mtime, resume, exceptions, tries, backoff,
-                           delay, logger, silent in paths
-                          }
-                for future in as_completed(threads):
-                    name = threads[future]
-                    try:
-                        data = future.result()
-                    except Exception as err:
-                        logger.error(f'Thread [{name}]: [FAILED]')
-                        raise err
-                    else:
-                        logger.info(f'Thread [{name}]: [COMPLETE]')
-                        return data
+        digests = {}
+
+        def _verified(local, remote, attributes):
+            digests[remote] = attributes.checksum
+
+        kwargs = dict(atomic=atomic, callback=callback, confirm=confirm,
+                      finished=_verified if verify else None,
+                      preserve_mtime=preserve_mtime, resume=resume,
+                      verify=verify, workers=workers, exceptions=exceptions,
+                      tries=tries, backoff=backoff, delay=delay,
+                      logger=logger, silent=silent)
+        if paths != [] and dedup:
+            self._put_dedup(paths, remotedir, dedup, **kwargs)
+        elif paths != []:
+            self._put_files(paths, **kwargs)
         else:
             logger.info(f'No files found in directory [{localdir}]')
 
+        return digests if verify else None
+
+    @_measured
+    def put_iter(self, chunks, remotepath=None, atomic=False, callback=None,
+                 confirm=True, loop=None, verify=None,
+                 logger=getLogger(__name__)):
+        '''Copies byte chunks from an iterator, generator or async iterator
+        to remotepath as they are produced, with no size known up front.
+        Chunks are gathered into full WRITE requests kept in flight
+        pipelined. Not retried, the chunks can only be consumed once, so a
+        failed upload is removed rather than left to resume.
+
+        :param chunks: Iterable or async iterable of bytes like objects.
+        :param str remotepath: The remote location to save contents to.
+        :param bool atomic: *Default: False* - Upload under a hidden
+            temporary name in the same directory, renaming it over remotepath
+            once complete so nothing sees a partial file.
+        :param callable callback: Optional callback function (form: ``func(
+            int, int)``) that accepts the bytes transferred so far and None,
+            at most once per 32768 bytes, then the final size as both once
+            chunks runs out.
+        :param bool confirm: *Default: True* - Whether to do a stat() on the
+            file afterwards to confirm the file size.
+        :param loop: *Default: None* - Event loop an async iterable belongs
+            to, with put_iter run in another thread, such as through
+            ``loop.run_in_executor``. Otherwise it is driven on a loop of its
+            own.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the chunks with as they are sent, comparing
+            that with a checksum computed by the server.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+
+        :returns: (obj) SFTPAttributes containing details about the given
+            file, carrying the verified digest as checksum when verify is
+            given.
+
+        :raises: IOError
+        '''
+        if remotepath is None:
+            remotepath = uuid4().hex
+
+        if callback is None:
+            callback = partial(_callback, remotepath, logger=logger)
+
+        digest = new(verify) if verify else None
+        reported = size = 0
+        with self._sftp_channel() as channel, \
+                self._atomic(channel, remotepath, atomic) as remotepath:
+            remote = channel.open(remotepath, 'wb', bufsize=32768)
+            try:
+                with remote, closing(_chunks(chunks, loop=loop)) as items:
+                    remote.set_pipelined(True)
+                    for chunk in items:
+                        view = memoryview(chunk).cast('B')
+                        remote.write(view)
+                        if digest:
+                            digest.update(view)
+                        size += len(view)
+                        if size - reported >= 32768:
+                            callback(size, None)
+                            reported = size
+                    attributes = self._close_handle(channel, remote,
+                                                    confirm=confirm,
+                                                    size=size)
+                self._metrics.count('bytes_transferred_total', size,
+                                    direction='put')
+                callback(size, size)
+                if verify:
+                    attributes.checksum = self._verify(
+                        channel, remotepath, verify, digest.hexdigest(),
+                        'put_iter')
+            except Exception as err:
+                # Nothing can resume what was sent, leave no partial file.
+                if not atomic:
+                    self._remove_batch(channel, [remotepath])
+                raise err
+
+        return attributes
+
+    @_measured
     def put_r(self, localdir, remotedir, callback=None, confirm=True,
               preserve_mtime=False, resume=False, workers=None,
               exceptions=None, tries=None, backoff=2, delay=1,
-              logger=getLogger(__name__), silent=False):
+              logger=getLogger(__name__), silent=False, atomic=False,
+              hardlinks=False, dedup=None, verify=None):
         '''Recursively copies a local directory's contents to a remotepath
 
         :param str localdir: The local directory to copy remotely.
@@ -893,7 +2174,8 @@ class Connection(object):
             based on destination path matching.
         :param int workers: *Default: None* - If None, defaults to number of
             processors plus 4. Set to less than or equal to allowed
-            concurrent connections on server.
+            concurrent connections on server. Also the number of threads
+            scanning the local tree.
         :param Exception exceptions: Exception(s) to check. May be a tuple of
             exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
             or (ValueError, IOError(errno.ECOMM))
@@ -907,32 +2189,255 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
-
-        :returns: None
+        :param bool atomic: *Default: False* - Upload each file under a
+            hidden temporary name, renaming them all into place in one
+            pipelined batch once the transfers are done. Those of failed
+            uploads are removed, unless resume is set.
+        :param bool hardlinks: *Default: False* - Upload each set of local
+            hardlinks once, linking the other names to it remotely with
+            hardlink@openssh.com, or uploading them as copies when the
+            server doesn't support it.
+        :param str dedup: *Default: None* - Send each distinct content once,
+            hashing local files with sha256 and hardlinking any whose content
+            is already under remotedir, or earlier in the same upload, to
+            that copy. The remote content comes from the
+            ``.sftpretty.sha256`` sidecar kept there by ``manifest``, or from
+            sha256sum run over remotedir by ``execute``, which also falls
+            back to a remote cp where hardlinks aren't supported. Links share
+            their content, so only suits files that are replaced, never
+            modified in place, and implies atomic for that reason.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest each file with as it is read for sending,
+            comparing that with a checksum computed by the server.
+
+        :returns: (dict) Verified digest of each file uploaded, by remote
+            path, when verify is given. Otherwise None. Files linked
+            instead of sent aren't included.
 
         :raises IOError: if remotedir doesn't exist
         :raises OSError: if localdir doesn't exist
         '''
-        lwd = Path(localdir).absolute().as_posix()
-        rwd = self.normalize(remotedir)
+        lwd = Path(localdir).absolute()
+        rwd = Path(self.normalize(remotedir)).joinpath(lwd.name)
+
+        tree = localscan(lwd, workers=workers, manifest=Manifest())
+        log.debug(f'Local Tree: [{tree.count}] entries')
+
+        self.mkdir_p(rwd.as_posix())
+        for local, size, mtime, mode, *_ in tree.entries():
+            if S_ISDIR(mode):
+                self.mkdir_p(rwd.joinpath(
+                    Path(local).relative_to(lwd)).as_posix())
+
+        # Every name after the first of a set of hardlinks is linked to it
+        # remotely instead of being sent again.
+        links, sources = {}, {}
+        if hardlinks:
+            for local, size, mtime, mode, inode, device, nlink in (
+                    tree.entries()):
+                if S_ISREG(mode) and nlink > 1:
+                    source = sources.setdefault((device, inode), local)
+                    if source != local:
+                        links[local] = (source, size)
+            if links:
+                log.info(f'Hardlinks: [{len(links)}] names, '
+                         f'[{sum(size for _, size in links.values())}] '
+                         'bytes not sent')
+
+        def _remote(local):
+            return rwd.joinpath(Path(local).relative_to(lwd)).as_posix()
+
+        # Largest files first, keeping the pool busy until the very end.
+        paths = (
+                 (local, _remote(local))
+                 for local, size, mtime, mode, *_ in tree.entries(
+                     tree.order('sizes', reverse=True))
+                 if S_ISREG(mode) and local not in links
+                )
+        # The tree counts directories too, look for a file to upload.
+        first = next(paths, None)
+        if first is not None:
+            paths = chain([first], paths)
+
+        digests = {}
+
+        def _verified(local, remote, attributes):
+            digests[remote] = attributes.checksum
+
+        kwargs = dict(atomic=atomic, callback=callback, confirm=confirm,
+                      finished=_verified if verify else None,
+                      preserve_mtime=preserve_mtime, resume=resume,
+                      verify=verify, workers=workers, exceptions=exceptions,
+                      tries=tries, backoff=backoff, delay=delay,
+                      logger=logger, silent=silent)
+        if first is not None and dedup:
+            self._put_dedup(paths, rwd.parent.as_posix(), dedup, **kwargs)
+        elif first is not None:
+            self._put_files(paths, **kwargs)
+        elif not links:
+            logger.info(f'No files found in directory [{localdir}]')
 
-        tree = {}
-        tree[lwd] = [(lwd, rwd)]
+        if links:
+            with self._sftp_channel() as channel:
+                copies = self._link_batch(channel, [
+                    (_remote(source), _remote(local))
+                    for local, (source, size) in links.items()])
+            if copies:
+                names = {_remote(local): local for local in links}
+                self._put_files([(names[remote], remote)
+                                 for source, remote in copies], **kwargs)
+
+        return digests if verify else None
+
+    def put_watch(self, localdir, remotedir, callback=None, confirm=True,
+                  debounce=0.05, existing=False, preserve_mtime=False,
+                  recurse=False, stop=None, workers=None, exceptions=None,
+                  tries=None, backoff=2, delay=1, logger=getLogger(__name__),
+                  silent=False):
+        '''Upload files as they land in a local directory, for as long as
+        the generator is consumed. Linux inotify reports each file once it is
+        closed after writing or moved into place, it is uploaded under a
+        temporary name once no further events arrive for debounce seconds,
+        then renamed over the final remote path.
+
+        :param str localdir: The local directory to watch.
+        :param str remotedir: The remote directory files are uploaded to.
+        :param callable callback: Optional callback function (form: ``func(
+            int, int``)) that accepts the bytes transferred so far and the
+            total bytes to be transferred.
+        :param bool confirm: *Default: True* - Whether to do a stat() on the
+            file afterwards to confirm the file size.
+        :param float debounce: *Default: 0.05* - Seconds without new events
+            for a file before it is uploaded.
+        :param bool existing: *Default: False* - Also upload the files already
+            in localdir when starting.
+        :param bool preserve_mtime: *Default: False* - Make the modification
+            time(st_mtime) on the remote file match the time on the local.
+        :param bool recurse: *Default: False* - Watch sub-directories too,
+            creating them remotely as they appear.
+        :param threading.Event stop: *Default: None* - Stop once set,
+            finishing the uploads already pending, otherwise run until the
+            generator is closed.
+        :param int workers: *Default: None* - If None, defaults to number of
+            processors plus 4. Uploads running at once, the rest wait.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
 
-        localtree(tree, lwd, rwd, recurse=True)
-        log.debug(f'Local Tree: [{tree}]')
+        :returns: (generator) of (localpath, remotepath, error) tuples as
+            each upload finishes, error being None on success.
 
-        for roots in tree.keys():
-            for local, remote in tree[roots]:
-                self.put_d(local, remote, callback=callback, confirm=confirm,
-                           preserve_mtime=preserve_mtime, resume=resume,
-                           workers=workers, exceptions=exceptions, tries=tries,
-                           backoff=backoff, delay=delay, logger=logger,
-                           silent=silent)
+        :raises OSError: if localdir doesn't exist or inotify isn't available
+        '''
+        lwd = Path(localdir).expanduser().absolute()
+        rwd = Path(self.normalize(remotedir))
+        stop = stop or Event()
+        mask = Inotify.CLOSE_WRITE | Inotify.MOVED_TO | (
+            Inotify.CREATE if recurse else 0)
+        # localpath: monotonic time it is due for upload
+        due = {}
+        # localpath: future of its running upload
+        running = {}
+        waker, wake = pipe()
+
+        def _remote(local):
+            return rwd.joinpath(Path(local).relative_to(lwd)).as_posix()
+
+        def _upload(local, remote):
+            self.put(local, remote, atomic=True, callback=callback,
+                     confirm=confirm, preserve_mtime=preserve_mtime,
+                     exceptions=exceptions, tries=tries, backoff=backoff,
+                     delay=delay, logger=logger, silent=silent)
+
+        def _watch(directory, scan):
+            notify.add(directory, mask)
+            self.mkdir_p(_remote(directory))
+            for path, size, mtime, mode, *_ in localscan(directory,
+                                                         recurse=False):
+                if S_ISDIR(mode):
+                    if recurse:
+                        _watch(path, True)
+                elif scan and S_ISREG(mode):
+                    due[path] = monotonic()
+
+        workers = _pool_size(workers)
+        try:
+            with Inotify() as notify, DefaultSelector() as selector, \
+                    ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix=uuid4().hex) as pool:
+                selector.register(notify, EVENT_READ)
+                selector.register(waker, EVENT_READ)
+                _watch(lwd.as_posix(), existing)
+
+                while running or due or not stop.is_set():
+                    # Sleep until the next file is due, finished uploads
+                    # wake the selector through the pipe.
+                    ready = [deadline for local, deadline in due.items()
+                             if local not in running]
+                    timeout = 0.1
+                    if ready and len(running) < workers:
+                        timeout = max(0, min(min(ready) - monotonic(), 0.1))
+                    for key, _ in selector.select(timeout):
+                        if key.fileobj is waker:
+                            read(waker, 4096)
+                            continue
+                        for event, path in notify.read():
+                            if path is None:
+                                log.warning('Inotify: [OVERFLOW] rescanning '
+                                            f'{lwd}')
+                                for local, size, mtime, mode, *_ in localscan(
+                                        lwd, recurse=recurse):
+                                    if S_ISREG(mode):
+                                        due[local] = monotonic()
+                            elif event & Inotify.ISDIR:
+                                if recurse:
+                                    _watch(path, True)
+                            elif event & (Inotify.CLOSE_WRITE |
+                                          Inotify.MOVED_TO):
+                                due[path] = monotonic() + debounce
+
+                    now = monotonic()
+                    for local, deadline in sorted(due.items(),
+                                                  key=itemgetter(1)):
+                        if len(running) >= workers:
+                            break
+                        if (deadline <= now or stop.is_set()) and (
+                                local not in running):
+                            del due[local]
+                            running[local] = pool.submit(_upload, local,
+                                                         _remote(local))
+                            running[local].add_done_callback(
+                                lambda future: write(wake, b'\0'))
+
+                    for local, future in list(running.items()):
+                        if future.done():
+                            del running[local]
+                            if future.exception():
+                                logger.error(f'Upload [FAILED]: {local} '
+                                             f'{future.exception()}')
+                            else:
+                                logger.info(f'Upload [COMPLETE]: {local}')
+                            yield (local, _remote(local),
+                                   future.exception())
+        finally:
+            close(waker)
+            close(wake)
 
+    @_measured
     def putfo(self, flo, remotepath=None, file_size=None, callback=None,
-              confirm=True, exceptions=None, tries=None, backoff=2,
-              delay=1, logger=getLogger(__name__), silent=False):
+              confirm=True, exceptions=None, tries=None, backoff=2, delay=1,
+              logger=getLogger(__name__), silent=False, atomic=False,
+              verify=None):
         '''Copies the contents of a file like object to remotepath.
 
         :param flo: File-like object that supports .read()
@@ -956,15 +2461,23 @@ class Connection(object):
             Logger to use.
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
+        :param bool atomic: *Default: False* - Upload under a hidden
+            temporary name in the same directory, renaming it over remotepath
+            once complete so nothing sees a partial file.
+        :param str verify: *Default: None* - Name of a hash algorithm, such
+            as sha256, to digest the contents with as they are read for
+            sending, comparing that with a checksum computed by the server.
 
-        :returns: (obj) SFTPAttributes containing details about the given file.
+        :returns: (obj) SFTPAttributes containing details about the given
+            file, carrying the verified digest as checksum when verify is
+            given.
 
         :raises: TypeError, if remotepath not specified, any underlying error
         '''
         @retry(exceptions, tries=tries, backoff=backoff, delay=delay,
-               logger=logger, silent=silent)
+               logger=logger, metrics=self._metrics, silent=silent)
         def _putfo(self, flo, remotepath=None, file_size=None, callback=None,
-                   confirm=True):
+                   confirm=True, atomic=False, verify=None):
 
             if callback is None:
                 callback = partial(_callback, flo, logger=logger)
@@ -976,16 +2489,31 @@ class Connection(object):
             if remotepath is None:
                 remotepath = uuid4().hex
 
-            with self._sftp_channel() as channel:
-                attributes = channel.putfo(flo, remotepath=remotepath,
-                                           file_size=file_size,
-                                           callback=callback, confirm=confirm)
+            with self._sftp_channel() as channel, self._atomic(
+                    channel, remotepath, atomic) as remotepath:
+                reader = _Tee(flo, verify) if verify else flo
+                with channel.open(remotepath, 'wb') as remote:
+                    remote.set_pipelined(True)
+                    size = channel._transfer_with_callback(
+                        callback=callback, file_size=file_size,
+                        reader=reader, writer=remote)
+                    attributes = self._close_handle(channel, remote,
+                                                    confirm=confirm,
+                                                    size=size)
+                self._metrics.count('bytes_transferred_total', size,
+                                    direction='put')
+                if verify:
+                    attributes.checksum = self._verify(
+                        channel, remotepath, verify, reader.hexdigest(),
+                        'putfo')
 
             return attributes
 
-        return _putfo(self, flo, remotepath=remotepath, file_size=file_size,
-                      callback=callback, confirm=confirm)
+        return _putfo(self, flo, remotepath=remotepath, atomic=atomic,
+                      file_size=file_size, callback=callback, confirm=confirm,
+                      verify=verify)
 
+    @_measured
     def execute(self, command,
                 exceptions=None, tries=None, backoff=2, delay=1,
                 logger=getLogger(__name__), silent=False):
@@ -1007,24 +2535,211 @@ class Connection(object):
         :param bool silent: *Default: False* - If set then no logging will
             be attempted.
 
-        :returns: (list of str) Results of the command.
+        :returns: (list of bytes) Lines written to stdout by the command, or
+            to stderr if nothing was written to stdout.
 
         :raises: Any exception raised by command will be passed through.
         '''
         @retry(exceptions, backoff=backoff, delay=delay, logger=logger,
-               silent=silent, tries=tries)
+               metrics=self._metrics, silent=silent, tries=tries)
         def _execute(self, command):
-            channel = self._transport.open_session()
+            output, errors = [], []
+            for stream, data in self.execute_stream(command, lines=True):
+                if stream == 'stdout':
+                    output.append(data)
+                elif stream == 'stderr':
+                    errors.append(data)
+
+            return output or errors
+
+        return _execute(self, command)
+
+    @_measured
+    def execute_batch(self, commands, shell=False,
+                      exceptions=None, tries=None, backoff=2, delay=1,
+                      logger=getLogger(__name__), silent=False):
+        '''Execute a list of commands on a remote machine, collecting the
+        output and exit status of each. With shell, every command is piped
+        through one shell session instead of opening a channel per command,
+        so commands share the shell's state, such as its working directory
+        and variables. A command that exits the shell ends the batch. The
+        script is fed to the shell on its standard input, so each command
+        reads its own from /dev/null rather than consuming the commands
+        after it.
+
+        :param list commands: Commands to execute in order, or a single
+            command as a str.
+        :param bool shell: *Default: False* - Run all commands through one
+            persistent shell session.
+        :param Exception exceptions: Exception(s) to check. May be a tuple of
+            exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+            or (ValueError, IOError(errno.ECOMM))
+        :param int tries: *Default: None* - Times to try (not retry) before
+            giving up.
+        :param int backoff: *Default: 2* - Backoff multiplier. Default will
+            double the delay each retry.
+        :param int delay: *Default: 1* - Initial delay between retries in
+            seconds.
+        :param logging.Logger logger: *Default: Logger(__name__)* -
+            Logger to use.
+        :param bool silent: *Default: False* - If set then no logging will
+            be attempted.
+
+        :returns: (list of dict) ``{'command': str, 'exit': int|None,
+            'stderr': bytes, 'stdout': bytes}`` per command, with an exit of
+            None for commands a shell session never reached.
+
+        :raises: Any exception raised by command will be passed through.
+        '''
+        if isinstance(commands, str):
+            commands = [commands]
+
+        @retry(exceptions, backoff=backoff, delay=delay, logger=logger,
+               metrics=self._metrics, silent=silent, tries=tries)
+        def _execute_batch(self, commands):
+            results = [{'command': command, 'exit': None, 'stderr': b'',
+                        'stdout': b''} for command in commands]
+
+            if not shell:
+                for result in results:
+                    output = {'stderr': [], 'stdout': []}
+                    for stream, data in self.execute_stream(
+                            result['command']):
+                        if stream == 'exit':
+                            result['exit'] = data
+                        else:
+                            output[stream].append(data)
+                    result['stderr'] = b''.join(output['stderr'])
+                    result['stdout'] = b''.join(output['stdout'])
+
+                return results
+
+            # Each command is followed by a marker on both streams, the one
+            # on stdout carrying the command's exit status. Grouping keeps
+            # the command in the shell while its stdin is redirected.
+            marker = uuid4().hex
+            script = ''.join(
+                (f'{{\n{command}\n}} </dev/null\n'
+                 f'printf "\\n{marker} %d\\n" $?\n'
+                 f'printf "\\n{marker}\\n" >&2\n')
+                for command in commands).encode('utf-8')
+            output = {'stderr': [], 'stdout': []}
+            for stream, data in self.execute_stream('/bin/sh',
+                                                    stdin=script):
+                if stream == 'exit':
+                    shell_status = data
+                else:
+                    output[stream].append(data)
+
+            separator = f'\n{marker}'.encode('utf-8')
+            stdout = b''.join(output['stdout']).split(separator)
+            stderr = b''.join(output['stderr']).split(separator)
+            results[0]['stdout'], results[0]['stderr'] = stdout[0], stderr[0]
+            for index, piece in enumerate(stdout[1:len(results) + 1]):
+                status, _, remainder = piece.partition(b'\n')
+                results[index]['exit'] = int(status)
+                if index + 1 < len(results):
+                    results[index + 1]['stdout'] = remainder
+            for index, piece in enumerate(stderr[1:len(results)]):
+                results[index + 1]['stderr'] = piece[1:]
+            if len(stdout) <= len(results):
+                # The shell ended early, on the last command it reached.
+                results[len(stdout) - 1]['exit'] = shell_status
+
+            return results
+
+        return _execute_batch(self, commands)
+
+    def execute_stream(self, command, bufsize=32768, buffers=16,
+                       lines=False, stdin=None):
+        '''Execute the given command on a remote machine, yielding output as
+        it arrives. Output is only read from the channel as fast as it is
+        consumed, so a slow consumer pauses the remote command rather than
+        buffering its output in memory. The command is executed without
+        regard to the remote :attr:`.pwd`.
+
+        :param str command: Command to execute.
+        :param int bufsize: *Default: 32768* - Maximum bytes per chunk read.
+        :param int buffers: *Default: 16* - Chunks held in memory before
+            reading from the channel pauses.
+        :param bool lines: *Default: False* - Yield complete lines, including
+            the trailing newline, instead of raw chunks.
+        :param bytes stdin: *Default: None* - Data written to the command's
+            standard input, which is then closed.
+
+        :returns: (generator of tuple) ``('stdout', bytes)`` and ``('stderr',
+            bytes)`` items in order of arrival, then a final ``('exit', int)``
+            holding the exit status, -1 if the server provided none.
+
+        :raises: Any exception raised while reading the command output.
+        '''
+        channel = self._transport.open_session()
+        try:
             channel.exec_command(command)
+        except Exception as err:
+            channel.close()
+            raise err
 
-            output = channel.makefile('rb', -1).readlines()
+        queue = Queue(maxsize=buffers)
+        stop = Event()
 
-            if output:
-                return output
-            else:
-                return channel.makefile_stderr('rb', -1).readlines()
+        def _offer(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
 
-        return _execute(self, command)
+        def _pump(stream, recv):
+            try:
+                for chunk in iter(lambda: recv(bufsize), b''):
+                    _offer((stream, chunk))
+            except Exception as err:
+                _offer((stream, err))
+            finally:
+                _offer((stream, None))
+
+        def _feed():
+            try:
+                channel.sendall(stdin)
+                channel.shutdown_write()
+            except Exception as err:
+                _offer(('stdin', err))
+
+        pumps = [Thread(args=(stream, recv), daemon=True,
+                        name=f'{channel.get_name()}-{stream}', target=_pump)
+                 for stream, recv in (('stdout', channel.recv),
+                                      ('stderr', channel.recv_stderr))]
+        for pump in pumps:
+            pump.start()
+        if stdin is not None:
+            Thread(daemon=True, name=f'{channel.get_name()}-stdin',
+                   target=_feed).start()
+
+        try:
+            remainder = {'stdout': b'', 'stderr': b''}
+            streams = len(pumps)
+            while streams:
+                stream, chunk = queue.get()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                elif chunk is None:
+                    streams -= 1
+                    if remainder[stream]:
+                        yield stream, remainder[stream]
+                elif lines:
+                    *complete, remainder[stream] = (
+                        remainder[stream] + chunk).split(b'\n')
+                    for line in complete:
+                        yield stream, line + b'\n'
+                else:
+                    yield stream, chunk
+
+            yield 'exit', channel.recv_exit_status()
+        finally:
+            stop.set()
+            channel.close()
 
     @contextmanager
     def cd(self, remotepath=None):
@@ -1062,6 +2777,84 @@ class Connection(object):
             channel.chdir(drivedrop(remotepath))
             self._default_path = channel.normalize('.')
 
+    @_measured
+    def checksums(self, remotepaths, algorithm='sha256', batch=1024,
+                  recurse=True, workers=None):
+        '''Checksum many remote files at once, computed by the server. A
+        directory is summed by a single find running the sha256sum style
+        command for algorithm, a list of files is split into batches summed
+        in parallel exec sessions over the one transport. Output is parsed
+        as it streams in. Servers without a shell fall back to the
+        check-file extension, over a channel per worker.
+
+        :param str|list remotepaths: A remote directory whose files are all
+            summed, or a list of remote files.
+        :param str algorithm: *Default: sha256* - Hash algorithm, one of
+            blake2b, md5, sha1, sha224, sha256, sha384 or sha512.
+        :param int batch: *Default: 1024* - Files summed per exec session.
+        :param bool recurse: *Default: True* - Include files in
+            sub-directories of a remote directory.
+        :param int workers: *Default: None* - If None, defaults to number of
+            processors plus 4. Exec sessions or channels in use at once.
+
+        :returns: (dict) Remote path to hexdigest, absolute for a directory
+            and as given for a list. Files that couldn't be read are left
+            out.
+
+        :raises ValueError: if algorithm has no remote command
+        :raises IOError: if the server can't produce checksums at all
+        '''
+        if algorithm not in CHECKSUM_COMMANDS:
+            raise ValueError(f'Unknown algorithm [{algorithm}].')
+        command = CHECKSUM_COMMANDS[algorithm]
+
+        if isinstance(remotepaths, str):
+            root = self.normalize(remotepaths)
+            depth = '' if recurse else '-maxdepth 1 '
+            try:
+                return dict(self._checksum_stream(
+                    f'find {quote(root)} {depth}-type f -exec {command} -z '
+                    '-- {} +'))
+            except (IOError, SSHException) as err:
+                log.debug(f'Checksum Command: [UNAVAILABLE] {err}')
+            names = {path: path for path, attributes in self._walk(
+                         root, recurse=recurse)
+                     if S_ISREG(attributes.st_mode)}
+            batches = []
+        else:
+            cwd = self.pwd
+            names = {Path(cwd).joinpath(path).as_posix(): path
+                     for path in remotepaths}
+            paths = list(names)
+            batches = [paths[start:start + batch]
+                       for start in range(0, len(paths), batch)]
+
+        def _sum(paths):
+            return dict(self._checksum_stream(
+                f'{command} -z -- {" ".join(map(quote, paths))}'))
+
+        digests, unsummed = {}, []
+        with ThreadPoolExecutor(max_workers=_pool_size(workers)) as pool:
+            threads = {pool.submit(_sum, paths): paths for paths in batches}
+            for future in as_completed(threads):
+                try:
+                    digests.update(future.result())
+                except (IOError, SSHException) as err:
+                    log.debug(f'Checksum Command: [FAILED] {err}')
+                    unsummed.extend(threads[future])
+        if not batches:
+            unsummed = list(names)
+
+        if unsummed:
+            digests.update(self._check_files(unsummed, algorithm,
+                                             workers=workers))
+            if names and not digests:
+                raise IOError(f'no remote {algorithm} checksums available')
+
+        return {names[path]: digest for path, digest in digests.items()
+                if path in names}
+
+    @_measured
     def chmod(self, remotepath, mode=700):
         '''Set the permission mode of a remotepath, where mode is an octal.
 
@@ -1075,6 +2868,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.chmod(drivedrop(remotepath), mode=int(str(mode), 8))
 
+    @_measured
     def chown(self, remotepath, uid=None, gid=None):
         '''Set uid/gid on remotepath, you may specify either or both.
 
@@ -1116,6 +2910,40 @@ class Connection(object):
         except Exception as err:
             raise err
 
+    @_measured
+    def diff(self, localdir, remotedir, backend='sftp', index=None,
+             mtime_window=0, workers=None):
+        '''Compare the regular files below a local directory with those below
+        a remote directory by relative name, size and modification time.
+
+        :param str localdir: The local directory to compare.
+        :param str remotedir: The remote directory to compare against.
+        :param str backend: *Default: sftp* - How the remote tree is listed,
+            see :meth:`.remotetree`.
+        :param RemoteIndex index: *Default: None* - Index to list the remote
+            tree through, see :meth:`.remotetree`.
+        :param int mtime_window: *Default: 0* - Seconds modification times may
+            differ before a file with a matching size counts as changed.
+        :param int workers: *Default: None* - Number of threads scanning the
+            local tree.
+
+        :returns: (dict) sorted relative names {'added': [local only],
+            'changed': [both, but different], 'deleted': [remote only]}
+
+        :raises IOError: if remotedir doesn't exist
+        :raises OSError: if localdir doesn't exist
+        '''
+        lwd = Path(localdir).expanduser().absolute().as_posix()
+        rwd = self.normalize(remotedir)
+
+        local = localscan(lwd, workers=workers, manifest=Manifest())
+        remote = Manifest()
+        self.remotetree(remote, rwd, lwd, backend=backend, index=index)
+
+        return diff(local, remote, localdir=lwd, remotedir=rwd,
+                    mtime_window=mtime_window)
+
+    @_measured
     def exists(self, remotepath):
         '''Test whether a remotepath exists.
 
@@ -1144,6 +2972,7 @@ class Connection(object):
 
         return cwd
 
+    @_measured
     def isdir(self, remotepath):
         '''Determine if remotepath is a directory.
 
@@ -1160,6 +2989,7 @@ class Connection(object):
 
         return result
 
+    @_measured
     def isfile(self, remotepath):
         '''Determine if remotepath is a file.
 
@@ -1176,6 +3006,7 @@ class Connection(object):
 
         return result
 
+    @_measured
     def lexists(self, remotepath):
         '''Determine whether remotepath exists.
 
@@ -1191,6 +3022,7 @@ class Connection(object):
 
         return True
 
+    @_measured
     def listdir(self, remotepath='.'):
         '''Return a sorted list of a directory's contents.
 
@@ -1204,6 +3036,7 @@ class Connection(object):
 
         return directory
 
+    @_measured
     def listdir_attr(self, remotepath='.'):
         '''Return a non-sorted list of SFTPAttribute objects for the remote
         directory contents. Will not include the special entries '.' and '..'.
@@ -1223,6 +3056,7 @@ class Connection(object):
 
         return directory
 
+    @_measured
     def lstat(self, remotepath):
         '''Return information about remote location without following symbolic
         links. Otherwise, the same as .stat().
@@ -1236,6 +3070,7 @@ class Connection(object):
 
         return lstat
 
+    @_measured
     def mkdir(self, remotedir, mode=700):
         '''Create a directory and set permission mode. On some systems, mode
         is ignored. Where used, the current umask value is first masked out.
@@ -1248,6 +3083,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.mkdir(drivedrop(remotedir), mode=int(str(mode), 8))
 
+    @_measured
     def mkdir_p(self, remotedir, mode=700):
         '''Create a directory and any missing parent locations as needed. Set
         permission mode, if created. Silently complete if remotedir already
@@ -1278,6 +3114,7 @@ class Connection(object):
         except Exception as err:
             raise err
 
+    @_measured
     def normalize(self, remotepath):
         '''Return the fully expanded path of a given location. This can be used
         to resolve symlinks or determine what the server believes to be the
@@ -1294,23 +3131,68 @@ class Connection(object):
 
         return expanded_path
 
-    def open(self, remotefile, bufsize=-1, mode='r'):
+    @_measured
+    def open(self, remotefile, bufsize=-1, mode='r', cache=None,
+             blocks=None, window=None, fsync=False):
         '''Open a file on the remote server.
 
         :param str remotefile: Path of remote file to open.
         :param str mode: *Default: read-only* - File access mode.
-        :param int bufsize: *Default: -1* - Buffering in bytes.
-
-        :returns: (obj) SFTPFile, a file-like object handler.
+        :param int bufsize: *Default: -1* - Buffering in bytes, the block
+            size when reading through blocks or writing through window,
+            32768 if not positive.
+        :param FileCache cache: *Default: None* - Read the file from this
+            local cache instead, once it holds the remote file's current
+            size and mtime. Only for reading.
+        :param int blocks: *Default: None* - Read through a
+            :class:`BlockReader` keeping this many blocks in memory, with
+            readahead on sequential reads, for random access without a
+            round trip per read. Only for reading.
+        :param int window: *Default: None* - Write through a
+            :class:`BlockWriter` gathering writes into blocks, keeping this
+            many WRITEs in flight. Errors are raised by the next write,
+            flush or close. Only for writing.
+        :param bool fsync: *Default: False* - Have the server flush the file
+            to disk when a writer opened with window is closed.
+
+        :returns: (obj) SFTPFile, a file-like object handler, a local
+            binary file when served from cache, a BlockReader or a
+            BlockWriter.
 
         :raises: IOError, if the file could not be opened.
+        :raises ValueError: if cache or blocks is given with a mode other
+            than read, or window with one that reads
         '''
+        if cache is not None or blocks is not None:
+            if mode.strip('b') != 'r':
+                raise ValueError(f'Cache only serves reads [{mode}].')
+        if window is not None:
+            if 'r' in mode or '+' in mode:
+                raise ValueError(f'Window only serves writes [{mode}].')
+        if cache is not None:
+            with self._cache_fetch(remotefile, cache) as (cached, _):
+                if cached is not None:
+                    return open(cached, 'rb')
+
         with self._sftp_channel(keepalive=True) as channel:
             remotefile = drivedrop(remotefile)
             flo = channel.open(remotefile, bufsize=bufsize, mode=mode)
 
+        blocksize = bufsize if bufsize > 0 else 32768
+        try:
+            if blocks is not None:
+                return BlockReader(flo, blocks=blocks, blocksize=blocksize)
+            if window is not None:
+                return BlockWriter(flo, blocksize=blocksize, fsync=fsync,
+                                   window=window)
+        except Exception:
+            flo.close()
+            channel.close()
+            raise
+
         return flo
 
+    @_measured
     def readlink(self, remotelink):
         '''Return the target of a symlink as an absolute path.
 
@@ -1324,16 +3206,26 @@ class Connection(object):
 
         return link_destination
 
-    def remotetree(self, container, remotedir, localdir, recurse=True):
+    @_measured
+    def remotetree(self, container, remotedir, localdir, recurse=True,
+                   backend='sftp', index=None):
         '''Recursively map remote directory tree to a dictionary container.
 
         :param dict container: Hash table to save remote directory tree.
             {remotedir: [(remotedir/subdir, localdir/remotedir/subdir)]}
+            A :class:`Manifest` also records every entry's attributes.
         :param str remotedir: Remote location to descend, use '.' to start at
             :attr:`.pwd`.
         :param str localdir: Location used as root of appended remote paths.
         :param bool recurse: *Default: True* - To recurse or not to recurse
             that is the question.
+        :param str backend: *Default: sftp* - How the remote tree is listed.
+            ``sftp`` lists each directory over a single SFTP channel. ``find``
+            lists the whole tree with one ``find`` command over an exec
+            channel, falling back to ``sftp`` if the remote can't run it.
+        :param RemoteIndex index: *Default: None* - Index of previous runs,
+            only directories whose mtime changed since are listed, the rest
+            come from the index. Takes the place of backend.
 
         :returns: None
 
@@ -1342,22 +3234,25 @@ class Connection(object):
         try:
             localdir = Path(localdir).expanduser().as_posix()
             remotedir = self.normalize(remotedir)
-            for attribute in self.listdir_attr(remotedir):
+            directories = {remotedir: localdir}
+            for remote, attribute in self._walk(remotedir, recurse=recurse,
+                                                backend=backend, index=index):
+                if isinstance(container, Manifest):
+                    container.append(remote, attribute.st_size,
+                                     attribute.st_mtime, attribute.st_mode)
                 if S_ISDIR(attribute.st_mode):
-                    remote = Path(remotedir).joinpath(
-                        attribute.filename).as_posix()
-                    local = Path(localdir).joinpath(
+                    parent = Path(remote).parent.as_posix()
+                    local = Path(directories[parent]).joinpath(
                         Path(remote).stem).as_posix()
-                    if remotedir in container.keys():
-                        container[remotedir].append((remote, local))
+                    directories[remote] = local
+                    if parent in container.keys():
+                        container[parent].append((remote, local))
                     else:
-                        container[remotedir] = [(remote, local)]
-                    if recurse:
-                        self.remotetree(container, remote, local,
-                                        recurse=recurse)
+                        container[parent] = [(remote, local)]
         except Exception as err:
             raise err
 
+    @_measured
     def remove(self, remotefile):
         '''Delete the remote file. May include a path, if no path, then
         :attr:`.pwd` is used. This method only works on files.
@@ -1371,6 +3266,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.remove(drivedrop(remotefile))
 
+    @_measured
     def rename(self, remotepath, newpath):
         '''Rename a path on the remote host.
 
@@ -1385,6 +3281,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.posix_rename(drivedrop(remotepath), drivedrop(newpath))
 
+    @_measured
     def rmdir(self, remotedir):
         '''Delete remote directory.
 
@@ -1395,6 +3292,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.rmdir(drivedrop(remotedir))
 
+    @_measured
     def stat(self, remotepath):
         '''Return information about remote location.
 
@@ -1407,6 +3305,7 @@ class Connection(object):
 
         return stat
 
+    @_measured
     def symlink(self, remote_src, remote_dest):
         '''Create a symlink for a remote file on the server
 
@@ -1420,6 +3319,7 @@ class Connection(object):
         with self._sftp_channel() as channel:
             channel.symlink(remote_src, drivedrop(remote_dest))
 
+    @_measured
     def truncate(self, remotepath, size):
         '''Change the size of the file specified by path. Used to modify the
         size of the file, just like the truncate method on Python file objects.
@@ -1439,6 +3339,129 @@ class Connection(object):
 
         return size
 
+    def watch(self, remotedir, interval=5, recurse=False, stable=True,
+              stop=None):
+        '''Poll a remote directory for changes over a single channel,
+        yielding an event for each entry created, modified or deleted since
+        the previous poll. Entries present on the first poll are taken as
+        they are. Only directories whose mtime moved are listed again, files
+        rewritten in place without being renamed are therefore only noticed
+        when something else changes in their directory.
+
+        :param str remotedir: The remote directory to watch.
+        :param float interval: *Default: 5* - Seconds between polls.
+        :param bool recurse: *Default: False* - Watch sub-directories too.
+        :param bool stable: *Default: True* - Hold back file events until
+            the size and mtime are unchanged between two polls, so files
+            still being written aren't reported until they're done.
+        :param threading.Event stop: *Default: None* - Stop watching once
+            set, otherwise watch until the generator is closed.
+
+        :returns: (generator) of (event, path, SFTPAttributes) tuples, event
+            being one of ``created``, ``modified`` or ``deleted``.
+
+        :raises IOError: if remotedir doesn't exist
+        '''
+        stop = stop or Event()
+
+        with self._sftp_channel() as channel:
+            root = channel.normalize(drivedrop(remotedir))
+            # path: mtime of directories, None to list again next poll
+            directories = {}
+            # directory: paths of its entries
+            children = {}
+            # path: attributes of entries as last reported
+            entries = {}
+            # path: (event, attributes) of files waiting to settle
+            pending = {}
+            baseline = True
+
+            def _same(one, other):
+                return (one.st_size, one.st_mtime) == (other.st_size,
+                                                       other.st_mtime)
+
+            def _deleted(path):
+                for child in children.pop(path, ()):
+                    yield from _deleted(child)
+                directories.pop(path, None)
+                pending.pop(path, None)
+                if path in entries:
+                    yield 'deleted', path, entries.pop(path)
+
+            def _changed(path, attribute):
+                if path in pending:
+                    event, previous = pending[path]
+                    if _same(previous, attribute):
+                        del pending[path]
+                        entries[path] = attribute
+                        return event, path, attribute
+                    pending[path] = (event, attribute)
+                elif path not in entries or not _same(entries[path],
+                                                      attribute):
+                    event = 'modified' if path in entries else 'created'
+                    if baseline or not stable:
+                        entries[path] = attribute
+                        return None if baseline else (event, path, attribute)
+                    pending[path] = (event, attribute)
+
+            while not stop.is_set():
+                listed = set()
+                polled = int(time())
+                queue = [(root, channel.stat(root).st_mtime)]
+                while queue:
+                    directory, mtime = queue.pop()
+                    if mtime is None or directories.get(directory) != mtime:
+                        listing = {
+                            Path(directory).joinpath(
+                                attribute.filename).as_posix(): attribute
+                            for attribute in channel.listdir_attr(directory)}
+                        for path in children.get(directory, set()) - set(
+                                listing):
+                            yield from _deleted(path)
+                        for path, attribute in listing.items():
+                            if S_ISDIR(attribute.st_mode):
+                                if path not in entries:
+                                    entries[path] = attribute
+                                    if not baseline:
+                                        yield 'created', path, attribute
+                            else:
+                                listed.add(path)
+                                event = _changed(path, attribute)
+                                if event:
+                                    yield event
+                        children[directory] = set(listing)
+                        # Whole second mtimes can't tell a change made in the
+                        # same second as this listing, so list it again.
+                        directories[directory] = (
+                            None if mtime is None or mtime >= polled - 1
+                            else mtime)
+                        if recurse:
+                            queue.extend((path, attribute.st_mtime)
+                                         for path, attribute in listing.items()
+                                         if S_ISDIR(attribute.st_mode))
+                    elif recurse:
+                        # Changes below a directory don't move the mtime of
+                        # its parent, so ask each one.
+                        for path in children[directory]:
+                            if path in entries and S_ISDIR(
+                                    entries[path].st_mode):
+                                try:
+                                    queue.append((path, channel.stat(
+                                        path).st_mtime))
+                                except IOError:
+                                    # gone, the parent's next listing says so
+                                    continue
+                for path in set(pending) - listed:
+                    try:
+                        event = _changed(path, channel.lstat(path))
+                    except IOError:
+                        pending.pop(path)
+                        continue
+                    if event:
+                        yield event
+                baseline = False
+                stop.wait(interval)
+
     @property
     def active_ciphers(self):
         '''Get tuple of currently used local and remote ciphers.
@@ -1536,3 +3559,421 @@ class Connection(object):
     def __exit__(self, exc_type, exc_value, exc_traceback):
         '''GTFO'''
         self.close()
+
+
+def _connect(host):
+    '''Return a Connection for host and whether it was created here.'''
+    if isinstance(host, Connection):
+        return host, False
+
+    return Connection(**host), True
+
+
+def _labels(hosts):
+    '''Return unique host:port labels for Connections or dicts of their
+    arguments, numbering repeats of the same host.'''
+    labels = []
+    for host in hosts:
+        if isinstance(host, Connection):
+            label = f'{host._host}:{host._port}'
+        else:
+            label = f'{host.get("host")}:{host.get("port", 22)}'
+        repeats = sum(1 for seen in labels if seen.split('#')[0] == label)
+        labels.append(f'{label}#{repeats + 1}' if repeats else label)
+
+    return labels
+
+
+def put_fanout(hosts, localpath, remotepath=None, callback=None,
+               confirm=True, preserve_mtime=False, blocksize=32768,
+               buffers=8, logger=getLogger(__name__)):
+    '''Copies a local file or directory tree to many remote hosts at once.
+    Each block of the source is read a single time and the same buffer is
+    handed to every host's write pipeline, so disk reads do not grow with
+    the number of destinations. Each host is driven by its own thread over a
+    single SFTP channel.
+
+    :param list hosts: Connection objects, or dicts of Connection arguments
+        to connect with and close when finished.
+    :param str localpath: The local file or directory to copy remotely.
+    :param str remotepath: Remote location to save the file, else the remote
+        :attr:`.pwd` and local filename is used. For a directory, the remote
+        directory the tree is saved under.
+    :param callable callback: Optional callback function (form: ``func(
+        str, int, int)``) that accepts the host and file being transferred,
+        the bytes transferred so far and the total bytes to be transferred.
+    :param bool confirm: *Default: True* - Whether to do a stat() on the
+        file afterwards to confirm the file size.
+    :param bool preserve_mtime: *Default: False* - Make the modification
+        time(st_mtime) on the remote file match the time on the local.
+    :param int blocksize: *Default: 32768* - Size of each shared read buffer
+        in bytes.
+    :param int buffers: *Default: 8* - Number of blocks a host may lag behind
+        the reader before the read waits for it.
+    :param logging.Logger logger: *Default: Logger(__name__)* -
+        Logger to use.
+
+    :returns: (dict) Report of the fan-out, ``{'bytes': int, 'elapsed':
+        float, 'hosts': {host: dict}, 'throughput': float}``. Hosts are keyed
+        by ``host:port``, with repeats numbered ``host:port#2``. Each entry
+        holds the ``attributes`` of the files written, ``bytes`` sent,
+        ``error`` raised, if any, and a ``status`` of COMPLETE or FAILED.
+
+    :raises OSError: if localpath doesn't exist
+    '''
+    localpath = Path(localpath).expanduser().absolute()
+
+    if localpath.is_dir():
+        remotedir = Path(remotepath or '.').joinpath(localpath.name)
+        sources = [
+                   (local, remotedir.joinpath(
+                       local.relative_to(localpath)).as_posix())
+                   for local in sorted(localpath.rglob('*'))
+                   if local.is_file()
+                  ]
+    elif localpath.is_file():
+        sources = [(localpath, remotepath or localpath.name)]
+    else:
+        raise OSError(f'No such file or directory: [{localpath}]')
+
+    if callback is None:
+        callback = partial(_callback, logger=logger)
+
+    failed = [False] * len(hosts)
+    labels = _labels(hosts)
+    queues = [Queue(maxsize=buffers) for host in hosts]
+    report = {'bytes': 0, 'elapsed': 0.0, 'hosts': {}, 'throughput': 0.0}
+
+    def _feed(item):
+        for index, queue in enumerate(queues):
+            if not failed[index]:
+                queue.put(item)
+
+    def _writer(index, host):
+        connection, created, done = None, False, False
+        label = labels[index]
+        queue = queues[index]
+        status = {'attributes': {}, 'bytes': 0, 'error': None,
+                  'status': 'FAILED'}
+
+        try:
+            connection, created = _connect(host)
+            with connection._sftp_channel() as channel:
+                parents = set()
+                while True:
+                    header = queue.get()
+                    if header is None:
+                        done = True
+                        break
+                    remotefile, file_size, local_times = header
+                    remotefile = drivedrop(remotefile)
+                    parent = Path(remotefile).parent.as_posix()
+                    if parent not in parents:
+                        connection.mkdir_p(parent)
+                        parents.add(parent)
+
+                    size = 0
+                    with channel.open(remotefile, 'wb') as remote:
+                        remote.set_pipelined(True)
+                        while True:
+                            block = queue.get()
+                            if not block:
+                                break
+                            remote.write(block)
+                            size += len(block)
+                            status['bytes'] += len(block)
+                            callback(f'[{label}] {remotefile}', size,
+                                     file_size)
+                        if block is None:
+                            done = True
+                            raise IOError(f'Upload of [{remotefile}] '
+                                          'aborted.')
+                        attributes = connection._close_handle(
+                            channel, remote, confirm=confirm, size=size,
+                            times=local_times if preserve_mtime else None)
+                    status['attributes'][remotefile] = attributes
+            status['status'] = 'COMPLETE'
+        except Exception as err:
+            failed[index] = True
+            status['error'] = err
+            # Keep draining so the reader never waits on a failed host.
+            while not done:
+                done = queue.get() is None
+        finally:
+            if created:
+                connection.close()
+
+        return label, status
+
+    start = monotonic()
+    thread_prefix = uuid4().hex
+    with ThreadPoolExecutor(max_workers=len(hosts) or None,
+                            thread_name_prefix=thread_prefix) as pool:
+        logger.debug(f'Thread Prefix: [{thread_prefix}]')
+        threads = [pool.submit(_writer, index, host)
+                   for index, host in enumerate(hosts)]
+        try:
+            for local, remote in sources:
+                if all(failed):
+                    break
+                local_attributes = local.stat()
+                _feed((remote, local_attributes.st_size,
+                       (local_attributes.st_atime,
+                        local_attributes.st_mtime)))
+                with open(local, 'rb') as localfile:
+                    for block in iter(lambda: localfile.read(blocksize),
+                                      b''):
+                        _feed(block)
+                        report['bytes'] += len(block)
+                _feed(b'')
+        finally:
+            for queue in queues:
+                queue.put(None)
+
+        for future in threads:
+            label, status = future.result()
+            report['hosts'][label] = status
+            if status['error'] is None:
+                logger.info(f'Host [{label}]: [COMPLETE]')
+            else:
+                logger.error(f'Host [{label}]: [FAILED] {status["error"]}')
+
+    report['elapsed'] = monotonic() - start
+    sent = sum(status['bytes'] for status in report['hosts'].values())
+    if report['elapsed'] > 0:
+        report['throughput'] = sent / report['elapsed']
+
+    return report
+
+
+def get_fanin(hosts, remotedir, localdir, backend='sftp', callback=None,
+              handshakes=8, max_concurrent_prefetch_requests=None,
+              pattern=None, prefetch=True, preserve_mtime=False, resume=False,
+              workers=None, exceptions=None, tries=None, backoff=2, delay=1,
+              logger=getLogger(__name__), silent=False):
+    '''Recursively copy the same remotedir from many hosts into per host
+    subdirectories of localdir. Connections are set up concurrently, with at
+    most handshakes in flight, and each host's files are handed to one thread
+    pool shared by every host as soon as its tree is listed.
+
+    :param list hosts: Connection objects, or dicts of Connection arguments
+        to connect with and close when finished.
+    :param str remotedir: The remote directory to recursively copy.
+    :param str localdir: The local path to save downloads, under a
+        ``host_port`` subdirectory per host.
+    :param str backend: *Default: sftp* - How each remote tree is listed,
+        see :meth:`Connection.remotetree`.
+    :param callable callback: Optional callback function (form: ``func(
+        int, int``)) that accepts the bytes transferred so far and the
+        total bytes to be transferred.
+    :param int handshakes: *Default: 8* - Maximum number of connections
+        being established, authenticated and listed at once.
+    :param int max_concurrent_prefetch_requests: - The maximum number of
+        concurrent read requests to prefetch.
+    :param str pattern: *Default: None* - Filter applied to all filenames
+        transfering only the subset of files that match.
+    :param bool prefetch: *Default: True* - Controls whether prefetching
+        is performed.
+    :param bool preserve_mtime: *Default: False* - Sync the modification
+        time(st_mtime) on the local file to match the time on the remote.
+    :param bool resume: *Default: False* - Continue a previous transfer
+        based on destination path matching.
+    :param int workers: *Default: None* - Size of the shared transfer pool.
+        If None, defaults to number of processors plus 4.
+    :param Exception exceptions: Exception(s) to check. May be a tuple of
+        exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+        or (ValueError, IOError(errno.ECOMM))
+    :param int tries: *Default: None* - Times to try (not retry) before
+        giving up.
+    :param int backoff: *Default: 2* - Backoff multiplier. Default will
+        double the delay each retry.
+    :param int delay: *Default: 1* - Initial delay between retries in
+        seconds.
+    :param logging.Logger logger: *Default: Logger(__name__)* -
+        Logger to use.
+    :param bool silent: *Default: False* - If set then no logging will
+        be attempted.
+
+    :returns: (dict) Report per host, keyed like :func:`put_fanout`. Each
+        entry holds ``bytes`` received, ``elapsed`` seconds, the first
+        ``error`` raised, if any, the ``files`` saved, the host's
+        ``localdir`` and a ``status`` of COMPLETE or FAILED.
+    '''
+    labels = _labels(hosts)
+    report = {label: {'bytes': 0, 'elapsed': 0.0, 'error': None,
+                      'files': [],
+                      'localdir': Path(localdir).joinpath(
+                          label.replace(':', '_')).as_posix(),
+                      'status': 'FAILED'}
+              for label in labels}
+
+    def _prepare(index, host):
+        status = report[labels[index]]
+        connection, created = _connect(host)
+        try:
+            root = connection.normalize(remotedir)
+            paths = [
+                     (path, Path(status['localdir']).joinpath(
+                          Path(path).relative_to(root)).as_posix())
+                     for path, attribute in connection._walk(
+                         root, backend=backend)
+                     if S_ISREG(attribute.st_mode)
+                     if pattern is None or f'{pattern}' in attribute.filename
+                    ]
+        except Exception as err:
+            if created:
+                connection.close()
+            raise err
+        log.debug(f'Remote Files: [{labels[index]}] [{len(paths)}]')
+
+        return connection, created, paths
+
+    def _get(connection, remote, local):
+        received = [0]
+
+        # Bytes count as they arrive, a resumed file only adds what it's sent.
+        def _received(bytes_so_far, bytes_total):
+            received[0] = bytes_so_far
+            progress(bytes_so_far, bytes_total)
+
+        progress = callback or partial(_callback, remote, logger=logger)
+        Path(local).parent.mkdir(exist_ok=True, parents=True)
+        connection.get(remote, local, callback=_received,
+                       max_concurrent_prefetch_requests=max_concurrent_prefetch_requests,  # noqa: E501
+                       prefetch=prefetch, preserve_mtime=preserve_mtime,
+                       resume=resume, exceptions=exceptions, tries=tries,
+                       backoff=backoff, delay=delay, logger=logger,
+                       silent=silent)
+
+        return received[0]
+
+    setups = {}
+    starts = {label: monotonic() for label in labels}
+    thread_prefix = uuid4().hex
+    try:
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix=thread_prefix) as pool, \
+                ThreadPoolExecutor(max_workers=handshakes,
+                                   thread_name_prefix=f'{thread_prefix}-ssh'
+                                   ) as handshake_pool:
+            logger.debug(f'Thread Prefix: [{thread_prefix}]')
+            setups = {handshake_pool.submit(_prepare, index, host): label
+                      for index, (host, label) in enumerate(zip(hosts,
+                                                                labels))}
+            threads = {}
+            for future in as_completed(setups):
+                label = setups[future]
+                try:
+                    connection, created, paths = future.result()
+                except Exception as err:
+                    report[label]['error'] = err
+                    report[label]['elapsed'] = monotonic() - starts[label]
+                    logger.error(f'Host [{label}]: [FAILED] {err}')
+                    continue
+                threads.update({pool.submit(_get, connection, remote, local):
+                                (label, local) for remote, local in paths})
+                if paths == []:
+                    report[label]['elapsed'] = monotonic() - starts[label]
+                    report[label]['status'] = 'COMPLETE'
+                    logger.info(f'No files found on host [{label}]')
+
+            pending = {label: 0 for label in labels}
+            for label, local in threads.values():
+                pending[label] += 1
+            for future in as_completed(threads):
+                label, local = threads[future]
+                status = report[label]
+                try:
+                    received = future.result()
+                except Exception as err:
+                    logger.error(f'Thread [{label}] [{local}]: [FAILED]')
+                    if status['error'] is None:
+                        status['error'] = err
+                else:
+                    status['bytes'] += received
+                    status['files'].append(local)
+                pending[label] -= 1
+                if pending[label] == 0:
+                    status['elapsed'] = monotonic() - starts[label]
+                    status['status'] = ('FAILED' if status['error']
+                                        else 'COMPLETE')
+                    logger.info(f'Host [{label}]: [{status["status"]}]')
+    finally:
+        # Every host that connected is closed, even when a failure escapes.
+        for future in setups:
+            if future.done() and future.exception() is None:
+                connection, created, paths = future.result()
+                if created:
+                    connection.close()
+
+    return report
+
+
+def execute_fanout(hosts, commands, shell=False, workers=None,
+                   exceptions=None, tries=None, backoff=2, delay=1,
+                   logger=getLogger(__name__), silent=False):
+    '''Execute the same command, or list of commands, on many hosts at once
+    through a bounded pool of workers. See :meth:`Connection.execute_batch`.
+
+    :param list hosts: Connection objects, or dicts of Connection arguments
+        to connect with and close when finished.
+    :param list commands: Commands to execute in order, or a single
+        command as a str.
+    :param bool shell: *Default: False* - Run each host's commands through
+        one persistent shell session.
+    :param int workers: *Default: None* - If None, defaults to number of
+        processors plus 4. Number of hosts worked on at once.
+    :param Exception exceptions: Exception(s) to check. May be a tuple of
+        exceptions to check. IOError or IOError(errno.ECOMM) or (IOError,)
+        or (ValueError, IOError(errno.ECOMM))
+    :param int tries: *Default: None* - Times to try (not retry) before
+        giving up.
+    :param int backoff: *Default: 2* - Backoff multiplier. Default will
+        double the delay each retry.
+    :param int delay: *Default: 1* - Initial delay between retries in
+        seconds.
+    :param logging.Logger logger: *Default: Logger(__name__)* -
+        Logger to use.
+    :param bool silent: *Default: False* - If set then no logging will
+        be attempted.
+
+    :returns: (dict) Report per host, keyed like :func:`put_fanout`. Each
+        entry holds ``elapsed`` seconds, the ``error`` raised, if any, the
+        ``results`` of :meth:`Connection.execute_batch` and a ``status`` of
+        COMPLETE or FAILED. A command exiting non-zero does not fail a host.
+    '''
+    def _execute(host):
+        start = monotonic()
+        connection, created = _connect(host)
+        try:
+            results = connection.execute_batch(
+                commands, shell=shell, exceptions=exceptions, tries=tries,
+                backoff=backoff, delay=delay, logger=logger, silent=silent)
+        finally:
+            if created:
+                connection.close()
+
+        return results, monotonic() - start
+
+    labels = _labels(hosts)
+    report = {}
+    thread_prefix = uuid4().hex
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix=thread_prefix) as pool:
+        logger.debug(f'Thread Prefix: [{thread_prefix}]')
+        threads = {pool.submit(_execute, host): label
+                   for host, label in zip(hosts, labels)}
+        for future in as_completed(threads):
+            label = threads[future]
+            try:
+                results, elapsed = future.result()
+            except Exception as err:
+                report[label] = {'elapsed': 0.0, 'error': err,
+                                 'results': [], 'status': 'FAILED'}
+                logger.error(f'Host [{label}]: [FAILED] {err}')
+            else:
+                report[label] = {'elapsed': elapsed, 'error': None,
+                                 'results': results, 'status': 'COMPLETE'}
+                logger.info(f'Host [{label}]: [COMPLETE]')
+
+    return {label: report[label] for label in labels}
@@ -1,21 +1,1141 @@
-from functools import wraps
-from hashlib import new, sha3_512
-from io import BytesIO, IOBase
+from array import array
+from asyncio import new_event_loop, run_coroutine_threadsafe
+from collections import Counter, OrderedDict
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from contextlib import contextmanager
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from functools import partial, wraps
+from hashlib import new, sha256, sha3_512
+from io import BytesIO, IOBase, RawIOBase, SEEK_CUR, SEEK_SET
+from mmap import ACCESS_READ, mmap
+from os import (close, cpu_count, fsdecode, fsencode, fstat, O_CLOEXEC,
+                O_NONBLOCK, PathLike, read, replace, scandir, SEEK_END,
+                strerror)
+from paramiko import SSHException
+from paramiko.sftp import (CMD_DATA, CMD_EXTENDED, CMD_READ, CMD_STATUS,
+                           CMD_WRITE, int64)
 from pathlib import Path, PureWindowsPath
-from stat import S_IMODE
-from time import sleep
+from sqlite3 import connect
+from stat import S_IMODE, S_ISDIR, S_ISREG
+from struct import unpack_from
+from tempfile import mkstemp
+from threading import Event, Lock
+from time import monotonic, sleep, time
+from uuid import uuid4
+from weakref import WeakKeyDictionary
+
+try:
+    from mmap import MADV_SEQUENTIAL
+except ImportError:
+    MADV_SEQUENTIAL = None
+try:
+    from opentelemetry import metrics as opentelemetry
+except ImportError:
+    opentelemetry = None
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+class BlockReader(RawIOBase):
+    '''Seekable, read-only file object over an open remote file, keeping
+    the blocks it reads in a least recently used cache so repeated and
+    nearby reads are served from memory. Missing blocks are fetched with
+    pipelined READ requests, a run of sequential reads doubles readahead
+    up to its limit, and threads sharing the reader wait on a block another
+    is already fetching rather than requesting it again. Closing the reader
+    closes the remote file and its channel.
+
+    :param paramiko.SFTPFile remote: Open remote file to read.
+    :param int blocksize: *Default: 32768*. Bytes per block and READ.
+    :param int blocks: *Default: 256*. Blocks held in the cache.
+    :param int readahead: *Default: 16*. Most blocks requested beyond a
+        sequential read.
+    '''
+    def __init__(self, remote, blocksize=32768, blocks=256, readahead=16):
+        self.blocks = max(blocks, 1)
+        self.blocksize = blocksize
+        self.readahead = readahead
+        self.remote = remote
+        self.size = remote.stat().st_size
+        self._cache = OrderedDict()
+        self._fetching = {}
+        self._lock = Lock()
+        self._network = Lock()
+        self._next = None
+        self._position = 0
+        self._window = 0
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.remote.close()
+                self.remote.sftp.close()
+            finally:
+                self._cache.clear()
+                super().close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        with self._lock:
+            position = self._position
+            count = max(min(len(view), self.size - position), 0)
+            self._position += count
+        if not count:
+            return 0
+
+        written = self._read_at(position, view[:count])
+        if written < count:
+            with self._lock:
+                # The file ended early, leave position where the data did.
+                if self._position == position + count:
+                    self._position = position + written
+
+        return written
+
+    def seek(self, offset, whence=SEEK_SET):
+        with self._lock:
+            if whence == SEEK_SET:
+                position = offset
+            elif whence == SEEK_CUR:
+                position = self._position + offset
+            elif whence == SEEK_END:
+                position = self.size + offset
+            else:
+                raise ValueError(f'Unknown whence [{whence}].')
+            if position < 0:
+                raise ValueError(f'Negative seek position [{position}].')
+            self._position = position
+
+        return position
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def _fetch(self, blocks):
+        fetched = {block: bytearray() for block in blocks}
+        reads = ((block, block * self.blocksize,
+                  min(self.blocksize, self.size - block * self.blocksize))
+                 for block in blocks)
+        with self._network:
+            for block, offset, data in _read_spans(
+                    self.remote.sftp, self.remote.handle, reads,
+                    window=max(len(fetched), 1)):
+                fetched[block] += data
+
+        return {block: bytes(data) for block, data in fetched.items()}
+
+    def _read_at(self, position, view):
+        first = position // self.blocksize
+        last = (position + len(view) - 1) // self.blocksize
+        final = (self.size - 1) // self.blocksize
+
+        with self._lock:
+            # Reads picking up where the last left off widen readahead,
+            # ones within its final block keep it, anything else resets.
+            if first == self._next:
+                self._window = min(max(self._window * 2, 1), self.readahead)
+            elif self._next is None or first != self._next - 1:
+                self._window = 0
+            self._next = last + 1
+            wanted = range(first, min(last + self._window, final) + 1)
+            for block in wanted:
+                if block in self._cache:
+                    self._cache.move_to_end(block)
+            waiting = {block: self._fetching[block] for block in wanted
+                       if block not in self._cache and
+                       block in self._fetching}
+            missing = [block for block in wanted if block not in
+                       self._cache and block not in self._fetching]
+            for block in missing:
+                self._fetching[block] = Event()
+
+        try:
+            fetched = self._fetch(missing) if missing else {}
+        finally:
+            with self._lock:
+                for block in missing:
+                    if block in fetched:
+                        self._cache[block] = fetched[block]
+                    self._fetching.pop(block).set()
+                while len(self._cache) > max(self.blocks, len(wanted)):
+                    self._cache.popitem(last=False)
+
+        for event in waiting.values():
+            event.wait()
+
+        written = 0
+        for block in range(first, last + 1):
+            with self._lock:
+                data = self._cache.get(block)
+                if data is not None:
+                    self._cache.move_to_end(block)
+            if data is None:
+                # Another reader's fetch failed or was evicted, go direct.
+                data = fetched.get(block) or self._fetch([block])[block]
+            start = position + written - block * self.blocksize
+            chunk = data[start:start + len(view) - written]
+            view[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            if len(chunk) < self.blocksize - start and \
+                    written < len(view):
+                # The file ended short of its size, nothing follows.
+                break
+
+        return written
+
+
+class BlockWriter(RawIOBase):
+    '''Write-only file object over an open remote file, gathering small
+    writes into blocksize WRITE requests aligned to blocksize offsets and
+    keeping up to window of them in flight rather than waiting on each in
+    turn. A failed WRITE is raised by the next write, flush or close.
+    Closing the writer waits on every request, optionally has the server
+    fsync the file, then closes the remote file and its channel.
+
+    :param paramiko.SFTPFile remote: Open remote file to write.
+    :param int blocksize: *Default: 32768*. Bytes per WRITE.
+    :param int window: *Default: 64*. Most WRITEs in flight.
+    :param bool fsync: *Default: False*. Have the server flush the file to
+        disk on close, with the fsync@openssh.com extension.
+    '''
+    def __init__(self, remote, blocksize=32768, window=64, fsync=False):
+        self.blocksize = blocksize
+        self.fsync = fsync
+        self.remote = remote
+        self.window = max(window, 1)
+        self._buffer = bytearray()
+        self._error = None
+        self._offset = remote.tell()
+        self._pending = {}
+        self._responses = _Responses()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.flush()
+                if self.fsync:
+                    self.remote.sftp._request(CMD_EXTENDED,
+                                              'fsync@openssh.com',
+                                              self.remote.handle)
+            finally:
+                try:
+                    self.remote.close()
+                    self.remote.sftp.close()
+                finally:
+                    super().close()
+
+    def flush(self):
+        if self._buffer:
+            self._send(len(self._buffer))
+        while self._pending:
+            self._reap()
+        self._raise()
+
+    def tell(self):
+        return self._offset + len(self._buffer)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        self._raise()
+        view = memoryview(data).cast('B')
+        self._buffer += view
+        # The first request runs up to a block boundary, the rest are whole.
+        size = self.blocksize - self._offset % self.blocksize
+        while len(self._buffer) >= size:
+            self._send(size)
+            size = self.blocksize
+
+        return len(view)
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _reap(self):
+        self.remote.sftp._read_response()
+        for number in list(self._responses):
+            kind, message = self._responses.pop(number)
+            offset = self._pending.pop(number)
+            if kind != CMD_STATUS:
+                error = IOError(f'Unexpected response to WRITE [{kind}].')
+            else:
+                try:
+                    self.remote.sftp._convert_status(message)
+                    continue
+                except Exception as err:
+                    error = err
+            if self._error is None:
+                self._error = IOError(f'{error} writing at offset {offset}')
+
+    def _send(self, size):
+        while len(self._pending) >= self.window:
+            self._reap()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        number = self.remote.sftp._async_request(
+            self._responses, CMD_WRITE, self.remote.handle,
+            int64(self._offset), data)
+        self._pending[number] = self._offset
+        self._offset += len(data)
+
+
+class FileCache(object):
+    '''Read-through disk cache of remote file contents, keyed by host,
+    path, size and mtime, so a file rewritten remotely is never served once
+    a stat has seen it change. Entries are tracked in SQLite within the
+    cache directory and evicted least recently used first once their total
+    size passes budget. Contents are renamed into place once complete, a
+    reader never sees a partial file. Entries pinned by this process are
+    never evicted by it, other processes sharing the directory don't know
+    of those pins. A file whose mtime is within a second of the local clock
+    when it is fetched is cached without being trusted, as a change in that
+    same second would leave its mtime as it was. That assumes the server's
+    clock agrees with the local one, see :class:`RemoteIndex`.
+
+    :param str directory: Directory holding the cache, created along with
+        its parents if missing.
+    :param int budget: *Default: 1073741824*. Bytes of content kept before
+        the least recently used entries are evicted.
+    :param float ttl: *Default: None*. Seconds an entry is trusted after it
+        was last checked against the server, serving it with no round trip
+        at all. None checks every time.
+    '''
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS files (
+            host TEXT, path TEXT, size INTEGER, mtime INTEGER, blob TEXT,
+            checked REAL, used REAL, PRIMARY KEY (host, path));
+        CREATE INDEX IF NOT EXISTS files_used ON files (used);
+    '''
+
+    def __init__(self, directory, budget=1073741824, ttl=None):
+        self.budget = budget
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(exist_ok=True, parents=True)
+        self.ttl = ttl
+        self._db = connect(self.directory.joinpath('index.sqlite'),
+                           check_same_thread=False)
+        self._lock = Lock()
+        self._pinned = Counter()
+        with self._lock:
+            self._db.executescript(self.SCHEMA)
+
+    def clear(self, host=None):
+        '''Drop every cached file, or only those of a host.'''
+        where, values = (' WHERE host = ?', (host,)) if host else ('', ())
+        with self._lock:
+            for blob, in self._db.execute(f'SELECT blob FROM files{where}',
+                                          values).fetchall():
+                self._unlink(blob)
+            self._db.execute(f'DELETE FROM files{where}', values)
+            self._db.commit()
+
+    def close(self):
+        '''Commit pending changes and close the database.'''
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def evict(self, budget=None):
+        '''Drop the least recently used files until the rest fit in
+        budget, the cache's own when not given. Pinned files are kept.'''
+        budget = self.budget if budget is None else budget
+        with self._lock:
+            total, = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM files').fetchone()
+            for host, path, size, blob in self._db.execute(
+                    'SELECT host, path, size, blob FROM files ORDER BY '
+                    'used').fetchall():
+                if total <= budget:
+                    break
+                elif (host, path) in self._pinned:
+                    continue
+                self._unlink(blob)
+                self._db.execute('DELETE FROM files WHERE host = ? AND '
+                                 'path = ?', (host, path))
+                total -= size
+            self._db.commit()
+
+    def fresh(self, host, path):
+        '''Return the cached file for path if it was checked against the
+        server within ttl, None otherwise.'''
+        if self.ttl is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                'SELECT blob, checked FROM files WHERE host = ? AND '
+                'path = ?', (host, path)).fetchone()
+            if row is None or time() - row[1] >= self.ttl:
+                return None
+            return self._use(host, path, row[0])
+
+    def lookup(self, host, path, size, mtime):
+        '''Return the cached file for path if it was cached at this size
+        and mtime, marking it checked, None otherwise.'''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT blob FROM files WHERE host = ? AND path = ? AND '
+                'size = ? AND mtime = ?', (host, path, size,
+                                           mtime)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE files SET checked = ? WHERE host = ? '
+                             'AND path = ?', (time(), host, path))
+            return self._use(host, path, row[0])
+
+    @contextmanager
+    def pin(self, host, path):
+        '''Keep evict from dropping the file cached for path while in the
+        context, so it can be served once looked up or stored.'''
+        with self._lock:
+            self._pinned[(host, path)] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned[(host, path)] -= 1
+                if not self._pinned[(host, path)]:
+                    del self._pinned[(host, path)]
+
+    def partial(self):
+        '''Return a new temporary file within the cache directory, for a
+        download on its way to store.'''
+        descriptor, path = mkstemp(dir=self.directory, prefix='.',
+                                   suffix='.part')
+        close(descriptor)
+        return path
+
+    def store(self, host, path, size, mtime, source):
+        '''Rename source, a file from partial, into the cache as the
+        content of path, replacing what was cached for it, then evict down
+        to budget, sparing path itself. An mtime of None caches the file
+        without trusting it, the next lookup misses. Returns the cached
+        file.'''
+        blob = sha256(f'{host}\0{path}\0{size}\0{mtime}'.encode(
+            'utf-8', 'surrogateescape')).hexdigest()
+        now = time()
+        replace(source, self.directory.joinpath(blob))
+        with self._lock:
+            row = self._db.execute(
+                'SELECT blob FROM files WHERE host = ? AND path = ?',
+                (host, path)).fetchone()
+            if row is not None and row[0] != blob:
+                self._unlink(row[0])
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (host, path, size, mtime, blob,
+                 0 if mtime is None else now, now))
+            self._db.commit()
+        with self.pin(host, path):
+            self.evict()
+
+        return self.directory.joinpath(blob)
+
+    def _unlink(self, blob):
+        try:
+            self.directory.joinpath(blob).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _use(self, host, path, blob):
+        cached = self.directory.joinpath(blob)
+        if cached.is_file():
+            self._db.execute('UPDATE files SET used = ? WHERE host = ? AND '
+                             'path = ?', (time(), host, path))
+        else:
+            self._db.execute('DELETE FROM files WHERE host = ? AND path = ?',
+                             (host, path))
+            cached = None
+        # Committed straight away, other processes may share the cache.
+        self._db.commit()
+
+        return cached
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class Inotify(object):
+    '''Minimal Linux inotify binding over ctypes, a file like object that
+    can be handed to :mod:`selectors` and read for events once ready.
+
+    :raises OSError: if inotify isn't available on this platform
+    '''
+    CLOSE_WRITE = 0x00000008
+    CREATE = 0x00000100
+    IGNORED = 0x00008000
+    ISDIR = 0x40000000
+    MOVED_TO = 0x00000080
+    Q_OVERFLOW = 0x00004000
+
+    def __init__(self):
+        libc = CDLL(find_library('c') or 'libc.so.6', use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            self._fd = libc.inotify_init1(O_CLOEXEC | O_NONBLOCK)
+        except AttributeError:
+            raise OSError('inotify is not available on this platform.')
+        if self._fd < 0:
+            raise OSError(get_errno(), strerror(get_errno()))
+        self._watches = {}
+
+    def add(self, path, mask):
+        '''Watch path for the events in mask, returning the watch
+        descriptor.'''
+        watch = self._add_watch(self._fd, fsencode(path), mask)
+        if watch < 0:
+            raise OSError(get_errno(), strerror(get_errno()), path)
+        self._watches[watch] = Path(path).as_posix()
+
+        return watch
+
+    def close(self):
+        '''Close the inotify instance, dropping all of its watches.'''
+        if self._fd >= 0:
+            close(self._fd)
+            self._fd = -1
+
+    def fileno(self):
+        return self._fd
+
+    def read(self):
+        '''Return [(mask, path),] for the events waiting, path being None
+        when the kernel queue overflowed.'''
+        try:
+            data = read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events, offset = [], 0
+        while offset < len(data):
+            watch, mask, _, length = unpack_from('iIII', data, offset)
+            offset += 16
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.Q_OVERFLOW:
+                events.append((mask, None))
+            elif mask & self.IGNORED:
+                self._watches.pop(watch, None)
+            elif watch in self._watches:
+                path = self._watches[watch]
+                if name:
+                    path = f'{path}/{fsdecode(name)}'
+                events.append((mask, path))
+
+        return events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class Manifest(dict):
+    '''Directory tree container that also keeps per entry metadata in
+    compact columns. The dict itself holds the same ``{directory: [(source,
+    destination)]}`` tree built by :func:`localtree` and
+    :meth:`.remotetree`, so a Manifest is accepted anywhere those
+    containers are. Entries are stored as arrays of sizes, mtimes, modes,
+    inodes, devices and link counts, with each path split into an index of
+    its shared parent directory and its name packed into one buffer.
+
+    :ivar list directories: Parent directories of all entries, trailing
+        slash included, indexed by :attr:`parents`.
+    :ivar array parents: Index into :attr:`directories` per entry.
+    :ivar array sizes: st_size per entry.
+    :ivar array mtimes: st_mtime per entry.
+    :ivar array modes: st_mode per entry.
+    :ivar array inodes: st_ino per entry, 0 if unknown.
+    :ivar array devices: st_dev per entry, 0 if unknown.
+    :ivar array nlinks: st_nlink per entry, 1 if unknown.
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.directories = []
+        self.devices = array('Q')
+        self.inodes = array('Q')
+        self.modes = array('L')
+        self.mtimes = array('d')
+        self.nlinks = array('L')
+        self.parents = array('L')
+        self.sizes = array('q')
+        self._directory_index = {}
+        self._names = bytearray()
+        self._offsets = array('Q', [0])
+
+    def append(self, path, size=0, mtime=0, mode=0, inode=0, device=0,
+               nlink=1):
+        '''Add an entry, the same fields and order as :func:`localscan`.'''
+        parent, name = path[:path.rfind('/') + 1], path[path.rfind('/') + 1:]
+        index = self._directory_index.get(parent)
+        if index is None:
+            index = self._directory_index[parent] = len(self.directories)
+            self.directories.append(parent)
+
+        self.devices.append(device or 0)
+        self.inodes.append(inode or 0)
+        self.modes.append(mode or 0)
+        self.mtimes.append(mtime or 0)
+        self.nlinks.append(nlink or 1)
+        self.parents.append(index)
+        self.sizes.append(size or 0)
+        self._names += name.encode('utf-8', 'surrogateescape')
+        self._offsets.append(len(self._names))
+
+    @property
+    def count(self):
+        '''Number of entries held, not to be confused with len() which
+        counts directories in the tree like any other container.'''
+        return len(self.sizes)
+
+    def entries(self, order=None):
+        '''Lazily yield entries as :func:`localscan` tuples.
+
+        :param iterable order: *Default: None*. Entry indexes to yield, such
+            as those returned by :meth:`order`, else insertion order.
+        '''
+        for index in range(self.count) if order is None else order:
+            yield self.entry(index)
+
+    def entry(self, index):
+        '''Return the entry at index as a :func:`localscan` tuple.'''
+        return (self.path(index), self.sizes[index], self.mtimes[index],
+                self.modes[index], self.inodes[index], self.devices[index],
+                self.nlinks[index])
+
+    def extend(self, entries):
+        '''Add every entry from an iterable of :func:`localscan` tuples.'''
+        for entry in entries:
+            self.append(*entry)
+
+    def order(self, column='sizes', reverse=False):
+        '''Return entry indexes sorted by one of the metadata columns.'''
+        values = getattr(self, column)
+
+        return array('L', sorted(range(self.count), key=values.__getitem__,
+                                 reverse=reverse))
+
+    def path(self, index):
+        '''Return the full path of the entry at index.'''
+        name = self._names[self._offsets[index]:self._offsets[index + 1]]
+
+        return (self.directories[self.parents[index]] +
+                name.decode('utf-8', 'surrogateescape'))
+
+
+class Metrics(object):
+    '''Sink for the measurements a :class:`.Connection` takes of itself,
+    doing nothing with them. Subclass it, overriding count, gauge and
+    observe, and pass an instance as ``metrics`` to send them elsewhere.
+
+    Measurements taken:
+        * bytes_transferred_total{direction} - counter of bytes moved by
+          transfers, get or put.
+        * channel_open_seconds - histogram of SFTP channel setup.
+        * handshake_seconds - histogram of transport connection setup, key
+          exchange and host key checking.
+        * op_errors_total{op} - counter of operations raising.
+        * op_latency_seconds{op} - histogram of operations, stat, get, put
+          and friends, by method name.
+        * retries_total{op} - counter of attempts retried.
+        * active_workers - gauge of transfers running in bulk pools.
+    '''
+    def count(self, name, value=1, **labels):
+        '''add value to counter name'''
+
+    def gauge(self, name, value, **labels):
+        '''add value, which may be negative, to gauge name'''
+
+    def observe(self, name, value, **labels):
+        '''record value as a sample of histogram name'''
+
+
+class OpenTelemetryMetrics(Metrics):
+    '''Records measurements with OpenTelemetry instruments, created on
+    first use. Gauges are up down counters and labels become attributes.
+
+    :param opentelemetry.metrics.Meter meter: *Default: None*. Meter to
+        create instruments with, one named sftpretty from the global meter
+        provider if not given.
+
+    :raises ImportError: if opentelemetry-api is not installed
+    '''
+    def __init__(self, meter=None):
+        if opentelemetry is None:
+            raise ImportError('OpenTelemetryMetrics needs opentelemetry-api.')
+        self.meter = meter or opentelemetry.get_meter('sftpretty')
+        self._instruments = {}
+        self._lock = Lock()
+
+    def count(self, name, value=1, **labels):
+        self._instrument('create_counter', name).add(value, labels)
+
+    def gauge(self, name, value, **labels):
+        self._instrument('create_up_down_counter', name).add(value, labels)
+
+    def observe(self, name, value, **labels):
+        self._instrument('create_histogram', name).record(value, labels)
+
+    def _instrument(self, kind, name):
+        instrument = self._instruments.get(name)
+        if instrument is None:
+            with self._lock:
+                if name not in self._instruments:
+                    unit = 's' if name.endswith('_seconds') else ''
+                    self._instruments[name] = getattr(self.meter, kind)(
+                        name, unit=unit)
+                instrument = self._instruments[name]
+
+        return instrument
+
+
+class PrometheusMetrics(Metrics):
+    '''Records measurements in prometheus_client collectors, created on
+    first use with the label names they are first given. Collectors are
+    shared by every instance recording to the same registry, as a registry
+    takes each metric name once.
+
+    :param str namespace: *Default: sftpretty*. Prefix of every metric name.
+    :param prometheus_client.CollectorRegistry registry: *Default: None*.
+        Registry to add collectors to, the default registry if not given.
+
+    :raises ImportError: if prometheus_client is not installed
+    '''
+    _lock = Lock()
+    _registries = WeakKeyDictionary()
+
+    def __init__(self, namespace='sftpretty', registry=None):
+        if prometheus_client is None:
+            raise ImportError('PrometheusMetrics needs prometheus_client.')
+        self.namespace = namespace
+        self.registry = registry or prometheus_client.REGISTRY
+        with self._lock:
+            self._collectors = self._registries.setdefault(self.registry, {})
+
+    def count(self, name, value=1, **labels):
+        self._collector(prometheus_client.Counter, name, labels).inc(value)
+
+    def gauge(self, name, value, **labels):
+        self._collector(prometheus_client.Gauge, name, labels).inc(value)
+
+    def observe(self, name, value, **labels):
+        self._collector(prometheus_client.Histogram, name,
+                        labels).observe(value)
+
+    def _collector(self, kind, name, labels):
+        key = (self.namespace, name)
+        collector = self._collectors.get(key)
+        if collector is None:
+            with self._lock:
+                if key not in self._collectors:
+                    self._collectors[key] = kind(
+                        name, name.replace('_', ' '), sorted(labels),
+                        namespace=self.namespace, registry=self.registry)
+                collector = self._collectors[key]
+
+        return collector.labels(**labels) if labels else collector
+
+
+class RemoteIndex(object):
+    '''SQLite backed index of remote directory trees, kept between runs so
+    a rescan only lists the directories whose mtime moved since the last
+    one. Rows are keyed by host and root, one database can hold any number
+    of both. A directory's mtime only changes when entries are added,
+    removed or renamed in it, files rewritten in place are not noticed until
+    their directory is listed again. A directory whose mtime is within a
+    second of the local clock when it is listed is listed again next time,
+    as a change in that same second would leave its mtime as it was. That
+    assumes the server's clock agrees with the local one, a server running
+    behind can have such a change go unnoticed until the directory changes
+    again.
+
+    :param str database: *Default: :memory:*. Path of the SQLite database,
+        created along with its parent directories if missing.
+    '''
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS directories (
+            host TEXT, root TEXT, path TEXT, mtime INTEGER,
+            PRIMARY KEY (host, root, path));
+        CREATE TABLE IF NOT EXISTS entries (
+            host TEXT, root TEXT, parent TEXT, path TEXT, size INTEGER,
+            mtime INTEGER, mode INTEGER, atime INTEGER, uid INTEGER,
+            gid INTEGER, PRIMARY KEY (host, root, path));
+        CREATE INDEX IF NOT EXISTS entries_parent
+            ON entries (host, root, parent);
+    '''
+
+    def __init__(self, database=':memory:'):
+        if database != ':memory:':
+            database = Path(database).expanduser()
+            database.parent.mkdir(exist_ok=True, parents=True)
+        self._db = connect(database, check_same_thread=False)
+        self._lock = Lock()
+        with self._lock:
+            self._db.executescript(self.SCHEMA)
+
+    def clear(self, host=None, root=None):
+        '''Forget everything indexed, or only that of a host or host and
+        root.'''
+        where, values = self._where(host, root)
+        with self._lock:
+            for table in ('directories', 'entries'):
+                self._db.execute(f'DELETE FROM {table}{where}', values)
+            self._db.commit()
+
+    def close(self):
+        '''Commit pending changes and close the database.'''
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def commit(self):
+        '''Write pending changes to the database.'''
+        with self._lock:
+            self._db.commit()
+
+    def directories(self, host, root):
+        '''Return {directory: mtime} for every directory indexed under
+        root.'''
+        with self._lock:
+            return dict(self._db.execute(
+                'SELECT path, mtime FROM directories WHERE host = ? AND '
+                'root = ?', (host, root)))
+
+    def entries(self, host, root):
+        '''Return every entry indexed under root as (path, size, mtime,
+        mode, atime, uid, gid) tuples sorted by path, suitable for
+        :func:`diff`.'''
+        with self._lock:
+            return self._db.execute(
+                'SELECT path, size, mtime, mode, atime, uid, gid FROM entries '
+                'WHERE host = ? AND root = ? ORDER BY path',
+                (host, root)).fetchall()
+
+    def listing(self, host, root, directory):
+        '''Return the entries of one indexed directory as (path, size,
+        mtime, mode, atime, uid, gid) tuples.'''
+        with self._lock:
+            return self._db.execute(
+                'SELECT path, size, mtime, mode, atime, uid, gid FROM entries '
+                'WHERE host = ? AND root = ? AND parent = ?',
+                (host, root, directory)).fetchall()
+
+    def prune(self, host, root, directory):
+        '''Forget a directory along with everything indexed below it.'''
+        prefix = f'{directory.rstrip("/")}/'
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM directories WHERE host = ? AND root = ? AND '
+                '(path = ? OR substr(path, 1, ?) = ?)',
+                (host, root, directory, len(prefix), prefix))
+            self._db.execute(
+                'DELETE FROM entries WHERE host = ? AND root = ? AND '
+                'substr(path, 1, ?) = ?', (host, root, len(prefix), prefix))
+
+    def store(self, host, root, directory, mtime, entries):
+        '''Replace the indexed listing of a directory. Sub-directories that
+        disappeared are pruned along with everything below them.
+
+        :param str directory: directory listed
+        :param int mtime: directory's mtime when listed, None to list it
+            again next time no matter what
+        :param list entries: (path, size, mtime, mode, atime, uid, gid)
+            tuples of the directory's entries
+        '''
+        entries = list(entries)
+        paths = {entry[0] for entry in entries}
+        for path, size, _, mode, *_ in self.listing(host, root, directory):
+            if S_ISDIR(mode or 0) and path not in paths:
+                self.prune(host, root, path)
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM entries WHERE host = ? AND root = ? AND '
+                'parent = ?', (host, root, directory))
+            self._db.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, '
+                '?, ?, ?)', ((host, root, directory, *entry)
+                             for entry in entries))
+            self._db.execute(
+                'INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                (host, root, directory, mtime))
+            if mtime is not None:
+                self._db.execute(
+                    'UPDATE entries SET mtime = ? WHERE host = ? AND '
+                    'root = ? AND path = ?', (mtime, host, root, directory))
+
+    def _where(self, host, root):
+        columns = [(column, value) for column, value in (('host', host),
+                                                         ('root', root))
+                   if value is not None]
+        if not columns:
+            return '', ()
+
+        return (' WHERE ' + ' AND '.join(f'{column} = ?'
+                                         for column, _ in columns),
+                tuple(value for _, value in columns))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class _Responses(dict):
+    '''Collects responses to pipelined SFTP requests by request number,
+    standing in for the file object paramiko hands them to.'''
+    def _async_response(self, kind, message, number):
+        self[number] = (kind, message)
+
+
+class _Tee(object):
+    '''Wraps a file object, feeding every block read from or written to it
+    through a digest on the way past, so a transfer is hashed without
+    reading it twice.'''
+    def __init__(self, stream, algorithm):
+        self.digest = new(getattr(algorithm, 'name', algorithm))
+        self.stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        return data
+
+    def skip(self, size, blocksize=1048576):
+        '''digest the next size bytes of the stream without handing them on,
+        covering what an earlier transfer already moved'''
+        while size > 0:
+            data = self.stream.read(min(size, blocksize))
+            if not data:
+                break
+            self.digest.update(data)
+            size -= len(data)
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.stream.write(data)
 
 
 def _callback(filename, bytes_so_far, bytes_total, logger=None):
-    message = (f'Transfer of File: [{filename}] @ '
-               f'{100.0 * bytes_so_far / bytes_total:.1f}% '
-               f'{bytes_so_far:d}:{bytes_total:d} bytes ')
+    if not bytes_total:
+        message = (f'Transfer of File: [{filename}] @ '
+                   f'{bytes_so_far:d} bytes ')
+    else:
+        message = (f'Transfer of File: [{filename}] @ '
+                   f'{100.0 * bytes_so_far / bytes_total:.1f}% '
+                   f'{bytes_so_far:d}:{bytes_total:d} bytes ')
     if logger:
         logger.info(message)
     else:
         print(message)
 
 
+def _chunks(iterable, loop=None):
+    '''yield the items of an iterable, or of an async iterable, driving it
+    on a private event loop or, when given, on loop from another thread.
+    An async iterable is closed along with the generator, even when it
+    wasn't run out.'''
+    if not hasattr(iterable, '__aiter__'):
+        yield from iterable
+        return
+
+    iterator = iterable.__aiter__()
+
+    async def _close():
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+    async def _next():
+        return await iterator.__anext__()
+
+    private = new_event_loop() if loop is None else None
+
+    def _run(coroutine):
+        if private is None:
+            return run_coroutine_threadsafe(coroutine, loop).result()
+        return private.run_until_complete(coroutine)
+
+    try:
+        while True:
+            try:
+                yield _run(_next())
+            except StopAsyncIteration:
+                return
+    finally:
+        try:
+            _run(_close())
+        finally:
+            if private is not None:
+                try:
+                    private.run_until_complete(private.shutdown_asyncgens())
+                finally:
+                    private.close()
+
+
+def _columns(entries, root):
+    '''Return names relative to root, sizes and mtimes of the regular files
+    in entries, sorted by name.'''
+    if isinstance(entries, Manifest):
+        entries = entries.entries()
+    prefix = f'{root.rstrip("/")}/' if root else ''
+    rows = []
+    for entry in entries:
+        if hasattr(entry, 'filename'):
+            entry = (entry.filename, entry.st_size, entry.st_mtime,
+                     entry.st_mode)
+        path, size, mtime, mode = entry[:4]
+        if S_ISREG(mode or 0):
+            if prefix and path.startswith(prefix):
+                path = path[len(prefix):]
+            rows.append((path, size or 0, mtime or 0))
+    rows.sort()
+
+    return ([name for name, size, mtime in rows],
+            array('q', (size for name, size, mtime in rows)),
+            array('d', (mtime for name, size, mtime in rows)))
+
+
+def _measured(method):
+    '''time each call of a Connection method, by name, in its metrics'''
+    @wraps(method)
+    def _measure(self, *args, **kwargs):
+        start = monotonic()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            self._metrics.count('op_errors_total', op=method.__name__)
+            raise
+        finally:
+            self._metrics.observe('op_latency_seconds', monotonic() - start,
+                                  op=method.__name__)
+
+    return _measure
+
+
+def _pool_size(workers=None):
+    '''Return workers, or the number of threads a ThreadPoolExecutor
+    defaults to when it is None.'''
+    if workers is None:
+        workers = min(32, (cpu_count() or 1) + 4)
+
+    return workers
+
+
+def _partial(remotepath, unique=True):
+    '''Return the hidden name a file is uploaded under before being renamed
+    to remotepath, kept in the same directory so the rename is atomic. Names
+    are unique to each upload, so concurrent uploads of the same file can't
+    write into each other, unless an upload is to be resumed later.'''
+    parent, slash, name = remotepath.rpartition('/')
+    suffix = f'.{uuid4().hex[:12]}' if unique else ''
+
+    return f'{parent}{slash}.{name}{suffix}.part'
+
+
+def _pipelined(channel, requests, window=64, again=None):
+    '''Send (key, command, *arguments) requests over an SFTP channel,
+    keeping up to window of them in flight rather than waiting on each in
+    turn, and yield (key, kind, message) as their responses come back.
+    Requests appended to again while consuming are sent ahead of the rest.
+    Responses still due when the generator is closed early, or fails, are
+    read and dropped, leaving nothing outstanding on the channel.'''
+    again = [] if again is None else again
+    pending, requests = {}, iter(requests)
+    responses = _Responses()
+
+    try:
+        while True:
+            while len(pending) < window:
+                request = again.pop() if again else next(requests, None)
+                if request is None:
+                    break
+                key, command, *arguments = request
+                pending[channel._async_request(responses, command,
+                                               *arguments)] = key
+            if not pending:
+                break
+            channel._read_response()
+            for number in sorted(responses):
+                kind, message = responses.pop(number)
+                yield pending.pop(number), kind, message
+    finally:
+        try:
+            while pending.keys() - responses.keys():
+                channel._read_response()
+        except (EOFError, OSError, SSHException):
+            pass
+
+
+def diff(local, remote, localdir='', remotedir='', mtime_window=0):
+    '''compare a local and remote listing of regular files by name, size
+    and modification time. Both listings are reduced to name sorted columns
+    and merged in a single pass.
+
+    :param Manifest,list local:
+        Manifest or list of :func:`localscan` tuples
+    :param Manifest,list remote:
+        Manifest, list of :func:`localscan` tuples or list of SFTPAttributes
+        as returned by :meth:`.listdir_attr`
+    :param str localdir:
+        root stripped from local paths to compare relative names
+    :param str remotedir:
+        root stripped from remote paths to compare relative names
+    :param int mtime_window: *Default: 0*. Seconds modification times may
+        differ, compared as whole seconds, before a file counts as changed
+
+    :returns: dict of sorted lists of relative names
+        {'added': [local only], 'changed': [both, but different],
+         'deleted': [remote only]}
+
+    '''
+    lnames, lsizes, lmtimes = _columns(local, localdir)
+    rnames, rsizes, rmtimes = _columns(remote, remotedir)
+
+    added, changed, deleted = [], [], []
+    i = j = 0
+    while i < len(lnames) and j < len(rnames):
+        if lnames[i] < rnames[j]:
+            added.append(lnames[i])
+            i += 1
+        elif lnames[i] > rnames[j]:
+            deleted.append(rnames[j])
+            j += 1
+        else:
+            if (lsizes[i] != rsizes[j] or
+                    abs(int(lmtimes[i]) - int(rmtimes[j])) > mtime_window):
+                changed.append(lnames[i])
+            i += 1
+            j += 1
+    added.extend(lnames[i:])
+    deleted.extend(rnames[j:])
+
+    return {'added': added, 'changed': changed, 'deleted': deleted}
+
+
 def drivedrop(filepath):
     if PureWindowsPath(filepath).drive:
         filepath = Path('/').joinpath(*Path(filepath).parts[1:]).as_posix()
@@ -23,37 +1143,124 @@ def drivedrop(filepath):
     return filepath
 
 
-def hash(filename, algorithm=sha3_512(), blocksize=65536):
-    '''hash contents of a file, file like object or string
+def _digest(view, buffers, blocksize):
+    '''feed a buffer to every digest a block at a time, slicing views of it
+    rather than copying'''
+    for offset in range(0, len(view), blocksize):
+        with view[offset:offset + blocksize] as chunk:
+            for buffer in buffers:
+                buffer.update(chunk)
+
+
+def _digest_stream(stream, buffers, blocksize):
+    '''feed a file object to every digest, reading into one reused block
+    when it supports readinto'''
+    if hasattr(stream, 'readinto'):
+        block = bytearray(blocksize)
+        with memoryview(block) as view:
+            for count in iter(lambda: stream.readinto(block), 0):
+                if count is None:
+                    continue
+                with view[:count] as chunk:
+                    for buffer in buffers:
+                        buffer.update(chunk)
+    else:
+        for chunk in iter(lambda: stream.read(blocksize), b''):
+            for buffer in buffers:
+                buffer.update(chunk)
+
+
+def hash(filename, algorithm=sha3_512(), blocksize=1048576):
+    '''hash contents of a file, file like object, buffer or string in one
+    pass, computing every requested digest together. Files of at least
+    blocksize are memory mapped rather than read.
 
-    :param bytesIO,IObase,str filename:
-        path to file, file object, or string to process
-    :param hashlib.hash algorithm:
-        hash object to use as digest algorithm
+    :param bytes,IOBase,memoryview,PathLike,str filename:
+        path to file, file object, string, or any object supporting the
+        buffer protocol to process
+    :param hashlib.hash,list,str,tuple algorithm:
+        hash object or name to use as digest algorithm, or a sequence of
+        them
     :param int blocksize:
-        size of chunk to read in avoiding memory exhaustion
+        size of chunk fed to the digests at a time
 
-    :returns: hexdigest
+    :returns: hexdigest, or a tuple of them when given a sequence of
+        algorithms
 
     :raises: Exception
 
     '''
-    buffer = new(algorithm.name)
-    if isinstance(filename, str):
+    algorithms = algorithm if isinstance(algorithm, (list, tuple)) else (
+        algorithm,)
+    buffers = [new(getattr(algorithm, 'name', algorithm))
+               for algorithm in algorithms]
+
+    if isinstance(filename, BytesIO):
+        position = filename.tell()
+        with filename.getbuffer() as view:
+            _digest(view[position:], buffers, blocksize)
+        filename.seek(0, SEEK_END)
+    elif isinstance(filename, (PathLike, str)):
         try:
-            with open(filename, 'rb') as filestream:
-                for chunk in iter(lambda: filestream.read(blocksize), b''):
-                    buffer.update(chunk)
+            with open(filename, 'rb', buffering=0) as filestream:
+                size = fstat(filestream.fileno()).st_size
+                if size < blocksize:
+                    _digest_stream(filestream, buffers, blocksize)
+                else:
+                    with mmap(filestream.fileno(), 0,
+                              access=ACCESS_READ) as mapped:
+                        if MADV_SEQUENTIAL is not None:
+                            mapped.madvise(MADV_SEQUENTIAL)
+                        with memoryview(mapped) as view:
+                            _digest(view, buffers, blocksize)
         except FileNotFoundError:
-            buffer.update(bytes(filename.encode('utf-8')))
-    elif isinstance(filename, BytesIO):
-        for chunk in iter(lambda: filestream.read1(blocksize), b''):
-            buffer.update(chunk)
-    elif isinstance(filename, IOBase):
-        for chunk in iter(lambda: filestream.read(blocksize), b''):
-            buffer.update(chunk)
+            if not isinstance(filename, str):
+                raise
+            for buffer in buffers:
+                buffer.update(filename.encode('utf-8'))
+    elif isinstance(filename, IOBase) or hasattr(filename, 'read'):
+        _digest_stream(filename, buffers, blocksize)
+    else:
+        with memoryview(filename) as view:
+            _digest(view.cast('B'), buffers, blocksize)
+
+    digests = tuple(buffer.hexdigest() for buffer in buffers)
+
+    return digests if isinstance(algorithm, (list, tuple)) else digests[0]
 
-    return algorithm.hexdigest()
+
+def hashes(filenames, algorithm=sha3_512(), blocksize=1048576,
+           workers=None):
+    '''hash many files across a pool of processes, each in one pass like
+    hash, sidestepping the GIL for the bookkeeping around every block.
+
+    :param list filenames:
+        paths of the files to hash
+    :param hashlib.hash,list,str,tuple algorithm:
+        hash object or name to use as digest algorithm, or a sequence of
+        them
+    :param int blocksize:
+        size of chunk fed to the digests at a time
+    :param int workers:
+        number of processes, defaults to the number of processors
+
+    :returns: dict of filename to hexdigest, or tuple of them
+
+    :raises: FileNotFoundError if a file doesn't exist, unlike hash which
+        takes a str it can't open as the string to hash
+
+    '''
+    filenames = list(filenames)
+    if isinstance(algorithm, (list, tuple)):
+        algorithm = [getattr(each, 'name', each) for each in algorithm]
+    else:
+        algorithm = getattr(algorithm, 'name', algorithm)
+    chunksize = max(1, len(filenames) // ((workers or cpu_count() or 1) * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(filenames, pool.map(
+            partial(hash, algorithm=algorithm, blocksize=blocksize),
+            map(Path, filenames), chunksize=chunksize)))
 
 
 def localtree(container, localdir, remotedir, recurse=True):
@@ -98,7 +1305,97 @@ def localtree(container, localdir, remotedir, recurse=True):
         raise err
 
 
-def retry(exceptions, tries=0, delay=3, backoff=2, silent=False, logger=None):
+def localscan(localdir, recurse=True, workers=None, manifest=None):
+    '''scan a local directory tree with os.scandir, collecting each entry's
+    metadata in the same pass. Directories are spread across a thread pool
+    when workers is more than one.
+
+    :param str localdir:
+        root of local directory to scan
+    :param bool recurse: *Default: True*. To recurse or not to recurse
+        that is the question
+    :param int workers: *Default: None*. Number of directories scanned
+        at once, None or 1 scans in the calling thread
+    :param Manifest manifest: *Default: None*. Manifest to add entries to
+        instead of building a list
+
+    :returns: list of tuple
+        [(path, st_size, st_mtime, st_mode, st_ino, st_dev, st_nlink),]
+        for every file and directory below localdir, symlinks followed,
+        or manifest when given
+
+    :raises: OSError
+
+    '''
+    def _scan(directory):
+        entries, subdirs = [], []
+        with scandir(directory) as listing:
+            for entry in listing:
+                try:
+                    attributes = entry.stat()
+                except FileNotFoundError:
+                    # dangling symlink
+                    continue
+                path = Path(entry.path).as_posix()
+                entries.append((path, attributes.st_size,
+                                attributes.st_mtime, attributes.st_mode,
+                                attributes.st_ino, attributes.st_dev,
+                                attributes.st_nlink))
+                if recurse and S_ISDIR(attributes.st_mode):
+                    subdirs.append(path)
+
+        return entries, subdirs
+
+    entries = [] if manifest is None else manifest
+    pending = [Path(localdir).expanduser().absolute().as_posix()]
+
+    if workers in (None, 0, 1):
+        while pending:
+            scanned, subdirs = _scan(pending.pop())
+            entries.extend(scanned)
+            pending.extend(subdirs)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_scan, pending.pop())}
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scanned, subdirs = future.result()
+                    entries.extend(scanned)
+                    futures.update(pool.submit(_scan, subdir)
+                                   for subdir in subdirs)
+
+    return entries
+
+
+def _read_spans(channel, handle, reads, window=64):
+    '''Read (key, offset, length) spans of an open remote file handle with
+    pipelined READs, yielding (key, offset, data) for each piece as it
+    arrives, data being a memoryview of the response. A server answering
+    with less than asked is asked again for the rest, the end of the file
+    ends a span early.'''
+    again = []
+    requests = ((read, CMD_READ, handle, int64(read[1]), read[2])
+                for read in reads)
+
+    for (key, offset, length), kind, message in _pipelined(
+            channel, requests, window=window, again=again):
+        if kind == CMD_STATUS:
+            try:
+                channel._convert_status(message)
+            except EOFError:
+                continue
+        if kind != CMD_DATA:
+            raise SSHException(f'Expected data [{kind}]')
+        data = memoryview(message.get_string())
+        if 0 < len(data) < length:
+            rest = (key, offset + len(data), length - len(data))
+            again.append((rest, CMD_READ, handle, int64(rest[1]), rest[2]))
+        yield key, offset, data
+
+
+def retry(exceptions, tries=0, delay=3, backoff=2, silent=False, logger=None,
+          metrics=None):
     '''Exception type based retry decorator for all your problematic functions
 
     :param Exception exceptions:
@@ -115,6 +1412,8 @@ def retry(exceptions, tries=0, delay=3, backoff=2, silent=False, logger=None):
         if set then no logging will be attempted.
     :param logging.logger logger:
         logger instance to use. If None, print.
+    :param Metrics metrics:
+        counts each retry as retries_total, labelled with the function name.
 
     :returns: wrapped function
 
@@ -162,6 +1461,9 @@ def retry(exceptions, tries=0, delay=3, backoff=2, silent=False, logger=None):
                             logger.warning(msg)
                         else:
                             print(msg)
+                    if metrics is not None:
+                        metrics.count('retries_total',
+                                      op=f.__name__.lstrip('_'))
                     sleep(mdelay)
                     mtries -= 1
                     mdelay *= backoff
@@ -0,0 +1,84 @@
+'''test sftpretty.Connection.checksums'''
+
+import pytest
+
+from blddirs import build_dir_struct, FILE_LIST
+from common import conn, rmdir, STARS8192, VFS
+from hashlib import md5, sha256
+from pathlib import Path
+from sftpretty import Connection
+from subprocess import run
+from tempfile import mkdtemp
+from threading import current_thread, main_thread
+
+
+def _local_shell(command, **kwargs):
+    '''stand in for execute_stream, running command on this machine'''
+    result = run(command, capture_output=True, shell=True)
+    yield 'stdout', result.stdout
+    yield 'stderr', result.stderr
+    yield 'exit', result.returncode
+
+
+def test_checksums_batches(sftpserver):
+    '''test listed files are summed in batches of exec sessions'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            paths = [localpath.joinpath(*parts).as_posix()
+                     for parts in FILE_LIST]
+            # the virtual sftpserver can't exec, these run here instead
+            sftp.execute_stream = _local_shell
+            digest = sha256(STARS8192.encode('utf-8')).hexdigest()
+
+            assert sftp.checksums(paths, batch=2) == {
+                path: digest for path in paths}
+
+            rmdir(localpath.as_posix())
+
+
+def test_checksums_check_file(sftpserver):
+    '''test servers without a shell are summed with check-file'''
+    # check-file on the virtual sftpserver needs 256 bytes or more
+    content = {name: name.encode('utf-8') * 512
+               for name in ('one.txt', 'two.txt')}
+    with sftpserver.serve_content({'home': {'test': {'sums': content}}}):
+        with Connection(**conn(sftpserver)) as sftp:
+            digests = {name: md5(data).hexdigest()
+                       for name, data in content.items()}
+
+            channel, channels = sftp._sftp_channel, []
+
+            def _channel():
+                if current_thread() is not main_thread():
+                    channels.append(1)
+                return channel()
+
+            # a channel for each file, none left without one to check
+            sftp._sftp_channel = _channel
+            assert sftp.checksums(['sums/one.txt', 'sums/two.txt'],
+                                  algorithm='md5', workers=8) == {
+                f'sums/{name}': digest for name, digest in digests.items()}
+            assert len(channels) == 2
+            sftp._sftp_channel = channel
+
+            with pytest.raises(IOError):
+                sftp.checksums(['sums/one.txt'])
+            with pytest.raises(ValueError):
+                sftp.checksums('sums', algorithm='crc32')
+
+
+def test_checksums_directory(lsftp):
+    '''test a directory is summed in one exec session'''
+    localpath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    digest = sha256(STARS8192.encode('utf-8')).hexdigest()
+
+    assert lsftp.checksums(localpath.as_posix()) == {
+        localpath.joinpath(*parts).as_posix(): digest
+        for parts in FILE_LIST}
+    assert lsftp.checksums(localpath.as_posix(), recurse=False) == {
+        localpath.joinpath('read.me').as_posix(): digest}
+
+    rmdir(localpath.as_posix())
@@ -2,10 +2,11 @@
 
 import pytest
 
-from common import conn, LOCAL, VFS
+from common import conn, LOCAL, tempfile_containing, VFS
+from paramiko import RSAKey
 from pathlib import Path
 from sftpretty import (CnOpts, Connection, ConnectionException,
-                       SSHException)
+                       HostKeysException, SSHException)
 
 
 def test_connection_with(sftpserver):
@@ -46,3 +47,15 @@ def test_connection_good(sftpserver):
     with sftpserver.serve_content(VFS):
         sftp = Connection(**conn(sftpserver))
         sftp.close()
+
+
+def test_connection_hostkey_mismatch(sftpserver):
+    '''refuse a server whose key differs from the known one'''
+    other = RSAKey.generate(1024)
+    with tempfile_containing(f'{sftpserver.host} ssh-rsa '
+                             f'{other.get_base64()}\n') as knownhosts:
+        params = conn(sftpserver)
+        params['cnopts'] = CnOpts(knownhosts=knownhosts)
+        with sftpserver.serve_content(VFS):
+            with pytest.raises(HostKeysException):
+                Connection(**params)
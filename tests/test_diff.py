@@ -0,0 +1,77 @@
+'''test sftpretty.diff and sftpretty.Connection.diff'''
+
+from common import conn, rmdir, VFS
+from pathlib import Path
+from paramiko import SFTPAttributes
+from sftpretty import Connection, diff, Manifest
+from stat import S_IFDIR, S_IFREG
+from tempfile import mkdtemp
+
+
+LOCAL = [('/l/a.txt', 1, 100.0, S_IFREG), ('/l/b.txt', 2, 100.0, S_IFREG),
+         ('/l/d', 0, 100.0, S_IFDIR), ('/l/d/c.txt', 3, 100.0, S_IFREG),
+         ('/l/d/e.txt', 4, 100.5, S_IFREG)]
+REMOTE = [('/r/b.txt', 5, 100.0, S_IFREG), ('/r/d', 0, 100.0, S_IFDIR),
+          ('/r/d/c.txt', 3, 110.0, S_IFREG), ('/r/d/e.txt', 4, 100.0, S_IFREG),
+          ('/r/f.txt', 6, 100.0, S_IFREG)]
+
+
+def attributes(path, size, mtime, mode):
+    attribute = SFTPAttributes()
+    attribute.filename = path
+    attribute.st_mode = mode
+    attribute.st_mtime = int(mtime)
+    attribute.st_size = size
+
+    return attribute
+
+
+def test_diff():
+    '''test diff of two listings sharing no root'''
+    assert diff(LOCAL, REMOTE, localdir='/l', remotedir='/r') == {
+        'added': ['a.txt'], 'changed': ['b.txt', 'd/c.txt'],
+        'deleted': ['f.txt']}
+
+
+def test_diff_mtime_window():
+    '''test diff tolerates modification times within the window'''
+    assert diff(LOCAL, REMOTE, localdir='/l', remotedir='/r',
+                mtime_window=10)['changed'] == ['b.txt']
+
+
+def test_diff_sources():
+    '''test diff takes manifests and SFTPAttributes alike'''
+    local = Manifest()
+    local.extend(LOCAL)
+    remote = [attributes(*entry) for entry in REMOTE]
+
+    assert diff(local, remote, localdir='/l/', remotedir='/r') == diff(
+        LOCAL, REMOTE, localdir='/l', remotedir='/r')
+
+
+def test_diff_empty():
+    '''test diff of empty listings'''
+    empty = {'added': [], 'changed': [], 'deleted': []}
+
+    assert diff([], []) == empty
+
+
+def test_connection_diff(sftpserver):
+    '''test Connection.diff against a modified local copy'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            sftp.get_r('pub', localpath.as_posix())
+
+            assert sftp.diff(localpath, '/home/test/pub', mtime_window=60) == {
+                'added': [], 'changed': [], 'deleted': []}
+
+            localpath.joinpath('new.txt').write_text('new')
+            localpath.joinpath('foo2', 'foo2.txt').write_text('changed')
+            localpath.joinpath('make.txt').unlink()
+
+            assert sftp.diff(localpath, '/home/test/pub', mtime_window=60) == {
+                'added': ['new.txt'], 'changed': ['foo2/foo2.txt'],
+                'deleted': ['make.txt']}
+
+            rmdir(localpath.as_posix())
@@ -1,5 +1,9 @@
 '''test sftpretty.execute'''
 
+from common import conn
+from sftpretty import Connection, execute_fanout
+from unittest.mock import Mock
+
 
 # TODO
 # def test_execute_simple_ro(psftp):
@@ -16,3 +20,97 @@ def test_execute_simple(lsftp):
     # confirm results are an iterable of strings (version dependent)
     for result in results:
         assert isinstance(result, type_check)
+
+
+def test_execute_stderr(lsftp):
+    '''test execute returns stderr when nothing is written to stdout'''
+    results = lsftp.execute('ls /non-existing')
+    assert results
+    for result in results:
+        assert isinstance(result, bytes)
+
+
+def test_execute_stream(lsftp):
+    '''test execute_stream yields output then the exit status'''
+    results = list(lsftp.execute_stream('printf "one\ntwo\nthree"',
+                                        lines=True))
+    assert results == [('stdout', b'one\n'), ('stdout', b'two\n'),
+                       ('stdout', b'three'), ('exit', 0)]
+
+
+def test_execute_stream_stderr(lsftp):
+    '''test execute_stream separates stderr and reports failure'''
+    results = list(lsftp.execute_stream('echo out; echo err >&2; exit 3'))
+    assert ('stdout', b'out\n') in results
+    assert ('stderr', b'err\n') in results
+    assert results[-1] == ('exit', 3)
+
+
+def test_execute_stream_early_exit(lsftp):
+    '''test execute_stream can be abandoned mid stream'''
+    stream = lsftp.execute_stream('yes', bufsize=1024, buffers=2)
+    name, chunk = next(stream)
+    stream.close()
+    assert name == 'stdout'
+    assert chunk.startswith(b'y\n')
+
+
+def test_execute_stream_channel(sftpserver, monkeypatch):
+    '''test execute_stream reads a channel without a read timeout'''
+    channel = Mock(**{'get_name.return_value': 'chan',
+                      'recv.side_effect': [b'one\ntw', b'o\n', b''],
+                      'recv_stderr.return_value': b'',
+                      'recv_exit_status.return_value': 0})
+    with Connection(**conn(sftpserver)) as sftp:
+        monkeypatch.setattr(sftp._transport, 'open_session', lambda: channel)
+        results = list(sftp.execute_stream('cmd', lines=True))
+
+    assert results == [('stdout', b'one\n'), ('stdout', b'two\n'),
+                       ('exit', 0)]
+    channel.exec_command.assert_called_once_with('cmd')
+    channel.settimeout.assert_not_called()
+    channel.close.assert_called()
+
+
+def test_execute_batch(lsftp):
+    '''test execute_batch runs each command on its own channel'''
+    results = lsftp.execute_batch(['echo one', 'echo two >&2; exit 2'])
+    assert [result['exit'] for result in results] == [0, 2]
+    assert results[0]['stdout'] == b'one\n'
+    assert results[1]['stderr'] == b'two\n'
+
+
+def test_execute_batch_shell(lsftp):
+    '''test execute_batch shares one shell session across commands'''
+    results = lsftp.execute_batch(['cd /', 'pwd', 'printf x; false',
+                                   'exit 5', 'echo unreached'], shell=True)
+    assert [result['exit'] for result in results] == [0, 0, 1, 5, None]
+    assert results[1]['stdout'] == b'/\n'
+    assert results[2]['stdout'] == b'x'
+
+
+def test_execute_batch_shell_stdin(lsftp):
+    '''test execute_batch shell commands can't read the commands after'''
+    results = lsftp.execute_batch(['cat', 'echo after'], shell=True)
+    assert [result['exit'] for result in results] == [0, 0]
+    assert results[0]['stdout'] == b''
+    assert results[1]['stdout'] == b'after\n'
+
+
+def test_execute_fanout(lsftp):
+    '''test execute_fanout collects results per host'''
+    report = execute_fanout([lsftp, lsftp], 'echo hi', workers=2)
+    assert len(report) == 2
+    for status in report.values():
+        assert status['status'] == 'COMPLETE'
+        assert status['results'][0]['stdout'] == b'hi\n'
+        assert status['results'][0]['exit'] == 0
+
+
+def test_execute_fanout_failed_host(sftpserver):
+    '''test execute_fanout reports a host that could not connect'''
+    bad = dict(conn(sftpserver), host='host.invalid')
+    report = execute_fanout([bad], 'true')
+    (status, ) = report.values()
+    assert status['status'] == 'FAILED'
+    assert status['error'] is not None
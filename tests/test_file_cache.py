@@ -0,0 +1,158 @@
+'''test sftpretty.FileCache'''
+
+import pytest
+
+from common import conn, rmdir, VFS
+from io import BytesIO
+from pathlib import Path
+from sftpretty import Connection, FileCache
+from tempfile import mkdtemp
+from time import sleep
+
+
+def _partial(cache, data):
+    partial = cache.partial()
+    Path(partial).write_bytes(data)
+    return partial
+
+
+def test_file_cache():
+    '''test entries are matched on size and mtime, evicted oldest first'''
+    cachedir = mkdtemp()
+    with FileCache(cachedir, budget=10) as cache:
+        cached = cache.store('host', '/one', 4, 100,
+                             _partial(cache, b'1111'))
+        assert cached.read_bytes() == b'1111'
+        assert cache.lookup('host', '/one', 4, 100) == cached
+        assert cache.lookup('host', '/one', 4, 101) is None
+        assert cache.lookup('other', '/one', 4, 100) is None
+        # nothing is fresh without a ttl
+        assert cache.fresh('host', '/one') is None
+
+        cache.store('host', '/two', 4, 100, _partial(cache, b'2222'))
+        cache.lookup('host', '/one', 4, 100)
+        cache.store('host', '/three', 4, 100, _partial(cache, b'3333'))
+        # /two was the least recently used
+        assert cache.lookup('host', '/two', 4, 100) is None
+        assert cache.lookup('host', '/one', 4, 100) is not None
+
+        # replacing an entry drops the content it had
+        cache.store('host', '/one', 3, 200, _partial(cache, b'one'))
+        assert not cached.exists()
+
+        # an untrusted mtime always misses
+        cache.store('host', '/four', 1, None, _partial(cache, b'4'))
+        assert cache.lookup('host', '/four', 1, None) is None
+
+        cache.clear('host')
+        assert sorted(path.name for path in Path(cachedir).iterdir()) == [
+            'index.sqlite']
+
+    with FileCache(cachedir, budget=10) as cache:
+        # what is stored, or pinned, is never evicted to make room
+        cached = cache.store('host', '/big', 100, 100,
+                             _partial(cache, b'*' * 100))
+        assert cached.read_bytes() == b'*' * 100
+        with cache.pin('host', '/big'):
+            cache.evict()
+            assert cached.exists()
+        cache.evict()
+        assert not cached.exists()
+
+    with FileCache(cachedir, ttl=60) as cache:
+        cache.store('host', '/one', 4, 100, _partial(cache, b'1111'))
+        assert cache.fresh('host', '/one').read_bytes() == b'1111'
+        cache.ttl = 0.1
+        sleep(0.2)
+        assert cache.fresh('host', '/one') is None
+
+    rmdir(cachedir)
+
+
+def test_get_cache(sftpserver):
+    '''test a cached file costs a stat, or nothing within ttl'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            cachedir = mkdtemp()
+            get, stat, calls = sftp.get, sftp.stat, []
+
+            # the virtual sftpserver reports every mtime as now, pin it
+            def _get(remotefile, localpath=None, **kwargs):
+                calls.append('get')
+                attributes = get(remotefile, localpath, **kwargs)
+                attributes.st_mtime = 1000
+                return attributes
+
+            def _stat(remotepath):
+                calls.append('stat')
+                attributes = stat(remotepath)
+                attributes.st_mtime = 1000
+                return attributes
+
+            sftp.get, sftp.stat = _get, _stat
+            localpath = Path(mkdtemp())
+            with FileCache(cachedir) as cache:
+                Connection.get(sftp, 'pub/make.txt',
+                               localpath.joinpath('one.txt'), cache=cache)
+                Connection.get(sftp, 'pub/make.txt',
+                               localpath.joinpath('two.txt'), cache=cache,
+                               preserve_mtime=True)
+                flo = BytesIO()
+                assert Connection.getfo(sftp, 'pub/make.txt', flo,
+                                        cache=cache) == 19
+                with sftp.open('pub/make.txt', cache=cache) as cached:
+                    assert cached.read() == b'content of make.txt'
+                with pytest.raises(ValueError):
+                    sftp.open('pub/make.txt', mode='w', cache=cache)
+
+                # another thread making room can't evict what is served
+                lookup = cache.lookup
+
+                def _lookup(*args):
+                    cached = lookup(*args)
+                    cache.evict(0)
+                    return cached
+
+                cache.lookup = _lookup
+                Connection.get(sftp, 'pub/make.txt',
+                               localpath.joinpath('one.txt'), cache=cache)
+                cache.lookup = lookup
+
+            assert calls == ['stat', 'get', 'stat', 'stat', 'stat', 'stat']
+            assert flo.getvalue() == b'content of make.txt'
+            for name in ('one.txt', 'two.txt'):
+                assert localpath.joinpath(name).read_bytes() == \
+                    b'content of make.txt'
+            assert localpath.joinpath('two.txt').stat().st_mtime == 1000
+
+            calls.clear()
+            with FileCache(cachedir, ttl=60) as cache:
+                Connection.get(sftp, 'pub/make.txt',
+                               localpath.joinpath('one.txt'), cache=cache)
+            assert calls == []
+
+            rmdir(cachedir)
+            rmdir(localpath.as_posix())
+
+
+def test_get_cache_over_budget(sftpserver):
+    '''test a file larger than the budget bypasses the cache'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            cachedir, localpath = mkdtemp(), Path(mkdtemp())
+            with FileCache(cachedir, budget=10) as cache:
+                sftp.get('pub/make.txt', localpath.joinpath('one.txt'),
+                         cache=cache)
+                flo = BytesIO()
+                assert sftp.getfo('pub/make.txt', flo, cache=cache) == 19
+                with sftp.open('pub/make.txt', cache=cache) as remote:
+                    assert remote.read() == b'content of make.txt'
+
+            assert localpath.joinpath('one.txt').read_bytes() == \
+                b'content of make.txt'
+            assert flo.getvalue() == b'content of make.txt'
+            assert sorted(path.name for path in Path(cachedir).iterdir()) == [
+                'index.sqlite']
+
+            rmdir(cachedir)
+            rmdir(localpath.as_posix())
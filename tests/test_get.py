@@ -3,7 +3,11 @@
 import pytest
 
 from common import conn, tempfile_containing, VFS
+from copy import deepcopy
+from hashlib import md5
+from io import BytesIO
 from pathlib import Path
+from paramiko import SFTPClient
 from sftpretty import Connection
 from unittest.mock import Mock
 
@@ -40,8 +44,8 @@ def test_get_callback(sftpserver):
                 assert open(fname, 'rb').read() == b'content of foo1.txt'
             # verify callback was called
             assert cback.call_count
-            # unlike .put() nothing is returned from the operation
-            assert result is None
+            # like .put() the remote file's attributes are returned
+            assert result.st_size == len(b'content of foo1.txt')
 
 
 def test_get_glob_fails(sftpserver):
@@ -78,3 +82,44 @@ def test_get_resume(sftpserver):
                 assert open(fname, 'rb').read() == b'content of foo1.txt'
             # verify difference between remotesize and partial localsize
             assert 9 == (remotesize - localsize)
+
+
+def test_get_preserve_mtime_handle(sftpserver, monkeypatch):
+    '''test get takes the times to preserve from the open handle'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            sftp.chdir('pub/foo1')
+            stat = SFTPClient.stat
+
+            def _stat(channel, path):
+                assert not path.endswith('foo1.txt'), 'stat by path'
+                return stat(channel, path)
+
+            monkeypatch.setattr(SFTPClient, 'stat', _stat)
+            with tempfile_containing(contents='') as fname:
+                sftp.get('foo1.txt', fname, preserve_mtime=True)
+                assert open(fname, 'rb').read() == b'content of foo1.txt'
+
+
+def test_get_verify(sftpserver):
+    '''test downloads are checked against a checksum taken by the server'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            # check-file on the virtual sftpserver needs 256 bytes or more
+            sftp.putfo(BytesIO(b'*' * 8192), 'verified.txt')
+            digest = md5(b'*' * 8192).hexdigest()
+            with tempfile_containing() as localfile:
+                attributes = sftp.get('verified.txt', localfile,
+                                      verify='md5')
+                assert attributes.checksum == digest
+
+                # a stale partial download is caught by the resumed digest
+                Path(localfile).write_bytes(b'#' * 4096)
+                with pytest.raises(IOError, match='checksum mismatch'):
+                    sftp.get('verified.txt', localfile, resume=True,
+                             verify='md5')
+                # emptied, so the next resume transfers it whole
+                assert Path(localfile).stat().st_size == 0
+                attributes = sftp.get('verified.txt', localfile,
+                                      resume=True, verify='md5')
+                assert attributes.checksum == digest
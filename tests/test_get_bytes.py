@@ -0,0 +1,42 @@
+'''test sftpretty.get_bytes and sftpretty.get_into'''
+
+import pytest
+
+from array import array
+from common import conn, VFS
+from copy import deepcopy
+from io import BytesIO
+from sftpretty import Connection
+from unittest.mock import call, Mock
+
+
+def test_get_bytes(sftpserver):
+    '''test get_bytes returning the remote file'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            cback = Mock(return_value=None)
+            data = sftp.get_bytes('pub/foo1/foo1.txt', callback=cback)
+            assert data == b'content of foo1.txt'
+            assert isinstance(data, bytearray)
+            assert cback.call_args_list == [call(19, 19)]
+
+
+def test_get_into(sftpserver):
+    '''test get_into filling a buffer in place'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            # check-file on the virtual sftpserver needs 256 bytes or more
+            sftp.putfo(BytesIO(b'*' * 8192), 'verified.txt')
+
+            buffer = array('I', [0] * 4096)
+            cback = Mock(return_value=None)
+            assert sftp.get_into('verified.txt', buffer, callback=cback,
+                                 verify='md5') == 8192
+            assert cback.call_args_list[-1] == call(8192, 8192)
+            assert buffer.tobytes()[:8192] == b'*' * 8192
+            assert buffer.tobytes()[8192:] == bytes(8192)
+            assert sftp.get_bytes('verified.txt', verify='md5') == \
+                b'*' * 8192
+
+            with pytest.raises(ValueError):
+                sftp.get_into('verified.txt', bytearray(100))
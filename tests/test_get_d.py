@@ -1,6 +1,7 @@
 '''test sftpretty.get_d'''
 
 from common import conn, rmdir, VFS
+from hashlib import sha1
 from pathlib import Path
 from sftpretty import Connection
 from tempfile import mkdtemp
@@ -40,3 +41,23 @@ def test_get_d_pathed(sftpserver):
 
             # cleanup local
             rmdir(localpath)
+
+
+def test_get_d_verify(sftpserver, monkeypatch):
+    '''test get_d returns the verified digest of each file'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            # the virtual sftpserver can't checksum its own text files
+            monkeypatch.setattr(Connection, '_verify',
+                                lambda self, channel, remotepath, algorithm,
+                                digest, direction: digest)
+            localpath = Path(mkdtemp()).as_posix()
+            assert sftp.get_d('pub/foo1', localpath) is None
+            assert sftp.get_d('pub/foo1', localpath, verify='sha1') == {
+                'pub/foo1/foo1.txt': sha1(
+                    Path(localpath, 'foo1.txt').read_bytes()).hexdigest(),
+                'pub/foo1/image01.jpg': sha1(
+                    Path(localpath, 'image01.jpg').read_bytes()).hexdigest()}
+
+            # cleanup local
+            rmdir(localpath)
@@ -0,0 +1,80 @@
+'''test sftpretty.get_fanin'''
+
+from common import conn, rmdir, VFS
+from pathlib import Path
+from sftpretty import Connection, get_fanin
+from tempfile import mkdtemp
+
+
+def test_get_fanin(sftpserver):
+    '''test get_fanin into a subdirectory per host'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            report = get_fanin([sftp, conn(sftpserver)], 'pub', localpath)
+
+            assert len(report) == 2
+            for label, status in report.items():
+                assert status['status'] == 'COMPLETE'
+                assert status['error'] is None
+                hostdir = Path(status['localdir'])
+                assert hostdir.parent.as_posix() == localpath
+                files = sorted(path.relative_to(hostdir).as_posix()
+                               for path in hostdir.rglob('*')
+                               if path.is_file())
+                assert files == ['foo1/foo1.txt', 'foo1/image01.jpg',
+                                 'foo2/bar1/bar1.txt', 'foo2/foo2.txt',
+                                 'make.txt']
+                assert sorted(status['files']) == sorted(
+                    hostdir.joinpath(name).as_posix() for name in files)
+
+            rmdir(localpath)
+
+
+def test_get_fanin_pattern(sftpserver):
+    '''test get_fanin only collects matching filenames'''
+    with sftpserver.serve_content(VFS):
+        localpath = Path(mkdtemp()).as_posix()
+        report = get_fanin([conn(sftpserver)], 'pub', localpath,
+                           pattern='foo', handshakes=1, workers=2)
+
+        (status, ) = report.values()
+        assert sorted(Path(local).name for local in status['files']) == [
+            'foo1.txt', 'foo2.txt']
+
+        rmdir(localpath)
+
+
+def test_get_fanin_failed_host(sftpserver):
+    '''test get_fanin reports a host that could not connect'''
+    with sftpserver.serve_content(VFS):
+        localpath = Path(mkdtemp()).as_posix()
+        bad = dict(conn(sftpserver), host='host.invalid')
+        report = get_fanin([bad, conn(sftpserver)], 'pub/foo1', localpath)
+
+        failed = report[f'host.invalid:{sftpserver.port}']
+        assert failed['status'] == 'FAILED'
+        assert failed['error'] is not None
+        assert failed['files'] == []
+        assert report[f'{sftpserver.host}:{sftpserver.port}'][
+            'status'] == 'COMPLETE'
+
+        rmdir(localpath)
+
+
+def test_get_fanin_resume_bytes(sftpserver):
+    '''test get_fanin reports the bytes actually received'''
+    with sftpserver.serve_content(VFS):
+        localpath = Path(mkdtemp()).as_posix()
+        first = get_fanin([conn(sftpserver)], 'pub/foo1', localpath)
+        (status, ) = first.values()
+        assert status['bytes'] == sum(Path(local).stat().st_size
+                                      for local in status['files'])
+
+        again = get_fanin([conn(sftpserver)], 'pub/foo1', localpath,
+                          resume=True)
+        (status, ) = again.values()
+        assert status['status'] == 'COMPLETE'
+        assert status['bytes'] == 0
+
+        rmdir(localpath)
@@ -70,10 +70,10 @@ def test_get_r_pathed(sftpserver):
             localtree(local_tree, localpath, remote_cwd)
             sftp.remotetree(remote_tree, remote_cwd, localpath)
 
-            actual = hash(remote_cwd + '/bar1.txt')
-            expected = ('a69f73cca23a9ac5c8b567dc185a756e97c982164fe258'
-                        '59e0d1dcc1475c80a615b2123af1f5f94c11e3e9402c3a'
-                        'c558f500199d95b6d3e301758586281dcd26')
+            actual = hash(Path(localpath).joinpath('bar1.txt').as_posix())
+            expected = ('126f175986225cdaa8c6eccd1ed9296b487cc799a982ff'
+                        'db33818806228c9efb8d4ca14c37641097eb367bdd2f4c'
+                        'a7916d63893af38da137251520fff41f3cba')
 
             assert local_tree.keys() == remote_tree.keys()
             assert actual == expected
@@ -104,3 +104,34 @@ def test_get_r_cdd(sftpserver):
             assert localdirs == remotedirs
 
             rmdir(localpath)
+
+
+def test_get_r_find_fallback(sftpserver):
+    '''test the get_r find backend on an sftp only server'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            sftp.get_r('pub', localpath, backend='find')
+
+            files = sorted(path.relative_to(localpath).as_posix()
+                           for path in Path(localpath).rglob('*')
+                           if path.is_file())
+            assert files == ['foo1/foo1.txt', 'foo1/image01.jpg',
+                             'foo2/bar1/bar1.txt', 'foo2/foo2.txt',
+                             'make.txt']
+
+            rmdir(localpath)
+
+
+def test_get_r_no_files(sftpserver, caplog):
+    '''test get_r finds nothing to copy in a tree of empty directories'''
+    with sftpserver.serve_content({'home': {'test': {'empty': {'sub': {}}}}}):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            with caplog.at_level('INFO', logger='sftpretty'):
+                sftp.get_r('empty', localpath)
+
+            assert 'No files found in directory [empty]' in caplog.text
+            assert Path(localpath).joinpath('sub').is_dir()
+
+            rmdir(localpath)
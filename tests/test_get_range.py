@@ -0,0 +1,101 @@
+'''test sftpretty.get_range and sftpretty.getfo_range'''
+
+import pytest
+
+from common import conn
+from io import BytesIO
+from paramiko import SFTPClient
+from paramiko.sftp import CMD_DATA, CMD_READ
+from pathlib import Path
+from sftpretty import Connection
+from tempfile import mkdtemp
+
+
+CONTENT = ''.join(f'{line:05}\n' for line in range(20000))
+
+
+def test_get_range(sftpserver):
+    '''test ranges written to a local file at their offsets'''
+    with sftpserver.serve_content({'home': {'test': {'big.txt': CONTENT}}}):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).joinpath('big.txt')
+            received = sftp.get_range('big.txt', [(119994, 10), (0, 6)],
+                                      localpath.as_posix())
+            assert received == [6, 6]
+            assert localpath.stat().st_size == 120000
+            assert localpath.read_bytes()[:6] == b'00000\n'
+            assert localpath.read_bytes()[-6:] == b'19999\n'
+
+            sftp.get_range('big.txt', [(60000, 6)], localpath.as_posix())
+            assert localpath.read_bytes()[:6] == b'00000\n'
+            assert localpath.read_bytes()[60000:60006] == b'10000\n'
+
+            localpath.unlink()
+            with pytest.raises(ValueError):
+                sftp.get_range('big.txt', [(-6, 6)], localpath.as_posix())
+            assert not localpath.exists()
+            localpath.parent.rmdir()
+
+
+def test_getfo_range(sftpserver, monkeypatch):
+    '''test nearby ranges read as one and copied into a buffer'''
+    reads = []
+    request = SFTPClient._async_request
+
+    def _async_request(self, fileobj, kind, *arguments):
+        if kind == CMD_READ:
+            reads.append(arguments[1:])
+        return request(self, fileobj, kind, *arguments)
+
+    monkeypatch.setattr(SFTPClient, '_async_request', _async_request)
+    with sftpserver.serve_content({'home': {'test': {'big.txt': CONTENT}}}):
+        with Connection(**conn(sftpserver)) as sftp:
+            buffer = bytearray(120000)
+            ranges = [(600, 60), (0, 12), (30, 6), (100000, 6), (0, 6)]
+            received = sftp.getfo_range('big.txt', ranges, buffer, gap=1024)
+            assert received == [60, 12, 6, 6, 6]
+            assert reads == [(0, 660), (100000, 6)]
+            for offset, length in ranges:
+                assert buffer[offset:offset + length] == \
+                    CONTENT[offset:offset + length].encode()
+
+            reads.clear()
+            flo = BytesIO()
+            received = sftp.getfo_range('big.txt', [(0, 80000),
+                                                    (119998, 50)], flo,
+                                        gap=1024)
+            assert received == [80000, 2]
+            # The short read at the end of the file asks once more for EOF.
+            assert [length for _, length in reads] == [32768, 32768, 14464,
+                                                       50, 48]
+            assert flo.getvalue()[:80000] == CONTENT[:80000].encode()
+            assert flo.getvalue()[119998:] == b'9\n'
+
+
+def test_read_ranges_abandoned(sftpserver, monkeypatch):
+    '''test reads still in flight are collected once the reader stops'''
+    counts = {CMD_DATA: 0, CMD_READ: 0}
+    packet, request = SFTPClient._read_packet, SFTPClient._async_request
+
+    def _async_request(self, fileobj, kind, *arguments):
+        counts[kind] = counts.get(kind, 0) + 1
+        return request(self, fileobj, kind, *arguments)
+
+    def _read_packet(self):
+        kind, data = packet(self)
+        counts[kind] = counts.get(kind, 0) + 1
+        return kind, data
+
+    monkeypatch.setattr(SFTPClient, '_async_request', _async_request)
+    monkeypatch.setattr(SFTPClient, '_read_packet', _read_packet)
+    with sftpserver.serve_content({'home': {'test': {'big.txt': CONTENT}}}):
+        with Connection(**conn(sftpserver)) as sftp:
+            with sftp._sftp_channel() as channel:
+                with channel.open('big.txt', 'rb') as remote:
+                    pieces = sftp._read_ranges(channel, remote,
+                                               [(0, 120000)], window=3)
+                    next(pieces)
+                    assert counts[CMD_READ] == 3
+                    assert counts[CMD_DATA] == 1
+                    pieces.close()
+                    assert counts[CMD_DATA] == 3
@@ -1,6 +1,7 @@
 '''test sftpretty.getfo'''
 
 from common import conn, VFS
+from copy import deepcopy
 from io import BytesIO
 from sftpretty import Connection
 from unittest.mock import Mock
@@ -28,3 +29,14 @@ def test_getfo_callback(sftpserver):
             sftp.getfo('make.txt', flo, callback=cback)
 
             assert cback.call_count
+
+
+def test_getfo_verify(sftpserver):
+    '''test getfo checks what it wrote against the server's checksum'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            sftp.putfo(BytesIO(b'*' * 8192), 'verified.txt')
+            flo = BytesIO()
+
+            assert sftp.getfo('verified.txt', flo, verify='sha1') == 8192
+            assert flo.getvalue() == b'*' * 8192
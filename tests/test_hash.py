@@ -0,0 +1,86 @@
+'''test sftpretty.hash and sftpretty.hashes'''
+
+import pytest
+
+from array import array
+from blddirs import build_dir_struct, FILE_LIST
+from common import rmdir, STARS8192
+from hashlib import md5, sha256, sha3_512
+from io import BytesIO
+from pathlib import Path
+from sftpretty import hash, hashes
+from tempfile import mkdtemp
+
+
+CONTENT = STARS8192.encode('utf-8')
+
+
+@pytest.mark.parametrize('blocksize', [1000, 1048576])
+def test_hash_path(blocksize):
+    '''test files are hashed whole, read or memory mapped'''
+    localpath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    filename = localpath.joinpath(*FILE_LIST[0])
+
+    assert hash(filename.as_posix(), blocksize=blocksize) == \
+        sha3_512(CONTENT).hexdigest()
+    assert hash(filename, blocksize=blocksize) == \
+        sha3_512(CONTENT).hexdigest()
+
+    rmdir(localpath.as_posix())
+
+
+@pytest.mark.parametrize('source', [
+    CONTENT, bytearray(CONTENT), memoryview(CONTENT), array('B', CONTENT)])
+def test_hash_buffer(source):
+    '''test buffers are hashed in place'''
+    assert hash(source, algorithm=sha256(), blocksize=1000) == \
+        sha256(CONTENT).hexdigest()
+
+
+def test_hash_file_object():
+    '''test file objects are hashed from their position to the end'''
+    flo = BytesIO(CONTENT)
+    flo.seek(192)
+
+    assert hash(flo, blocksize=1000) == sha3_512(CONTENT[192:]).hexdigest()
+    assert flo.read() == b''
+
+    localpath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    with open(localpath.joinpath(*FILE_LIST[0]), 'rb') as filestream:
+        assert hash(filestream, algorithm='md5') == md5(CONTENT).hexdigest()
+
+    rmdir(localpath.as_posix())
+
+
+def test_hash_string():
+    '''test a string that isn't a path is hashed itself'''
+    assert hash('not/a/path.txt') == \
+        sha3_512(b'not/a/path.txt').hexdigest()
+
+
+def test_hash_algorithms():
+    '''test several digests are computed in one pass'''
+    assert hash(BytesIO(CONTENT), algorithm=('md5', sha256()),
+                blocksize=1000) == (md5(CONTENT).hexdigest(),
+                                    sha256(CONTENT).hexdigest())
+
+
+def test_hashes():
+    '''test many files are hashed across a process pool'''
+    localpath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    filenames = [localpath.joinpath(*parts).as_posix()
+                 for parts in FILE_LIST]
+
+    assert hashes(filenames, algorithm=sha256(), workers=2) == {
+        filename: sha256(CONTENT).hexdigest() for filename in filenames}
+    assert hashes(filenames[:1], algorithm=['md5', 'sha256']) == {
+        filenames[0]: (md5(CONTENT).hexdigest(),
+                       sha256(CONTENT).hexdigest())}
+
+    with pytest.raises(FileNotFoundError):
+        hashes([localpath.joinpath('missing.txt').as_posix()])
+
+    rmdir(localpath.as_posix())
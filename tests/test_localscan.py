@@ -0,0 +1,53 @@
+'''test sftpretty.localscan'''
+
+import pytest
+
+from blddirs import build_dir_struct, DIR_LIST, FILE_LIST
+from common import rmdir, STARS8192
+from pathlib import Path
+from sftpretty import localscan
+from stat import S_ISDIR, S_ISREG
+from tempfile import mkdtemp
+
+
+@pytest.mark.parametrize('workers', [None, 4])
+def test_localscan(workers):
+    '''test localscan collects every file and directory with metadata'''
+    localpath = Path(mkdtemp()).as_posix()
+    build_dir_struct(localpath)
+
+    entries = {Path(path).relative_to(localpath).parts: entry
+               for path, *entry in localscan(localpath, workers=workers)}
+
+    assert sorted(entries) == sorted(DIR_LIST + FILE_LIST)
+    for parts in FILE_LIST:
+        size, mtime, mode, inode, device, nlink = entries[parts]
+        local = Path(localpath).joinpath(*parts).stat()
+        assert S_ISREG(mode)
+        assert size == len(STARS8192)
+        assert mtime == local.st_mtime
+        assert inode == local.st_ino
+        assert nlink == 1
+    for parts in DIR_LIST:
+        assert S_ISDIR(entries[parts][2])
+
+    rmdir(localpath)
+
+
+def test_localscan_no_recurse():
+    '''test localscan without recursing'''
+    localpath = Path(mkdtemp()).as_posix()
+    build_dir_struct(localpath)
+
+    names = sorted(Path(path).name
+                   for path, *entry in localscan(localpath, recurse=False))
+
+    assert names == ['pub', 'read.me']
+
+    rmdir(localpath)
+
+
+def test_localscan_bad_local():
+    '''test localscan failure on non-existing local directory'''
+    with pytest.raises(OSError):
+        localscan('/non-existing')
@@ -0,0 +1,69 @@
+'''test sftpretty.Manifest'''
+
+from blddirs import build_dir_struct
+from common import conn, rmdir, VFS
+from pathlib import Path
+from sftpretty import Connection, localscan, localtree, Manifest
+from stat import S_IFDIR, S_IFREG, S_ISREG
+from tempfile import mkdtemp
+
+
+def test_manifest_entries():
+    '''test Manifest round trips entries through its columns'''
+    entries = [('/srv/data/a.txt', 10, 1.5, S_IFREG | 0o644, 7, 1, 2),
+               ('/srv/data/b', 4096, 2.0, S_IFDIR | 0o755, 8, 1, 2),
+               ('/srv/data/b/ü.txt', 0, 3.0, S_IFREG | 0o600, 9, 1, 1),
+               ('relative', 1, 0.0, S_IFREG, 0, 0, 1),
+               ('/root-level', 2, 0.0, S_IFREG, 0, 0, 1)]
+    manifest = Manifest()
+    manifest.extend(entries)
+
+    assert manifest.count == len(entries)
+    assert len(manifest) == 0
+    assert list(manifest.entries()) == entries
+    assert manifest.entry(2) == entries[2]
+    assert manifest.directories == ['/srv/data/', '/srv/data/b/', '', '/']
+    assert [manifest.path(index)
+            for index in manifest.order('sizes', reverse=True)] == [
+        '/srv/data/b', '/srv/data/a.txt', '/root-level', 'relative',
+        '/srv/data/b/ü.txt']
+
+
+def test_manifest_localscan():
+    '''test localscan fills a Manifest usable as a localtree container'''
+    localpath = Path(mkdtemp()).as_posix()
+    build_dir_struct(localpath)
+
+    manifest = localscan(localpath, manifest=Manifest())
+    localtree(manifest, localpath, '/remote')
+
+    assert sorted(manifest.entries()) == sorted(localscan(localpath))
+    assert sorted(manifest.keys()) == [localpath, f'{localpath}/pub',
+                                       f'{localpath}/pub/foo2']
+
+    rmdir(localpath)
+
+
+def test_manifest_remotetree(sftpserver):
+    '''test remotetree records every entry into a Manifest container'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            cwd = sftp.pwd
+            localpath = Path(mkdtemp()).as_posix()
+            expected = {}
+            manifest = Manifest()
+
+            sftp.remotetree(expected, cwd, localpath)
+            sftp.remotetree(manifest, cwd, localpath)
+
+            assert dict(manifest) == expected
+            files = sorted(path for path, size, mtime, mode, *_
+                           in manifest.entries() if S_ISREG(mode))
+            assert files == ['/home/test/pub/foo1/foo1.txt',
+                             '/home/test/pub/foo1/image01.jpg',
+                             '/home/test/pub/foo2/bar1/bar1.txt',
+                             '/home/test/pub/foo2/foo2.txt',
+                             '/home/test/pub/make.txt',
+                             '/home/test/read.me']
+            assert manifest.sizes[manifest.order('sizes')[-1]] == len(
+                'data for image01.jpg')
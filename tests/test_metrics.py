@@ -0,0 +1,122 @@
+'''test sftpretty.Metrics and its adapters'''
+
+import pytest
+
+from common import conn, rmdir, VFS
+from pathlib import Path
+from sftpretty import (Connection, Metrics, OpenTelemetryMetrics,
+                       PrometheusMetrics)
+from tempfile import mkdtemp
+
+
+class Recorder(Metrics):
+    def __init__(self):
+        self.records = []
+
+    def count(self, name, value=1, **labels):
+        self.records.append(('count', name, value, labels))
+
+    def gauge(self, name, value, **labels):
+        self.records.append(('gauge', name, value, labels))
+
+    def observe(self, name, value, **labels):
+        self.records.append(('observe', name, value, labels))
+
+    def named(self, name):
+        return [record[2:] for record in self.records if record[1] == name]
+
+
+def test_metrics(sftpserver):
+    '''test connections report handshakes, channels, operations and bytes'''
+    with sftpserver.serve_content(VFS):
+        metrics = Recorder()
+        with Connection(**conn(sftpserver), metrics=metrics) as sftp:
+            assert len(metrics.named('handshake_seconds')) == 1
+
+            sftp.stat('pub/make.txt')
+            assert metrics.named('channel_open_seconds')
+            (seconds, labels), = metrics.named('op_latency_seconds')
+            assert seconds >= 0 and labels == {'op': 'stat'}
+
+            sftp.get_bytes('pub/make.txt', callback=lambda *_: None)
+            assert metrics.named('bytes_transferred_total') == [
+                (19, {'direction': 'get'})]
+
+            with pytest.raises(IOError):
+                sftp.stat('pub/missing.txt')
+            assert metrics.named('op_errors_total') == [(1, {'op': 'stat'})]
+
+            with pytest.raises(IOError):
+                sftp.get('pub/missing.txt', Path(mkdtemp()).as_posix(),
+                         exceptions=IOError, tries=3, delay=0, silent=True)
+            assert metrics.named('retries_total') == [(1, {'op': 'get'})] * 2
+
+            localpath = Path(mkdtemp()).as_posix()
+            sftp.get_d('pub/foo1', localpath)
+            workers = [value for value, _ in metrics.named('active_workers')]
+            assert workers.count(1) == workers.count(-1) == 2
+            rmdir(localpath)
+
+
+def test_metrics_default(sftpserver):
+    '''test connections drop measurements without a sink'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            assert type(sftp._metrics) is Metrics
+            assert sftp.exists('pub/make.txt')
+
+
+def test_metrics_prometheus():
+    '''test measurements land in a prometheus registry'''
+    prometheus_client = pytest.importorskip('prometheus_client')
+    registry = prometheus_client.CollectorRegistry()
+    metrics = PrometheusMetrics(registry=registry)
+    metrics.count('bytes_transferred_total', 19, direction='get')
+    metrics.count('bytes_transferred_total', 23, direction='get')
+    metrics.gauge('active_workers', 1)
+    metrics.observe('op_latency_seconds', 0.5, op='stat')
+    assert registry.get_sample_value('sftpretty_bytes_transferred_total',
+                                     {'direction': 'get'}) == 42
+    assert registry.get_sample_value('sftpretty_active_workers') == 1
+    assert registry.get_sample_value('sftpretty_op_latency_seconds_sum',
+                                     {'op': 'stat'}) == 0.5
+
+    # instances on one registry share its collectors
+    PrometheusMetrics(registry=registry).count('bytes_transferred_total', 8,
+                                               direction='get')
+    assert registry.get_sample_value('sftpretty_bytes_transferred_total',
+                                     {'direction': 'get'}) == 50
+    for _ in range(2):
+        PrometheusMetrics(namespace='shared').count('retries_total',
+                                                    op='get')
+    assert prometheus_client.REGISTRY.get_sample_value(
+        'shared_retries_total', {'op': 'get'}) == 2
+
+
+def test_metrics_opentelemetry():
+    '''test measurements land in opentelemetry instruments'''
+    pytest.importorskip('opentelemetry.sdk.metrics')
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter('sftpretty')
+    metrics = OpenTelemetryMetrics(meter)
+    metrics.count('bytes_transferred_total', 19, direction='get')
+    metrics.observe('op_latency_seconds', 0.5, op='stat')
+    names = [metric.name
+             for resource in reader.get_metrics_data().resource_metrics
+             for scope in resource.scope_metrics
+             for metric in scope.metrics]
+    assert sorted(names) == ['bytes_transferred_total',
+                             'op_latency_seconds']
+
+
+def test_metrics_unavailable(monkeypatch):
+    '''test adapters refuse to start without their library'''
+    monkeypatch.setattr('sftpretty.helpers.opentelemetry', None)
+    monkeypatch.setattr('sftpretty.helpers.prometheus_client', None)
+    with pytest.raises(ImportError):
+        OpenTelemetryMetrics()
+    with pytest.raises(ImportError):
+        PrometheusMetrics()
@@ -1,7 +1,14 @@
 '''test sftpretty.open'''
 
-from common import VFS, conn
+import pytest
+
+from common import VFS, conn, rmdir
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from io import SEEK_END
+from pathlib import Path
 from sftpretty import Connection
+from tempfile import mkdtemp
 
 
 def test_open_read(sftpserver):
@@ -23,3 +30,142 @@ def test_open_read_with(sftpserver):
             with psftp.open('make.txt') as rfile:
                 contents = rfile.read()
             assert contents == b'content of make.txt'
+
+
+def test_open_blocks(sftpserver):
+    '''test open reading through a block cache'''
+    content = ''.join(f'{line:05}\n' for line in range(2000))
+    with sftpserver.serve_content({'home': {'test': {'big.txt': content}}}):
+        with Connection(**conn(sftpserver)) as psftp:
+            with psftp.open('big.txt', bufsize=1024, blocks=4) as rfile:
+                fetched = []
+                fetch = rfile._fetch
+                rfile._fetch = lambda blocks: fetched.append(
+                    list(blocks)) or fetch(blocks)
+
+                rfile.seek(-6, SEEK_END)
+                assert rfile.read() == b'01999\n'
+                rfile.seek(6000)
+                buffer = bytearray(12)
+                assert rfile.readinto(buffer) == 12
+                assert buffer == b'01000\n01001\n'
+                rfile.seek(6012)
+                assert rfile.read(6) == b'01002\n'
+                assert fetched == [[11], [5]]
+
+                rfile.seek(0)
+                assert rfile.read() == content.encode()
+                assert rfile.tell() == len(content)
+                assert rfile.read(1) == b''
+                blocks = [block for batch in fetched[2:] for block in batch]
+                assert len(blocks) == len(set(blocks))
+                assert set(blocks) | {5} == set(range(12))
+                assert len(fetched[2:]) < len(blocks)
+                assert len(rfile._cache) <= 4 + rfile.readahead
+
+            with psftp.open('big.txt', bufsize=1024, blocks=16) as rfile:
+                fetched = []
+                fetch = rfile._fetch
+                rfile._fetch = lambda blocks: fetched.append(
+                    list(blocks)) or fetch(blocks)
+
+                def job(offset):
+                    buffer = bytearray(3000)
+                    rfile._read_at(offset, memoryview(buffer))
+                    return bytes(buffer)
+
+                offsets = [0, 3000, 6000, 9000] * 4
+                with ThreadPoolExecutor(8) as pool:
+                    for offset, data in zip(offsets, pool.map(job, offsets)):
+                        assert data == content[offset:offset + 3000].encode()
+                blocks = [block for batch in fetched for block in batch]
+                assert sorted(blocks) == list(range(12))
+
+            assert rfile.closed
+
+
+def test_open_blocks_shrunk(sftpserver):
+    '''test readinto counts the bytes a shrunken file really had'''
+    content = ''.join(f'{line:05}\n' for line in range(2000))
+    with sftpserver.serve_content({'home': {'test': {'big.txt': content}}}):
+        with Connection(**conn(sftpserver)) as psftp:
+            with psftp.open('big.txt', bufsize=1024, blocks=4) as rfile:
+                # as if the file was truncated once opened
+                rfile.size += 3000
+                rfile.seek(len(content) - 1200)
+                buffer = bytearray(2400)
+                assert rfile.readinto(buffer) == 1200
+                assert buffer[:1200] == content[-1200:].encode()
+                assert rfile.tell() == len(content)
+
+
+def test_open_blocks_write(sftpserver):
+    '''test open refuses a block cache for writing'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as psftp:
+            with pytest.raises(ValueError):
+                psftp.open('pub/make.txt', mode='w', blocks=4)
+
+
+def test_open_window(sftpserver):
+    '''test open gathering small writes into one request'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as psftp:
+            records = [f'{line:05}\n'.encode() for line in range(2000)]
+            with psftp.open('pub/records.txt', bufsize=16384, mode='w',
+                            window=4) as wfile:
+                sent = []
+                send = wfile._send
+                wfile._send = lambda size: sent.append(size) or send(size)
+                for record in records:
+                    assert wfile.write(record) == 6
+                assert wfile.tell() == 12000
+                assert sent == []
+            assert wfile.closed
+            assert sent == [12000]
+
+            with psftp.open('pub/records.txt') as rfile:
+                assert rfile.read() == b''.join(records)
+
+
+def test_open_window_pipelined(lsftp):
+    '''test open writing aligned blocks with requests in flight'''
+    remotepath = Path(mkdtemp()).joinpath('records.txt')
+    records = [f'{line:05}\n'.encode() for line in range(2000)]
+    with lsftp.open(remotepath.as_posix(), mode='w') as wfile:
+        wfile.write(b'header\n')
+    with lsftp.open(remotepath.as_posix(), bufsize=1024, mode='a',
+                    window=4) as wfile:
+        sent = []
+        send = wfile._send
+        wfile._send = lambda size: sent.append(size) or send(size)
+        for record in records:
+            wfile.write(record)
+            assert len(wfile._pending) <= 4
+    assert sent == [1017] + [1024] * 10 + [743]
+    assert remotepath.read_bytes() == b'header\n' + b''.join(records)
+
+    rmdir(remotepath.parent.as_posix())
+
+
+def test_open_window_errors(sftpserver):
+    '''test open raising failed writes on flush and close'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as psftp:
+            wfile = psftp.open('pub/records.txt', mode='wb', window=4)
+            wfile.write(b'x' * 40000)
+            wfile.remote.close()
+            wfile.write(b'x' * 40000)
+            with pytest.raises(IOError):
+                wfile.flush()
+            wfile.close()
+
+            with pytest.raises(IOError):
+                with psftp.open('pub/synced.txt', mode='w', window=4,
+                                fsync=True) as wfile:
+                    wfile.write(b'unsupported')
+            assert wfile.closed
+            assert psftp.open('pub/synced.txt').read() == b'unsupported'
+
+            with pytest.raises(ValueError):
+                psftp.open('pub/make.txt', mode='r+', window=4)
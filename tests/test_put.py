@@ -3,7 +3,11 @@
 import pytest
 
 from common import conn, tempfile_containing, VFS
+from copy import deepcopy
+from hashlib import sha1
 from pathlib import Path
+from paramiko import SFTPClient
+from paramiko.sftp import CMD_EXTENDED
 from sftpretty import Connection
 from time import sleep
 from unittest.mock import Mock
@@ -103,3 +107,119 @@ def test_put_resume(lsftp):
         result = lsftp.put(fname, preserve_mtime=True, resume=True)
     assert base.st_size == result.st_size
     assert partial.st_mtime == result.st_mtime
+
+
+def test_put_atomic(sftpserver):
+    '''test an atomic upload replaces the file leaving no temporary behind'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with tempfile_containing(contents='replaced') as fname:
+                sftp.put(fname, '/home/test/pub/make.txt', atomic=True)
+                sftp.put(fname, '/home/test/pub/new.txt', atomic=True)
+
+            assert sftp.listdir('/home/test/pub') == [
+                'foo1', 'foo2', 'make.txt', 'new.txt']
+
+
+def test_put_atomic_paths(sftpserver, monkeypatch):
+    '''test the rename is sent paths resolved against the remote pwd'''
+    extended = []
+    request = SFTPClient._async_request
+
+    def _async_request(self, fileobj, kind, *arguments):
+        if kind == CMD_EXTENDED:
+            extended.append(arguments)
+        return request(self, fileobj, kind, *arguments)
+
+    monkeypatch.setattr(SFTPClient, '_async_request', _async_request)
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with tempfile_containing(contents='relative') as fname:
+                sftp.put(fname, 'pub/new.txt', atomic=True)
+
+            assert sftp.listdir('pub') == ['foo1', 'foo2', 'make.txt',
+                                           'new.txt']
+
+    (name, partial, newpath), = extended
+    assert name == 'posix-rename@openssh.com'
+    assert partial.startswith(b'/home/test/pub/.new.txt.')
+    assert partial.endswith(b'.part')
+    assert newpath == b'/home/test/pub/new.txt'
+
+
+def test_put_atomic_resume_first(sftpserver):
+    '''test resuming an atomic upload no partial was left for yet'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with tempfile_containing() as fname:
+                attributes = sftp.put(fname, 'pub/new.bin', atomic=True,
+                                      resume=True)
+
+            assert attributes.st_size == 8192
+            assert sftp.stat('pub/new.bin').st_size == 8192
+            assert not [name for name in sftp.listdir('pub')
+                        if name.endswith('.part')]
+
+
+def test_put_atomic_failure(sftpserver):
+    '''test a failed atomic upload removes its temporary file'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with tempfile_containing() as fname:
+                # the virtual sftpserver has no sha256 checksum to verify by
+                with pytest.raises(IOError, match='no remote sha256'):
+                    sftp.put(fname, 'pub/new.txt', atomic=True,
+                             verify='sha256')
+
+            assert sftp.listdir('pub') == ['foo1', 'foo2', 'make.txt']
+
+
+def test_put_atomic_posix_rename(lsftp):
+    '''test an atomic upload over an existing file with posix-rename'''
+    with tempfile_containing(contents='first') as fname:
+        base_fname = Path(fname).name
+        lsftp.put(fname)
+        Path(fname).write_text('second')
+        lsftp.put(fname, atomic=True)
+        assert not [name for name in lsftp.listdir()
+                    if name.endswith('.part')]
+        with tempfile_containing(contents='') as tfile:
+            lsftp.get(base_fname, tfile)
+            assert open(tfile).read() == 'second'
+        lsftp.remove(base_fname)
+
+
+def test_put_handle_round_trips(sftpserver, monkeypatch):
+    '''test confirm and preserve_mtime happen on the handle, not by path'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            stat = SFTPClient.stat
+
+            def _stat(channel, path):
+                assert not path.endswith('handle.txt'), 'stat by path'
+                return stat(channel, path)
+
+            monkeypatch.setattr(SFTPClient, 'stat', _stat)
+            monkeypatch.setattr(SFTPClient, 'utime', Mock(
+                side_effect=AssertionError('utime by path')))
+            with tempfile_containing(contents='on the handle') as fname:
+                attributes = sftp.put(fname, '/home/test/pub/handle.txt',
+                                      preserve_mtime=True)
+
+            assert attributes.st_size == len('on the handle')
+            assert attributes.st_mtime is not None
+
+
+def test_put_verify(sftpserver):
+    '''test uploads are checked against a checksum taken by the server'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with tempfile_containing() as localfile:
+                digest = sha1(Path(localfile).read_bytes()).hexdigest()
+                # the virtual sftpserver only has check-file for sha1 and md5
+                attributes = sftp.put(localfile, 'verified.txt',
+                                      verify='sha1')
+                assert attributes.checksum == digest
+
+                with pytest.raises(IOError, match='no remote sha256'):
+                    sftp.put(localfile, 'verified.txt', verify='sha256')
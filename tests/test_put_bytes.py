@@ -0,0 +1,32 @@
+'''test sftpretty.put_bytes'''
+
+import pytest
+
+from common import conn, VFS
+from copy import deepcopy
+from hashlib import sha1
+from sftpretty import Connection
+from unittest.mock import call, Mock
+
+
+def test_put_bytes(sftpserver):
+    '''test put_bytes sending a slice of a buffer'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            data = bytearray(b'-' * 1024 + b'*' * 8192 + b'-' * 1024)
+            cback = Mock(return_value=None)
+            attributes = sftp.put_bytes(memoryview(data)[1024:-1024],
+                                        'pub/stars.txt', callback=cback,
+                                        verify='sha1')
+            assert attributes.st_size == 8192
+            assert attributes.checksum == sha1(b'*' * 8192).hexdigest()
+            assert cback.call_args_list == [call(8192, 8192)]
+            with sftp.open('pub/stars.txt') as rfile:
+                assert rfile.read() == b'*' * 8192
+
+            sftp.put_bytes(b'replaced', 'pub/make.txt', atomic=True)
+            with sftp.open('pub/make.txt') as rfile:
+                assert rfile.read() == b'replaced'
+
+            with pytest.raises(TypeError):
+                sftp.put_bytes('text', 'pub/text.txt')
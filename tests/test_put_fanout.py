@@ -0,0 +1,69 @@
+'''test sftpretty.put_fanout'''
+
+import pytest
+
+from blddirs import build_dir_struct
+from common import conn, rmdir, STARS8192, tempfile_containing, VFS
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+from sftpretty import Connection, put_fanout
+from tempfile import mkdtemp
+from unittest.mock import Mock
+
+
+def test_put_fanout(sftpserver):
+    '''test put_fanout of a single file to several connections'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp1, \
+                Connection(**conn(sftpserver)) as sftp2:
+            cback = Mock(return_value=None)
+            with tempfile_containing() as fname:
+                report = put_fanout([sftp1, sftp2], fname, 'fanout.txt',
+                                    callback=cback)
+            assert report['bytes'] == len(STARS8192)
+            assert len(report['hosts']) == 2
+            for status in report['hosts'].values():
+                assert status['status'] == 'COMPLETE'
+                assert status['attributes']['fanout.txt'].st_size == 8192
+            assert cback.call_count
+            flo = BytesIO()
+            sftp1.getfo('fanout.txt', flo)
+            assert flo.getvalue() == STARS8192.encode('utf-8')
+
+
+def test_put_fanout_host_spec(sftpserver):
+    '''test put_fanout connecting from a dict of Connection arguments'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        localpath = Path(mkdtemp()).as_posix()
+        build_dir_struct(localpath)
+        report = put_fanout([conn(sftpserver)],
+                            Path(localpath).joinpath('pub').as_posix())
+        (status, ) = report['hosts'].values()
+        assert status['status'] == 'COMPLETE'
+        assert sorted(status['attributes']) == ['pub/foo1/foo1.txt',
+                                                'pub/foo2/bar1/bar1.txt',
+                                                'pub/foo2/foo2.txt',
+                                                'pub/make.txt']
+        assert status['bytes'] == 4 * len(STARS8192)
+
+        rmdir(localpath)
+
+
+def test_put_fanout_failed_host(sftpserver):
+    '''test put_fanout reports a failed host without stopping the rest'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        bad = dict(conn(sftpserver), host='host.invalid')
+        with tempfile_containing() as fname:
+            report = put_fanout([bad, conn(sftpserver)], fname, 'good.txt')
+        failed = report['hosts'][f'host.invalid:{sftpserver.port}']
+        assert failed['status'] == 'FAILED'
+        assert failed['error'] is not None
+        statuses = [status['status'] for status in report['hosts'].values()]
+        assert statuses.count('COMPLETE') == 1
+
+
+def test_put_fanout_bad_local(sftpserver):
+    '''test put_fanout failure on non-existing local path'''
+    with pytest.raises(OSError):
+        put_fanout([conn(sftpserver)], '/non-existing')
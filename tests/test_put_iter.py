@@ -0,0 +1,85 @@
+'''test sftpretty.put_iter'''
+
+import pytest
+
+from asyncio import new_event_loop
+from common import conn, VFS
+from copy import deepcopy
+from hashlib import sha1
+from sftpretty import Connection
+from unittest.mock import call, Mock
+
+
+def records(count):
+    for line in range(count):
+        yield f'{line:05}\n'.encode()
+
+
+async def arecords(count):
+    for record in records(count):
+        yield record
+
+
+def test_put_iter(sftpserver):
+    '''test put_iter sending a generator of unknown size'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            cback = Mock(return_value=None)
+            attributes = sftp.put_iter(records(5000), 'pub/records.txt',
+                                       callback=cback, verify='sha1')
+            content = b''.join(records(5000))
+            assert attributes.st_size == 30000
+            assert attributes.checksum == sha1(content).hexdigest()
+            assert cback.call_args_list == [call(30000, 30000)]
+            with sftp.open('pub/records.txt') as rfile:
+                assert rfile.read() == content
+
+            # a failed upload leaves nothing behind, atomic or not
+            with pytest.raises(TypeError):
+                sftp.put_iter([b'text', 'text'], 'pub/text.txt')
+            with pytest.raises(TypeError):
+                sftp.put_iter([b'text', 'text'], 'pub/text.txt',
+                              atomic=True)
+            assert not sftp.exists('pub/text.txt')
+            assert not [name for name in sftp.listdir('pub')
+                        if name.endswith('.part')]
+
+
+def test_put_iter_async(sftpserver):
+    '''test put_iter consuming async iterators'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            sftp.put_iter(arecords(100), 'pub/records.txt', atomic=True)
+            with sftp.open('pub/records.txt') as rfile:
+                assert rfile.read() == b''.join(records(100))
+
+            async def _upload(loop):
+                return await loop.run_in_executor(
+                    None, lambda: sftp.put_iter(arecords(50), 'pub/run.txt',
+                                                loop=loop))
+
+            loop = new_event_loop()
+            try:
+                assert loop.run_until_complete(_upload(loop)).st_size == 300
+            finally:
+                loop.close()
+
+
+def test_put_iter_async_closed(sftpserver):
+    '''test put_iter closes an async generator it didn't run out'''
+    closed = []
+
+    async def _failing():
+        try:
+            yield b'text'
+            yield 'text'
+            yield b'never'
+        finally:
+            closed.append(True)
+
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            with pytest.raises(TypeError):
+                sftp.put_iter(_failing(), 'pub/text.txt')
+            assert closed == [True]
+            assert not sftp.exists('pub/text.txt')
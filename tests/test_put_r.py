@@ -3,8 +3,14 @@
 import pytest
 
 from blddirs import build_dir_struct
-from common import rmdir
+from common import conn, rmdir, VFS
+from copy import deepcopy
+from hashlib import sha1
+from io import BytesIO
+from paramiko import SFTPClient
+from paramiko.sftp import CMD_EXTENDED, CMD_REMOVE, SFTP_NO_SUCH_FILE
 from pathlib import Path
+from sftpretty import Connection
 from tempfile import mkdtemp
 
 
@@ -32,3 +38,277 @@ def test_put_r_bad_local(lsftp):
     # run the op
     with pytest.raises(OSError):
         lsftp.put_r('/non-existing', '.')
+
+
+def test_put_r_layout(sftpserver):
+    '''test put_r recreates the local tree under remotedir'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            build_dir_struct(localpath)
+            sftp.put_r(Path(localpath).joinpath('pub').as_posix(), 'upload')
+
+            assert sftp.listdir('upload') == ['pub']
+            assert sftp.listdir('upload/pub') == ['foo1', 'foo2', 'make.txt']
+            assert sftp.listdir('upload/pub/foo1') == ['foo1.txt']
+            assert sftp.listdir('upload/pub/foo2') == ['bar1', 'foo2.txt']
+            assert sftp.listdir('upload/pub/foo2/bar1') == ['bar1.txt']
+
+            rmdir(localpath)
+
+
+def test_put_r_atomic(sftpserver):
+    '''test put_r renames every atomic upload into place'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            build_dir_struct(localpath)
+            sftp.put_r(Path(localpath).joinpath('pub').as_posix(), 'upload',
+                       atomic=True)
+
+            assert sftp.listdir('upload/pub') == ['foo1', 'foo2', 'make.txt']
+            assert sftp.listdir('upload/pub/foo1') == ['foo1.txt']
+            assert sftp.listdir('upload/pub/foo2') == ['bar1', 'foo2.txt']
+            assert sftp.listdir('upload/pub/foo2/bar1') == ['bar1.txt']
+
+            rmdir(localpath)
+
+
+def test_put_r_atomic_resume_first(sftpserver):
+    '''test a first resumable atomic put_r has no partials to resume'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp()).as_posix()
+            build_dir_struct(localpath)
+            sftp.put_r(Path(localpath).joinpath('pub').as_posix(), 'upload',
+                       atomic=True, resume=True)
+
+            assert sftp.listdir('upload/pub') == ['foo1', 'foo2', 'make.txt']
+            assert sftp.listdir('upload/pub/foo2/bar1') == ['bar1.txt']
+
+            rmdir(localpath)
+
+
+def test_put_r_verify(sftpserver):
+    '''test put_r returns the verified digest of each upload'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            local = localpath.joinpath('pub')
+            local.joinpath('sub').mkdir(parents=True)
+            # check-file on the virtual sftpserver needs 256 bytes or more
+            local.joinpath('a.txt').write_bytes(b'*' * 8192)
+            local.joinpath('sub', 'b.txt').write_bytes(b'#' * 4096)
+            digests = sftp.put_r(local.as_posix(), 'upload', atomic=True,
+                                 verify='sha1')
+
+            remote = sftp.normalize('upload/pub')
+            assert digests == {
+                f'{remote}/a.txt': sha1(b'*' * 8192).hexdigest(),
+                f'{remote}/sub/b.txt': sha1(b'#' * 4096).hexdigest()}
+
+            rmdir(localpath.as_posix())
+
+
+def test_put_r_atomic_failure(sftpserver):
+    '''test uploads that finished are renamed into place despite a failure'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            put = sftp.put
+
+            def _put(localfile, remotepath, **kwargs):
+                if localfile.endswith('bar1.txt'):
+                    raise IOError('failed')
+                return put(localfile, remotepath, **kwargs)
+
+            sftp.put = _put
+            with pytest.raises(IOError):
+                sftp.put_r(localpath.joinpath('pub').as_posix(), 'upload',
+                           atomic=True, workers=1)
+
+            assert sftp.listdir('upload/pub/foo2/bar1') == []
+            assert set(sftp.listdir('upload/pub')) <= {'foo1', 'foo2',
+                                                       'make.txt'}
+            for directory in ('foo1', 'foo2'):
+                assert not [name for name in sftp.listdir(
+                    f'upload/pub/{directory}') if name.endswith('.part')]
+
+            rmdir(localpath.as_posix())
+
+
+def test_put_r_hardlinks(sftpserver):
+    '''test hardlinked names are sent once, copied where links fail'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            pub = localpath.joinpath('pub')
+            pub.joinpath('foo2', 'linked.txt').hardlink_to(
+                pub.joinpath('make.txt'))
+            put, sent = sftp.put, []
+
+            def _put(localfile, remotepath, **kwargs):
+                sent.append(Path(localfile).name)
+                return put(localfile, remotepath, **kwargs)
+
+            sftp.put = _put
+            link_batch = sftp._link_batch
+            linked = []
+
+            def _link_batch(channel, pairs, window=64):
+                linked.extend(pairs)
+                return link_batch(channel, pairs, window=window)
+
+            sftp._link_batch = _link_batch
+            sftp.put_r(pub.as_posix(), 'upload', hardlinks=True)
+
+            assert len(linked) == 1
+            # the virtual sftpserver has no hardlink extension
+            assert sorted(sent) == ['bar1.txt', 'foo1.txt', 'foo2.txt',
+                                    'linked.txt', 'make.txt']
+            assert sorted(sftp.listdir('upload/pub/foo2')) == [
+                'bar1', 'foo2.txt', 'linked.txt']
+
+            rmdir(localpath.as_posix())
+
+
+def test_put_r_hardlinks_requests(sftpserver, monkeypatch):
+    '''test names are linked to a temporary name, removing nothing first'''
+    requests = []
+    request = SFTPClient._async_request
+
+    def _async_request(self, fileobj, kind, *arguments):
+        requests.append((kind, arguments))
+        return request(self, fileobj, kind, *arguments)
+
+    monkeypatch.setattr(SFTPClient, '_async_request', _async_request)
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            pub = localpath.joinpath('pub')
+            pub.joinpath('foo2', 'linked.txt').hardlink_to(
+                pub.joinpath('make.txt'))
+            sftp.put_r(pub.as_posix(), 'upload', hardlinks=True)
+
+            rmdir(localpath.as_posix())
+
+    (name, source, newpath), = [
+        arguments for kind, arguments in requests
+        if kind == CMD_EXTENDED and arguments[0] == 'hardlink@openssh.com']
+    assert source.startswith(b'/home/test/upload/pub/')
+    assert newpath.startswith(b'/home/test/upload/pub/')
+    assert newpath.rsplit(b'/', 1)[1].startswith(b'.')
+    assert newpath.endswith(b'.part')
+    assert CMD_REMOVE not in [kind for kind, arguments in requests]
+
+
+def test_put_r_hardlinks_linked(lsftp):
+    '''test hardlinked names are linked remotely'''
+    localpath = Path(mkdtemp())
+    remotepath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    pub = localpath.joinpath('pub')
+    pub.joinpath('foo2', 'linked.txt').hardlink_to(pub.joinpath('make.txt'))
+
+    lsftp.put_r(pub.as_posix(), remotepath.as_posix(), hardlinks=True)
+
+    remote = remotepath.joinpath('pub')
+    assert remote.joinpath('foo2', 'linked.txt').stat().st_ino == \
+        remote.joinpath('make.txt').stat().st_ino
+
+    rmdir(localpath.as_posix())
+    rmdir(remotepath.as_posix())
+
+
+def test_put_r_dedup(sftpserver):
+    '''test content already sent is neither uploaded nor linked again'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            pub = localpath.joinpath('pub')
+            put, sent = sftp.put, []
+
+            def _put(localfile, remotepath, **kwargs):
+                sent.append(Path(localfile).name)
+                return put(localfile, remotepath, **kwargs)
+
+            sftp.put = _put
+            sftp.mkdir('upload')
+            # every file built holds the same content
+            sftp.put_r(pub.as_posix(), 'upload', dedup='manifest')
+
+            # the virtual sftpserver has no hardlink extension
+            assert sorted(sent) == ['bar1.txt', 'foo1.txt', 'foo2.txt',
+                                    'make.txt']
+            assert sorted(sftp.listdir('upload')) == ['.sftpretty.sha256',
+                                                      'pub']
+
+            sent.clear()
+            sftp.put_r(pub.as_posix(), 'upload', dedup='manifest')
+
+            assert sent == []
+
+            rmdir(localpath.as_posix())
+
+
+def test_put_r_dedup_stale(sftpserver):
+    '''test files gone or changed since the sidecar was written are sent'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            build_dir_struct(localpath.as_posix())
+            pub = localpath.joinpath('pub')
+            sftp.mkdir('upload')
+            sftp.put_r(pub.as_posix(), 'upload', dedup='manifest')
+            put, sent = sftp.put, []
+
+            def _put(localfile, remotepath, **kwargs):
+                sent.append(Path(localfile).name)
+                return put(localfile, remotepath, **kwargs)
+
+            sftp.put = _put
+            sftp.remove('upload/pub/foo2/foo2.txt')
+            sftp.remove('upload/pub/make.txt')
+            sftp.putfo(BytesIO(b'changed'), 'upload/pub/make.txt')
+            sftp.put_r(pub.as_posix(), 'upload', dedup='manifest')
+
+            assert sorted(sent) == ['foo2.txt', 'make.txt']
+            assert sftp.stat('upload/pub/make.txt').st_size == \
+                pub.joinpath('make.txt').stat().st_size
+
+            rmdir(localpath.as_posix())
+
+
+def test_link_batch_failed(sftpserver):
+    '''test pairs that fail to link are returned to be sent another way'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            def _pipeline(channel, requests, window=64):
+                for (pair, partial), *_ in requests:
+                    yield (pair, partial), SFTP_NO_SUCH_FILE, 'No such file'
+
+            sftp._pipeline = _pipeline
+            with sftp._sftp_channel() as channel:
+                assert sftp._link_batch(channel, [('gone.txt', 'new.txt')]) \
+                    == [('gone.txt', 'new.txt')]
+
+
+def test_put_r_dedup_linked(lsftp):
+    '''test identical content is sent once and linked remotely'''
+    localpath = Path(mkdtemp())
+    remotepath = Path(mkdtemp())
+    build_dir_struct(localpath.as_posix())
+    pub = localpath.joinpath('pub')
+
+    lsftp.put_r(pub.as_posix(), remotepath.as_posix(), dedup='execute')
+
+    remote = remotepath.joinpath('pub')
+    assert remote.joinpath('foo1', 'foo1.txt').stat().st_ino == \
+        remote.joinpath('make.txt').stat().st_ino
+
+    rmdir(localpath.as_posix())
+    rmdir(remotepath.as_posix())
@@ -0,0 +1,96 @@
+'''test sftpretty.put_watch'''
+
+import pytest
+
+from common import conn, rmdir, VFS
+from copy import deepcopy
+from pathlib import Path
+from sftpretty import Connection
+from sys import platform
+from tempfile import mkdtemp
+from threading import Event, Timer
+
+
+pytestmark = pytest.mark.skipif(not platform.startswith('linux'),
+                                reason='inotify is Linux only')
+
+
+def test_put_watch(sftpserver):
+    '''test files are uploaded as they are written and moved in'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            localpath.joinpath('old.log').write_text('old')
+            uploads = sftp.put_watch(localpath.as_posix(), '/home/test/pub')
+
+            Timer(0.3, localpath.joinpath('new.log').write_text,
+                  ['new']).start()
+            assert next(uploads) == (f'{localpath}/new.log',
+                                     '/home/test/pub/new.log', None)
+
+            staging = Path(mkdtemp()).joinpath('moved.log')
+            staging.write_text('moved')
+            Timer(0.3, staging.rename, [localpath.joinpath(
+                'moved.log')]).start()
+            assert next(uploads)[1] == '/home/test/pub/moved.log'
+
+            uploads.close()
+            assert sorted(sftp.listdir('/home/test/pub')) == [
+                'foo1', 'foo2', 'make.txt', 'moved.log', 'new.log']
+
+            rmdir(localpath.as_posix())
+            rmdir(staging.parent.as_posix())
+
+
+def test_put_watch_existing_recurse(sftpserver):
+    '''test existing files and new sub-directories are uploaded'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            localpath.joinpath('old.log').write_text('old')
+            stop = Event()
+            uploads = sftp.put_watch(localpath.as_posix(), '/home/test/pub',
+                                     existing=True, recurse=True, stop=stop)
+
+            assert next(uploads)[1] == '/home/test/pub/old.log'
+
+            def _nested():
+                localpath.joinpath('day1').mkdir()
+                localpath.joinpath('day1', 'a.log').write_text('a')
+
+            Timer(0.3, _nested).start()
+            assert next(uploads)[1] == '/home/test/pub/day1/a.log'
+
+            stop.set()
+            # the write may be seen by both the scan and the new watch
+            assert {remote for local, remote, error in uploads} <= {
+                '/home/test/pub/day1/a.log'}
+            assert sftp.listdir('/home/test/pub/day1') == ['a.log']
+
+            rmdir(localpath.as_posix())
+
+
+def test_put_watch_failed(sftpserver):
+    '''test a failed upload is reported and the watch carries on'''
+    with sftpserver.serve_content(deepcopy(VFS)):
+        with Connection(**conn(sftpserver)) as sftp:
+            localpath = Path(mkdtemp())
+            uploads = sftp.put_watch(localpath.as_posix(), '/home/test/pub',
+                                     debounce=0.3)
+
+            def _vanish():
+                localpath.joinpath('gone.log').write_text('gone')
+                localpath.joinpath('gone.log').unlink()
+
+            Timer(0.3, _vanish).start()
+            local, remote, error = next(uploads)
+            assert remote == '/home/test/pub/gone.log'
+            assert isinstance(error, OSError)
+
+            Timer(0.3, localpath.joinpath('after.log').write_text,
+                  ['after']).start()
+            assert next(uploads) == (f'{localpath}/after.log',
+                                     '/home/test/pub/after.log', None)
+
+            uploads.close()
+            rmdir(localpath.as_posix())
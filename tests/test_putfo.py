@@ -63,3 +63,14 @@ def test_putfo_no_remotepath(lsftp):
 #     flo = BytesIO(buf)
 #     with pytest.raises(TypeError):
 #         psftp.putfo(flo)
+
+
+def test_putfo_atomic(lsftp):
+    '''test putfo to a temporary name then renamed into place'''
+    rfile = 'a-test-file'
+    flo = BytesIO(b'*' * 1024)
+    rslt = lsftp.putfo(flo, rfile, atomic=True)
+    assert rslt.st_size == 1024
+    assert rfile in lsftp.listdir()
+    assert not [name for name in lsftp.listdir() if name.endswith('.part')]
+    lsftp.remove(rfile)
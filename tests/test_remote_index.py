@@ -0,0 +1,124 @@
+'''test sftpretty.RemoteIndex'''
+
+from blddirs import build_dir_struct
+from common import conn, rmdir, VFS
+from os import utime
+from pathlib import Path
+from sftpretty import Connection, Manifest, RemoteIndex
+from stat import S_IFDIR, S_IFREG
+from tempfile import mkdtemp
+from time import time
+
+
+HOST = 'example.com:22'
+
+
+def entry(path, mode=S_IFREG, size=1, mtime=100):
+    return (path, size, mtime, mode, mtime, 0, 0)
+
+
+def test_remote_index_store():
+    '''test storing, listing and replacing directory listings'''
+    with RemoteIndex() as index:
+        index.store(HOST, '/r', '/r', 100,
+                    [entry('/r/a'), entry('/r/d', S_IFDIR)])
+        index.store(HOST, '/r', '/r/d', 200, [entry('/r/d/b')])
+
+        assert index.directories(HOST, '/r') == {'/r': 100, '/r/d': 200}
+        assert sorted(index.listing(HOST, '/r', '/r')) == [
+            entry('/r/a'), ('/r/d', 1, 200, S_IFDIR, 100, 0, 0)]
+        assert [path for path, *_ in index.entries(HOST, '/r')] == [
+            '/r/a', '/r/d', '/r/d/b']
+        assert index.entries(HOST, '/elsewhere') == []
+        assert index.entries('example.org:22', '/r') == []
+
+        index.store(HOST, '/r', '/r', 300, [entry('/r/a', size=2)])
+
+        assert index.directories(HOST, '/r') == {'/r': 300}
+        assert index.entries(HOST, '/r') == [entry('/r/a', size=2)]
+
+
+def test_remote_index_prune():
+    '''test pruning only touches the directory and what is below it'''
+    with RemoteIndex() as index:
+        index.store(HOST, '/r', '/r', 100,
+                    [entry('/r/d', S_IFDIR), entry('/r/d2', S_IFDIR)])
+        index.store(HOST, '/r', '/r/d', 100, [entry('/r/d/a')])
+        index.store(HOST, '/r', '/r/d2', 100, [entry('/r/d2/a')])
+
+        index.prune(HOST, '/r', '/r/d')
+
+        assert sorted(index.directories(HOST, '/r')) == ['/r', '/r/d2']
+        assert [path for path, *_ in index.entries(HOST, '/r')] == [
+            '/r/d', '/r/d2', '/r/d2/a']
+
+
+def test_remote_index_persists():
+    '''test an index on disk outlives its connection and can be cleared'''
+    database = Path(mkdtemp()).joinpath('cache', 'index.db')
+
+    with RemoteIndex(database) as index:
+        index.store(HOST, '/r', '/r', 100, [entry('/r/a')])
+        index.store(HOST, '/s', '/s', 100, [entry('/s/a')])
+
+    with RemoteIndex(database) as index:
+        assert index.entries(HOST, '/r') == [entry('/r/a')]
+        index.clear(HOST, '/r')
+        assert index.entries(HOST, '/r') == []
+        assert index.entries(HOST, '/s') == [entry('/s/a')]
+        index.clear()
+        assert index.entries(HOST, '/s') == []
+
+    rmdir(database.parent.parent.as_posix())
+
+
+def test_remotetree_index(sftpserver):
+    '''test an indexed walk maps the same tree and fills the index'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp, RemoteIndex() as index:
+            localpath = Path(mkdtemp()).as_posix()
+            expected, tree = Manifest(), Manifest()
+
+            sftp.remotetree(expected, '/home/test', localpath)
+            sftp.remotetree(tree, '/home/test', localpath, index=index)
+
+            # the virtual sftpserver reports every mtime as now
+            assert sorted((path, size, mode) for path, size, _, mode, *_ in
+                          tree.entries()) == sorted(
+                (path, size, mode)
+                for path, size, _, mode, *_ in expected.entries())
+            assert sorted(tree.keys()) == sorted(expected.keys())
+            host = f'{sftpserver.host}:{sftpserver.port}'
+            assert sorted(path for path, *_ in index.entries(
+                host, '/home/test')) == sorted(expected.path(i)
+                                               for i in range(expected.count))
+            # directories modified this second are listed again next time
+            assert set(index.directories(host, '/home/test').values()) == {
+                None}
+
+
+def test_remotetree_index_rescan(lsftp):
+    '''test a rescan serves unchanged directories from the index'''
+    remotepath = Path(mkdtemp()).as_posix()
+    build_dir_struct(remotepath)
+    past = time() - 3600
+    for path in sorted(Path(remotepath).rglob('*'), reverse=True):
+        utime(path, (past, past))
+    utime(remotepath, (past, past))
+
+    with RemoteIndex() as index:
+        expected, first, second = {}, {}, {}
+        lsftp.remotetree(expected, remotepath, remotepath)
+        lsftp.remotetree(first, remotepath, remotepath, index=index)
+        lsftp.remotetree(second, remotepath, remotepath, index=index)
+
+        assert first == second == expected
+
+        Path(remotepath).joinpath('pub', 'new').mkdir()
+        third = {}
+        lsftp.remotetree(third, remotepath, remotepath, index=index)
+
+        assert f'{remotepath}/pub/new' in {remote for remote, _ in third[
+            f'{remotepath}/pub']}
+
+    rmdir(remotepath)
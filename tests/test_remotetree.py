@@ -58,3 +58,50 @@ def test_remotetree_no_recurse(sftpserver):
                 assert set(remote[branch]) == set(tree[branch])
                 del tree[branch]
             assert tree == {}
+
+
+def test_remotetree_find_fallback(sftpserver):
+    '''test the find backend falls back to sftp on an sftp only server'''
+    with sftpserver.serve_content(VFS):
+        with Connection(**conn(sftpserver)) as sftp:
+            cwd = sftp.pwd
+            localpath = Path(mkdtemp()).as_posix()
+            expected = {}
+            tree = {}
+
+            sftp.remotetree(expected, cwd, localpath)
+            sftp.remotetree(tree, cwd, localpath, backend='find')
+
+            assert sorted(expected.keys()) == sorted(tree.keys())
+            for branch in expected.keys():
+                assert set(expected[branch]) == set(tree[branch])
+
+
+def test_remotetree_find(lsftp):
+    '''test the find backend maps the same tree as sftp listings'''
+    localpath = Path(mkdtemp()).as_posix()
+    remotepath = Path.home().joinpath('.ssh').as_posix()
+    expected = {}
+    tree = {}
+
+    lsftp.remotetree(expected, remotepath, localpath)
+    lsftp.remotetree(tree, remotepath, localpath, backend='find')
+
+    assert sorted(expected.keys()) == sorted(tree.keys())
+    for branch in expected.keys():
+        assert set(expected[branch]) == set(tree[branch])
+
+
+def test_remotetree_find_undecodable(sftpserver, monkeypatch):
+    '''test the find backend keeps names that aren't valid UTF-8'''
+    record = b'\0'.join([b'f', b'3', b'1.0', b'2.0', b'644', b'0', b'0',
+                         b'/pub/caf\xe9.txt', b''])
+    with Connection(**conn(sftpserver)) as sftp:
+        monkeypatch.setattr(sftp, 'execute_stream', lambda command: iter(
+            [('stdout', record), ('exit', 0)]))
+        (path, attribute), = sftp._find('/pub')
+
+    assert path == '/pub/caf\udce9.txt'
+    assert attribute.filename == 'caf\udce9.txt'
+    assert path.encode('utf-8', 'surrogateescape') == b'/pub/caf\xe9.txt'
+    assert attribute.st_size == 3
@@ -0,0 +1,88 @@
+'''test sftpretty.watch'''
+
+from common import conn, rmdir, VFS
+from copy import deepcopy
+from os import utime
+from pathlib import Path
+from sftpretty import Connection
+from tempfile import mkdtemp
+from threading import Event, Timer
+from time import time
+
+
+def until(events, event, path):
+    '''the virtual sftpserver reports every mtime as now, so each file seems
+    modified once a second, skip ahead to the event expected'''
+    for item in events:
+        if item[:2] == (event, path):
+            return item
+
+
+def test_watch(sftpserver):
+    '''test watch reports created, modified and deleted entries'''
+    content = deepcopy(VFS)
+    pub = content['home']['test']['pub']
+    with sftpserver.serve_content(content):
+        with Connection(**conn(sftpserver)) as sftp:
+            events = sftp.watch('/home/test/pub', interval=0.1, recurse=True)
+
+            Timer(0.3, pub['foo2'].update, [{'new.txt': 'new'}]).start()
+            event = until(events, 'created', '/home/test/pub/foo2/new.txt')
+            assert event[2].st_size == 3
+
+            Timer(0.3, pub.update, [{'make.txt': 'content changed'}]).start()
+            event = until(events, 'modified', '/home/test/pub/make.txt')
+            while event[2].st_size != 15:
+                event = until(events, 'modified', '/home/test/pub/make.txt')
+
+            Timer(0.3, pub.pop, ['foo1']).start()
+            assert until(events, 'deleted', '/home/test/pub/foo1/foo1.txt')
+            assert until(events, 'deleted', '/home/test/pub/foo1')
+
+            events.close()
+
+
+def test_watch_no_recurse(sftpserver):
+    '''test watch without recursing reports directories, not their files'''
+    content = deepcopy(VFS)
+    pub = content['home']['test']['pub']
+    with sftpserver.serve_content(content):
+        with Connection(**conn(sftpserver)) as sftp:
+            stop = Event()
+            events = sftp.watch('/home/test/pub', interval=0.1, stop=stop)
+
+            def _change():
+                pub['foo2']['new.txt'] = 'new'
+                pub['foo3'] = {}
+
+            Timer(0.3, _change).start()
+            for event, path, attribute in events:
+                assert not path.startswith('/home/test/pub/foo2/')
+                if (event, path) == ('created', '/home/test/pub/foo3'):
+                    break
+
+            stop.set()
+            assert list(events) == []
+
+
+def test_watch_stable(lsftp):
+    '''test watch holds back files until they stop growing'''
+    remotepath = Path(mkdtemp())
+    past = time() - 3600
+    utime(remotepath, (past, past))
+    events = lsftp.watch(remotepath.as_posix(), interval=0.5)
+
+    def _grow(size):
+        with open(remotepath.joinpath('growing'), 'ab') as flo:
+            flo.write(b'*' * 1024)
+        if size < 4:
+            Timer(0.3, _grow, [size + 1]).start()
+
+    Timer(0.3, _grow, [1]).start()
+    event, path, attribute = next(events)
+
+    assert (event, path) == ('created', f'{remotepath}/growing')
+    assert attribute.st_size == 4096
+
+    events.close()
+    rmdir(remotepath.as_posix())